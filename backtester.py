@@ -3,25 +3,232 @@ import numpy as np
 from sklearn.metrics import mean_squared_error
 import matplotlib.pyplot as plt
 import seaborn as sns
+from bisect import bisect_right
+from collections import deque
+from signal_builder import AssetState
+from history_store import RecordHistory
+from instrumentation import tracer, traced
+
+WEIGHT_HISTORY_FIELDS = ['portfolio_return', 'prediction', 'actual_return']
+
+class StreamingMetrics:
+    def __init__(self, initial_capital, rolling_windows=(63, 252), periods_per_year=252):
+        self.initial_capital = initial_capital
+        self.rolling_windows = list(rolling_windows)
+        self.periods_per_year = periods_per_year
+
+        self.first_value = None
+        self.last_value = None
+        self.peak = None
+        self.max_drawdown = 0.0
+        self.n_returns = 0
+        self.return_mean = 0.0
+        self.return_m2 = 0.0
+        self.positive_returns = 0
+        self.n_downside = 0
+        self.downside_mean = 0.0
+        self.downside_m2 = 0.0
+
+        self.n_predictions = 0
+        self.prediction_mean = 0.0
+        self.actual_mean = 0.0
+        self.prediction_m2 = 0.0
+        self.actual_m2 = 0.0
+        self.co_moment = 0.0
+        self.squared_error = 0.0
+        self.direction_hits = 0
+
+        self.n_trades = 0
+        self.winning_trades = 0
+        self.position_sum = 0.0
+
+        self.returns = []
+        self.drawdowns = []
+        self._return_windows = {window: deque() for window in self.rolling_windows}
+        self._return_sums = {window: [0.0, 0.0] for window in self.rolling_windows}
+        self._ic_windows = {window: deque() for window in self.rolling_windows}
+        self._ic_sums = {window: [0.0, 0.0, 0.0, 0.0, 0.0, 0] for window in self.rolling_windows}
+        self.rolling = {}
+        for window in self.rolling_windows:
+            self.rolling[f'rolling_sharpe_{window}'] = []
+            self.rolling[f'rolling_ic_{window}'] = []
+
+    def update_value(self, value):
+        if self.last_value is None:
+            self.first_value = self.last_value = self.peak = value
+            self.drawdowns.append(0.0)
+            return
+
+        period_return = value / self.last_value - 1
+        self.last_value = value
+        self.returns.append(period_return)
+
+        self.n_returns += 1
+        delta = period_return - self.return_mean
+        self.return_mean += delta / self.n_returns
+        self.return_m2 += delta * (period_return - self.return_mean)
+        if period_return > 0:
+            self.positive_returns += 1
+        elif period_return < 0:
+            self.n_downside += 1
+            delta = period_return - self.downside_mean
+            self.downside_mean += delta / self.n_downside
+            self.downside_m2 += delta * (period_return - self.downside_mean)
+
+        self.peak = max(self.peak, value)
+        drawdown = (value - self.peak) / self.peak
+        self.max_drawdown = min(self.max_drawdown, drawdown)
+        self.drawdowns.append(drawdown)
+
+        for window in self.rolling_windows:
+            values, sums = self._return_windows[window], self._return_sums[window]
+            values.append(period_return)
+            sums[0] += period_return
+            sums[1] += period_return * period_return
+            if len(values) > window:
+                expired = values.popleft()
+                sums[0] -= expired
+                sums[1] -= expired * expired
+
+            sharpe = np.nan
+            if len(values) == window and window > 1:
+                variance = (sums[1] - sums[0] * sums[0] / window) / (window - 1)
+                if variance > 0:
+                    sharpe = sums[0] / window / np.sqrt(variance) * np.sqrt(self.periods_per_year)
+            self.rolling[f'rolling_sharpe_{window}'].append(sharpe)
+
+    def update_prediction(self, prediction, actual):
+        prediction = float(prediction)
+        actual = float(actual)
+        is_valid = not (np.isnan(prediction) or np.isnan(actual))
+        if is_valid:
+            self.n_predictions += 1
+            delta_prediction = prediction - self.prediction_mean
+            self.prediction_mean += delta_prediction / self.n_predictions
+            delta_actual = actual - self.actual_mean
+            self.actual_mean += delta_actual / self.n_predictions
+            self.prediction_m2 += delta_prediction * (prediction - self.prediction_mean)
+            self.actual_m2 += delta_actual * (actual - self.actual_mean)
+            self.co_moment += delta_prediction * (actual - self.actual_mean)
+            self.squared_error += (actual - prediction) ** 2
+            if (prediction > 0) == (actual > 0):
+                self.direction_hits += 1
+
+        for window in self.rolling_windows:
+            pairs, sums = self._ic_windows[window], self._ic_sums[window]
+            pairs.append((prediction, actual))
+            if is_valid:
+                self.add_pair(sums, prediction, actual, 1)
+            if len(pairs) > window:
+                expired = pairs.popleft()
+                if not (np.isnan(expired[0]) or np.isnan(expired[1])):
+                    self.add_pair(sums, *expired, -1)
+
+            ic = np.nan
+            if len(pairs) == window and sums[5] > 1:
+                n = sums[5]
+                denominator = (n * sums[2] - sums[0] ** 2) * (n * sums[3] - sums[1] ** 2)
+                if denominator > 0:
+                    ic = (n * sums[4] - sums[0] * sums[1]) / np.sqrt(denominator)
+            self.rolling[f'rolling_ic_{window}'].append(ic)
+
+    def add_pair(self, sums, prediction, actual, sign):
+        sums[0] += sign * prediction
+        sums[1] += sign * actual
+        sums[2] += sign * prediction * prediction
+        sums[3] += sign * actual * actual
+        sums[4] += sign * prediction * actual
+        sums[5] += sign
+
+    def update_trade(self, portfolio_return, weights):
+        self.n_trades += 1
+        if portfolio_return > 0:
+            self.winning_trades += 1
+        self.position_sum += float(sum(weights.values()))
+
+    def metrics(self):
+        if self.n_returns == 0:
+            return {}
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            total_return = (self.last_value / self.first_value - 1) * 100
+            annual_return = np.float64(self.return_mean) * self.periods_per_year * 100
+            return_std = np.sqrt(self.return_m2 / (self.n_returns - 1)) if self.n_returns > 1 else np.nan
+            annual_volatility = return_std * np.sqrt(self.periods_per_year) * 100
+            sharpe_ratio = annual_return / annual_volatility if annual_volatility > 0 else 0
+
+            sortino_ratio = 0
+            if self.n_downside > 0:
+                downside_std = np.sqrt(self.downside_m2 / (self.n_downside - 1)) if self.n_downside > 1 else np.nan
+                sortino_ratio = annual_return / (np.float64(downside_std) * np.sqrt(self.periods_per_year) * 100)
+
+            max_drawdown = self.max_drawdown * 100
+            calmar_ratio = annual_return / abs(max_drawdown) if max_drawdown != 0 else 0
+            win_rate = self.positive_returns / self.n_returns
+
+            correlation, mse, direction_correct = 0, 0, 0
+            if self.n_predictions > 0:
+                if self.n_predictions > 1:
+                    correlation = self.co_moment / np.sqrt(self.prediction_m2 * self.actual_m2)
+                    if not np.isfinite(correlation):
+                        correlation = 0
+                mse = self.squared_error / self.n_predictions
+                direction_correct = self.direction_hits / self.n_predictions
+
+        trade_win_rate = self.winning_trades / self.n_trades if self.n_trades > 0 else 0
+        avg_position_size = self.position_sum / self.n_trades if self.n_trades > 0 else 0
+
+        return {
+            'Total Return (%)': total_return,
+            'Annual Return (%)': annual_return,
+            'Annual Volatility (%)': annual_volatility,
+            'Sharpe Ratio': sharpe_ratio,
+            'Sortino Ratio': sortino_ratio,
+            'Calmar Ratio': calmar_ratio,
+            'Max Drawdown (%)': max_drawdown,
+            'Win Rate (%)': win_rate,
+            'Prediction Correlation': correlation,
+            'Information Coefficient': correlation,
+            'Prediction MSE': mse,
+            'Direction Accuracy': direction_correct,
+            'Number of Trades': self.n_trades,
+            'Trade Win Rate (%)': trade_win_rate * 100,
+            'Average Position Size (%)': avg_position_size * 100,
+            'Final Portfolio Value': self.last_value,
+            'Initial Capital': self.initial_capital
+        }
+
+    def rolling_metrics(self):
+        rolling = {name: np.asarray(values, dtype=float) for name, values in self.rolling.items()}
+        rolling['returns'] = np.asarray(self.returns, dtype=float)
+        rolling['drawdowns'] = np.asarray(self.drawdowns, dtype=float)
+        return rolling
 
 class EnhancedStrategyBacktester:
-    def __init__(self, model, portfolio_manager):
+    def __init__(self, model, portfolio_manager, checkpoint_every=1, rolling_windows=(63, 252)):
         self.model = model
         self.portfolio_manager = portfolio_manager
+        self.checkpoint_every = checkpoint_every
+        self.rolling_windows = rolling_windows
         self.performance_metrics = {}
+        self.metrics_tracker = None
 
-    def run_enhanced_backtest(self, data, start_date, end_date):
+    @traced('EnhancedStrategyBacktester.run_enhanced_backtest', 'backtest')
+    def run_enhanced_backtest(self, data, start_date, end_date, cached_predictions=None,
+                              checkpoint_store=None, checkpoint=None):
         print("=" * 60)
         print("开始策略回测")
         print("=" * 60)
 
-        backtest_data = data[(data.index >= start_date) & (data.index <= end_date)]
-        if backtest_data.empty:
+        feature_matrix = self.model.get_feature_matrix(data)
+        dates = self.backtest_dates(data, start_date, end_date)
+        tracer.annotate(rows=len(dates), columns=len(feature_matrix.feature_columns))
+        if len(dates) == 0:
             print("警告: 回测期间没有数据!")
             return {
                 'portfolio_values': [self.portfolio_manager.initial_capital],
                 'portfolio_dates': [start_date],
-                'weights_history': [],
+                'weights_history': RecordHistory(WEIGHT_HISTORY_FIELDS),
                 'predictions': [],
                 'actual_returns': [],
                 'signal_dates': [],
@@ -29,13 +236,10 @@ class EnhancedStrategyBacktester:
                 'feature_importance': self.model.feature_importance_history
             }
 
-        dates = backtest_data.index.unique()
-        dates = sorted(dates)
-
         capital = self.portfolio_manager.initial_capital
         portfolio_values = [capital]
         portfolio_dates = [dates[0] if len(dates) > 0 else start_date]
-        portfolio_weights_history = []
+        portfolio_weights_history = RecordHistory(WEIGHT_HISTORY_FIELDS)
         predictions_list = []
         actual_returns_list = []
         signal_dates = []
@@ -43,23 +247,56 @@ class EnhancedStrategyBacktester:
         print(f"回测期间: {start_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}")
         print(f"总交易日: {len(dates)}")
 
-        for i, current_date in enumerate(dates):
-            if i % self.model.retrain_freq == 0:
-                success = self.model.train_model(data, current_date)
+        self.initialize_asset_state(feature_matrix)
+        self.metrics_tracker = StreamingMetrics(self.portfolio_manager.initial_capital, self.rolling_windows)
+        self.metrics_tracker.update_value(capital)
+
+        block_predictions = {} if cached_predictions is None else cached_predictions
+        start_position = 0
+        if checkpoint is not None and cached_predictions is None:
+            self.restore_checkpoint(checkpoint)
+            start_position = checkpoint['position']
+            capital = checkpoint['capital']
+            portfolio_values = checkpoint['portfolio_values']
+            portfolio_dates = checkpoint['portfolio_dates']
+            portfolio_weights_history = checkpoint['weights_history']
+            predictions_list = checkpoint['predictions']
+            actual_returns_list = checkpoint['actual_returns']
+            signal_dates = checkpoint['signal_dates']
+            block_predictions = checkpoint['block_predictions']
 
-            prediction = self.model.predict(data, current_date)
+        for i, current_date in enumerate(dates[start_position:], start_position):
+            if cached_predictions is None:
+                if i % self.model.retrain_freq == 0:
+                    if (checkpoint_store is not None and i > start_position
+                            and (i // self.model.retrain_freq) % self.checkpoint_every == 0):
+                        self.save_checkpoint(checkpoint_store, dates[i - 1], i, capital, portfolio_values,
+                                             portfolio_dates, portfolio_weights_history, predictions_list,
+                                             actual_returns_list, signal_dates, block_predictions)
+                    success = self.model.train_model(data, current_date)
+                    block_predictions = self.model.predict_block(data, dates[i:i + self.model.retrain_freq])
+                    block_predictions = dict(zip(block_predictions.index, block_predictions.values))
+                elif self.model.update_online(data, current_date):
+                    block_predictions = {}
+
+            prediction = block_predictions.get(current_date)
+            if cached_predictions is None:
+                if prediction is None:
+                    prediction = self.model.predict(data, current_date)
+                else:
+                    self.model.record_prediction(data, current_date, prediction)
             if prediction is not None:
                 predictions_list.append(prediction)
                 signal_dates.append(current_date)
 
-                actual_return_data = data.loc[data.index == current_date, 'ret_21D']
-                if len(actual_return_data) > 0:
-                    actual_return = actual_return_data.iloc[0]
+                actual_return = feature_matrix.target_at(current_date)
+                if actual_return is not None:
                     actual_returns_list.append(actual_return)
                 else:
                     actual_returns_list.append(0)
+                self.metrics_tracker.update_prediction(prediction, actual_returns_list[-1])
 
-                asset_data = self.prepare_asset_data(data, current_date)
+                asset_data = self.update_asset_state(current_date)
                 try:
                     capital, portfolio_return, weights = self.portfolio_manager.execute_advanced_trades(
                         current_date, asset_data, {'primary_asset': prediction}, capital
@@ -73,13 +310,19 @@ class EnhancedStrategyBacktester:
                         'prediction': prediction,
                         'actual_return': actual_returns_list[-1] if actual_returns_list else None
                     })
+                    self.metrics_tracker.update_value(capital)
+                    self.metrics_tracker.update_trade(portfolio_return, weights)
                 except Exception as e:
                     portfolio_values.append(capital)
                     portfolio_dates.append(current_date)
+                    self.metrics_tracker.update_value(capital)
 
-        self.performance_metrics = self.calculate_enhanced_metrics(
-            portfolio_values, portfolio_weights_history, predictions_list, actual_returns_list
-        )
+        if checkpoint_store is not None and cached_predictions is None and len(dates) > start_position:
+            self.save_checkpoint(checkpoint_store, dates[-1], len(dates), capital, portfolio_values,
+                                 portfolio_dates, portfolio_weights_history, predictions_list,
+                                 actual_returns_list, signal_dates, block_predictions)
+
+        self.performance_metrics = self.metrics_tracker.metrics()
 
         print(f"回测完成: {len(predictions_list)} 次预测, {len(portfolio_weights_history)} 次交易")
         return {
@@ -90,9 +333,89 @@ class EnhancedStrategyBacktester:
             'actual_returns': actual_returns_list,
             'signal_dates': signal_dates,
             'metrics': self.performance_metrics,
+            'rolling_metrics': self.metrics_tracker.rolling_metrics(),
             'feature_importance': self.model.feature_importance_history
         }
 
+    def save_checkpoint(self, checkpoint_store, last_date, position, capital, portfolio_values, portfolio_dates,
+                        weights_history, predictions, actual_returns, signal_dates, block_predictions):
+        checkpoint_store.save(last_date, {
+            'last_date': last_date,
+            'position': position,
+            'model': self.model,
+            'portfolio_manager': self.portfolio_manager,
+            'asset_state': self.asset_state,
+            'state_position': self._state_position,
+            'capital': capital,
+            'portfolio_values': portfolio_values,
+            'portfolio_dates': portfolio_dates,
+            'weights_history': weights_history,
+            'predictions': predictions,
+            'actual_returns': actual_returns,
+            'signal_dates': signal_dates,
+            'block_predictions': block_predictions,
+            'metrics_tracker': self.metrics_tracker,
+            'data_fingerprint': self.checkpoint_fingerprint(checkpoint_store, self.model.feature_matrix, last_date)
+        })
+
+    def checkpoint_fingerprint(self, checkpoint_store, feature_matrix, last_date):
+        return checkpoint_store.fingerprint_data(feature_matrix, feature_matrix.end_position(last_date),
+                                                 self.model.prediction_horizon)
+
+    def load_checkpoint(self, checkpoint_store, data, start_date, end_date, resume_date=None):
+        checkpoint_date = checkpoint_store.latest(resume_date or end_date)
+        if checkpoint_date is None:
+            return None
+
+        checkpoint = checkpoint_store.load(checkpoint_date)
+        dates = self.backtest_dates(data, start_date, end_date)
+        if bisect_right(dates, checkpoint['last_date']) != checkpoint['position']:
+            print(f"检查点 {checkpoint_date.strftime('%Y-%m-%d')} 与回测日期不一致，从头开始回测")
+            return None
+
+        fingerprint = self.checkpoint_fingerprint(checkpoint_store, self.model.get_feature_matrix(data),
+                                                  checkpoint['last_date'])
+        if checkpoint.get('data_fingerprint') != fingerprint:
+            print(f"检查点 {checkpoint_date.strftime('%Y-%m-%d')} 之前的数据已变化，从头开始回测")
+            return None
+        return checkpoint
+
+    def restore_checkpoint(self, checkpoint):
+        feature_matrix = self.model.feature_matrix
+        self.model.__dict__.update(checkpoint['model'].__dict__)
+        self.model.feature_matrix = feature_matrix
+        self.portfolio_manager.__dict__.update(checkpoint['portfolio_manager'].__dict__)
+        self.asset_state = checkpoint['asset_state']
+        self._state_position = checkpoint['state_position']
+        self.metrics_tracker = checkpoint['metrics_tracker']
+        print(f"从检查点恢复: {checkpoint['last_date'].strftime('%Y-%m-%d')} (已完成 {checkpoint['position']} 个交易日)")
+
+    def backtest_dates(self, data, start_date, end_date):
+        index = self.model.get_feature_matrix(data).index
+        return sorted(index[(index >= start_date) & (index <= end_date)].unique())
+
+    def initialize_asset_state(self, feature_matrix):
+        self._state_matrix = feature_matrix
+        self._state_position = 0
+        self.asset_state = AssetState(robust_window=self.portfolio_manager.volatility_lookback)
+
+    @traced('EnhancedStrategyBacktester.update_asset_state', 'backtest')
+    def update_asset_state(self, current_date):
+        end_position = self._state_matrix.end_position(current_date)
+        for value in self._state_matrix.target[self._state_position:end_position]:
+            self.asset_state.update(value)
+        self._state_position = max(self._state_position, end_position)
+
+        asset_data = {
+            'primary_asset': {
+                'state': self.asset_state,
+                'price': self.asset_state.price,
+                'volatility': self.asset_state.rolling_volatility()
+            }
+        }
+        return asset_data
+
+    @traced('EnhancedStrategyBacktester.prepare_asset_data', 'backtest')
     def prepare_asset_data(self, data, current_date):
         historical_data = data[data.index <= current_date]
         asset_data = {
@@ -117,76 +440,19 @@ class EnhancedStrategyBacktester:
         return returns_series.rolling(window=window, min_periods=10).std().iloc[-1] if len(returns_series) > 0 else 0.02
 
     def calculate_enhanced_metrics(self, portfolio_values, weights_history, predictions, actual_returns):
-        portfolio_returns = pd.Series(portfolio_values).pct_change().dropna()
-        if len(portfolio_returns) == 0:
-            return {}
-
-        total_return = (portfolio_values[-1] / portfolio_values[0] - 1) * 100
-        annual_return = portfolio_returns.mean() * 252 * 100
-        annual_volatility = portfolio_returns.std() * np.sqrt(252) * 100
-        sharpe_ratio = annual_return / annual_volatility if annual_volatility > 0 else 0
-
-        downside_returns = portfolio_returns[portfolio_returns < 0]
-        sortino_ratio = annual_return / (downside_returns.std() * np.sqrt(252) * 100) if len(downside_returns) > 0 else 0
-
-        max_drawdown = self.calculate_max_drawdown(portfolio_values) * 100
-        calmar_ratio = annual_return / abs(max_drawdown) if max_drawdown != 0 else 0
-
-        winning_periods = len([r for r in portfolio_returns if r > 0])
-        win_rate = winning_periods / len(portfolio_returns) if len(portfolio_returns) > 0 else 0
-
-        prediction_accuracy = 0
-        if len(predictions) > 0 and len(actual_returns) > 0:
-            min_len = min(len(predictions), len(actual_returns))
-            predictions_arr = np.array(predictions[:min_len])
-            actual_arr = np.array(actual_returns[:min_len])
-
-            if min_len > 1:
-                correlation_matrix = np.corrcoef(predictions_arr, actual_arr)
-                correlation = correlation_matrix[0, 1] if not np.isnan(correlation_matrix[0, 1]) else 0
-            else:
-                correlation = 0
-
-            mse = mean_squared_error(actual_arr, predictions_arr) if min_len > 0 else 0
-            direction_correct = np.sum((predictions_arr > 0) == (actual_arr > 0)) / min_len if min_len > 0 else 0
-            ic = correlation
-        else:
-            correlation = 0
-            mse = 0
-            direction_correct = 0
-            ic = 0
-
-        total_trades = len(weights_history)
-        positive_trades = len([w for w in weights_history if w.get('portfolio_return', 0) > 0])
-        trade_win_rate = positive_trades / total_trades if total_trades > 0 else 0
-        avg_position_size = np.mean([sum(w['weights'].values()) for w in weights_history]) if weights_history else 0
-
-        metrics = {
-            'Total Return (%)': total_return,
-            'Annual Return (%)': annual_return,
-            'Annual Volatility (%)': annual_volatility,
-            'Sharpe Ratio': sharpe_ratio,
-            'Sortino Ratio': sortino_ratio,
-            'Calmar Ratio': calmar_ratio,
-            'Max Drawdown (%)': max_drawdown,
-            'Win Rate (%)': win_rate,
-            'Prediction Correlation': correlation,
-            'Information Coefficient': ic,
-            'Prediction MSE': mse,
-            'Direction Accuracy': direction_correct,
-            'Number of Trades': total_trades,
-            'Trade Win Rate (%)': trade_win_rate * 100,
-            'Average Position Size (%)': avg_position_size * 100,
-            'Final Portfolio Value': portfolio_values[-1],
-            'Initial Capital': self.portfolio_manager.initial_capital
-        }
-        return metrics
+        tracker = StreamingMetrics(self.portfolio_manager.initial_capital, self.rolling_windows)
+        for value in portfolio_values:
+            tracker.update_value(value)
+        for prediction, actual_return in zip(predictions, actual_returns):
+            tracker.update_prediction(prediction, actual_return)
+        for record in weights_history:
+            tracker.update_trade(record.get('portfolio_return', 0), record['weights'])
+        return tracker.metrics()
 
     def calculate_max_drawdown(self, portfolio_values):
-        portfolio_series = pd.Series(portfolio_values)
-        rolling_max = portfolio_series.expanding().max()
-        drawdown = (portfolio_series - rolling_max) / rolling_max
-        return drawdown.min()
+        values = np.asarray(portfolio_values, dtype=float)
+        running_peak = np.maximum.accumulate(values)
+        return ((values - running_peak) / running_peak).min()
 
     def generate_enhanced_report(self, backtest_results):
         print("\n" + "=" * 60)
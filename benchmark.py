@@ -0,0 +1,214 @@
+import io
+import sys
+import copy
+import json
+import time
+import platform
+import contextlib
+import subprocess
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+from config import (BENCHMARK_TIERS, BENCHMARK_NAN_RATIO, BENCHMARK_SEED, BENCHMARK_DATA_PATH,
+                    BENCHMARK_OUTPUT_PATH, MODEL_CONFIG, PORTFOLIO_CONFIG, NAN_THRESHOLD,
+                    MAX_SELECTED_FEATURES, REDUNDANCY_THRESHOLD, FEATURE_LAGS, ROLLING_WINDOWS)
+from data_loader import DataLoader, DataCleaner
+from feature_processor import FeatureSelector, FeatureProcessor
+from signal_builder import OnlineTreeModel, AdvancedPortfolioManager
+from backtester import EnhancedStrategyBacktester
+from instrumentation import peak_rss_mb
+
+BENCHMARK_STAGES = ['load', 'clean', 'select', 'engineer', 'train', 'backtest']
+
+def generate_synthetic_dataset(folder, n_days=2000, n_features=1000, nan_ratio=0.1, seed=42,
+                               columns_per_file=1000, start_date='2000-01-03', horizon=21):
+    folder = Path(folder)
+    manifest_path = folder / "manifest.json"
+    manifest = {'n_days': n_days, 'n_features': n_features, 'nan_ratio': nan_ratio, 'seed': seed,
+                'columns_per_file': columns_per_file, 'start_date': start_date, 'horizon': horizon}
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            if json.load(f) == manifest:
+                return folder
+
+    folder.mkdir(parents=True, exist_ok=True)
+    for old_file in folder.glob("*.parquet"):
+        old_file.unlink()
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start_date, periods=n_days, name='date')
+    daily_returns = rng.normal(0.0003, 0.01, n_days + horizon)
+    cumulative = np.concatenate([[0.0], np.cumsum(daily_returns)])
+    forward_returns = cumulative[horizon + 1:n_days + horizon + 1] - cumulative[1:n_days + 1]
+    factor = (forward_returns - forward_returns.mean()) / forward_returns.std()
+
+    pd.DataFrame({'forward': forward_returns, 'daily': daily_returns[:n_days]},
+                 index=dates).to_parquet(folder / "ret_21d.parquet")
+
+    for file_number, start in enumerate(range(0, n_features, columns_per_file)):
+        n_columns = min(columns_per_file, n_features - start)
+        loadings = rng.uniform(0.0, 0.3, n_columns)
+        values = factor[:, None] * loadings + rng.standard_normal((n_days, n_columns))
+        column_nan_ratio = np.clip(rng.uniform(0.0, 2 * nan_ratio, n_columns), 0.0, 1.0)
+        values[rng.random((n_days, n_columns)) < column_nan_ratio] = np.nan
+        columns = [f"f{start + i:05d}" for i in range(n_columns)]
+        pd.DataFrame(values, index=dates, columns=columns).to_parquet(folder / f"financials_{file_number:03d}.parquet")
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return folder
+
+def measure_stage_memory(func, *args):
+    memory_args = [arg if isinstance(arg, (pd.DataFrame, str)) else copy.deepcopy(arg) for arg in args]
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(*memory_args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 ** 2
+
+def measure_stage(func, *args, track_memory=True):
+    measurement = {}
+    if track_memory:
+        measurement['peak_traced_mb'] = measure_stage_memory(func, *args)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    measurement['seconds'] = time.perf_counter() - started
+    return result, measurement
+
+def load_stage(data_folder):
+    data_loader = DataLoader(data_folder)
+    data = data_loader.load_parquet_files()
+    target_col = data_loader.find_target_column(data)
+    return data.rename(columns={target_col: 'ret_21D'})
+
+def clean_stage(data):
+    return DataCleaner(nan_threshold=NAN_THRESHOLD).clean_data(data)
+
+def select_stage(data):
+    selector = FeatureSelector(max_features=MAX_SELECTED_FEATURES, redundancy_threshold=REDUNDANCY_THRESHOLD)
+    return selector.select_features_static(data)
+
+def engineer_stage(data):
+    processor = FeatureProcessor()
+    data_with_lags = processor.create_lag_features(data, lags=FEATURE_LAGS)
+    return processor.calculate_rolling_features(data_with_lags, windows=ROLLING_WINDOWS)
+
+def train_stage(data, start_date):
+    model = OnlineTreeModel(**MODEL_CONFIG)
+    success = model.train_model(data, start_date, initial_training=True)
+    if not success:
+        model.train_window = min(model.train_window, len(data) // 2)
+        success = model.train_model(data, start_date, initial_training=True)
+    return model if success else None
+
+def backtest_stage(model, data, start_date):
+    backtester = EnhancedStrategyBacktester(model, AdvancedPortfolioManager(**PORTFOLIO_CONFIG))
+    return backtester.run_enhanced_backtest(data, start_date, data.index[-1])
+
+STAGE_FUNCTIONS = {
+    'load': load_stage,
+    'clean': clean_stage,
+    'select': select_stage,
+    'engineer': engineer_stage,
+    'train': train_stage,
+    'backtest': backtest_stage
+}
+
+def run_benchmark_tier(tier, n_days, n_features, nan_ratio=BENCHMARK_NAN_RATIO, seed=BENCHMARK_SEED,
+                       stages=None, data_root=BENCHMARK_DATA_PATH, track_memory=True):
+    stages = stages or BENCHMARK_STAGES
+    last_stage = max(BENCHMARK_STAGES.index(stage) for stage in stages)
+    data_folder = Path(data_root) / f"{tier}_{n_days}x{n_features}"
+
+    print(f"\n基准测试 {tier}: {n_days} 天 × {n_features} 特征, 缺失率 {nan_ratio}")
+    started = time.perf_counter()
+    generate_synthetic_dataset(data_folder, n_days, n_features, nan_ratio, seed)
+    print(f"合成数据就绪: {data_folder} ({time.perf_counter() - started:.1f} 秒)")
+
+    results = {}
+    data, model, start_date = str(data_folder), None, None
+    for stage in BENCHMARK_STAGES[:last_stage + 1]:
+        if stage == 'train':
+            start_date = data.index[int(len(data) * 0.3)]
+            args = (data, start_date)
+        elif stage == 'backtest':
+            if model is None:
+                print("初始训练失败，跳过回测基准")
+                break
+            args = (model, data, start_date)
+        else:
+            args = (data,)
+
+        output, measurement = measure_stage(STAGE_FUNCTIONS[stage], *args, track_memory=track_memory)
+        if stage == 'train':
+            model = output
+        elif stage == 'backtest':
+            measurement['predictions'] = len(output['predictions'])
+        else:
+            data = output
+            measurement['rows'], measurement['columns'] = data.shape
+
+        if stage in stages:
+            results[stage] = measurement
+            print(f"  {stage}: {measurement['seconds']:.2f} 秒"
+                  + (f", 峰值内存 {measurement['peak_traced_mb']:.1f} MB" if track_memory else ""))
+
+    return {
+        'tier': tier,
+        'n_days': n_days,
+        'n_features': n_features,
+        'nan_ratio': nan_ratio,
+        'seed': seed,
+        'process_max_rss_mb': peak_rss_mb(),
+        'stages': results
+    }
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(tiers=None, stages=None, output_dir=BENCHMARK_OUTPUT_PATH, track_memory=True):
+    tiers = tiers or list(BENCHMARK_TIERS)
+    report = {
+        'commit': current_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'versions': {'numpy': np.__version__, 'pandas': pd.__version__},
+        'track_memory': track_memory,
+        'tiers': [run_benchmark_tier(tier, stages=stages, track_memory=track_memory, **BENCHMARK_TIERS[tier])
+                  for tier in tiers]
+    }
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    label = (report['commit'] or 'nocommit')[:12]
+    output_path = output_dir / f"benchmark_{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n基准测试结果已保存至: {output_path}")
+    return report
+
+def main():
+    tiers = [arg for arg in sys.argv[1:] if arg in BENCHMARK_TIERS]
+    stages = [arg for arg in sys.argv[1:] if arg in BENCHMARK_STAGES]
+    unknown = [arg for arg in sys.argv[1:] if arg not in BENCHMARK_TIERS and arg not in BENCHMARK_STAGES
+               and arg != '--no-memory']
+    if unknown:
+        print(f"未知参数: {unknown}, 可用档位: {list(BENCHMARK_TIERS)}, 可用阶段: {BENCHMARK_STAGES}")
+        return
+    run_benchmarks(tiers or ['small'], stages or None, track_memory='--no-memory' not in sys.argv)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import json
+import pickle
+import hashlib
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+class CheckpointStore:
+    def __init__(self, checkpoint_dir, run_key=None, keep_last=None):
+        self.checkpoint_dir = Path(checkpoint_dir) / run_key if run_key else Path(checkpoint_dir)
+        self.keep_last = keep_last
+        self.index_path = self.checkpoint_dir / "index.json"
+        self.entries = self.load_index()
+
+    @staticmethod
+    def make_key(params):
+        payload = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+    @staticmethod
+    def fingerprint_data(feature_matrix, end=None, horizon=0, sample_rows=64):
+        end = len(feature_matrix.dates) if end is None else end
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(feature_matrix.dates[:end]).tobytes())
+        digest.update(json.dumps(list(feature_matrix.feature_columns)).encode('utf-8'))
+        if feature_matrix.target is not None:
+            digest.update(np.ascontiguousarray(feature_matrix.target[:max(0, end - horizon)], dtype=float).tobytes())
+        values = feature_matrix.store.base_values if feature_matrix.lazy else feature_matrix.values
+        if end > 0:
+            rows = np.unique(np.linspace(0, end - 1, sample_rows).astype(int))
+            digest.update(np.ascontiguousarray(values[rows], dtype=float).tobytes())
+        return digest.hexdigest()[:20]
+
+    def load_index(self):
+        if self.index_path.exists():
+            with open(self.index_path) as f:
+                return json.load(f)
+        return {}
+
+    def save_index(self):
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+
+    def dates(self):
+        return sorted(pd.Timestamp(date) for date in self.entries)
+
+    def latest(self, at_or_before=None):
+        dates = self.dates()
+        if at_or_before is not None:
+            dates = [date for date in dates if date <= pd.Timestamp(at_or_before)]
+        for date in reversed(dates):
+            if (self.checkpoint_dir / self.entries[date.isoformat()]).exists():
+                return date
+        return None
+
+    def save(self, date, state):
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        date = pd.Timestamp(date)
+        file_name = f"checkpoint-{date.strftime('%Y%m%d')}.pkl"
+        file_path = self.checkpoint_dir / file_name
+        temp_path = file_path.with_suffix('.tmp')
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, file_path)
+
+        self.entries[date.isoformat()] = file_name
+        if self.keep_last:
+            for old_date in self.dates()[:-self.keep_last]:
+                old_path = self.checkpoint_dir / self.entries.pop(old_date.isoformat())
+                if old_path.exists():
+                    old_path.unlink()
+        self.save_index()
+
+    def load(self, date):
+        with open(self.checkpoint_dir / self.entries[pd.Timestamp(date).isoformat()], 'rb') as f:
+            return pickle.load(f)
@@ -0,0 +1,113 @@
+from pathlib import Path
+import numpy as np
+
+from data_loader import DataLoader, ChunkedDataCleaner, MacroDataEnhancer
+from feature_processor import FeatureSelector, ChunkedFeatureProcessor
+from feature_memmap import ChunkedMemmapWriter, load_feature_memmap
+
+class ChunkedPipeline:
+    def __init__(self, data_folder, output_dir, chunk_rows=250, column_group_size=500, nan_threshold=0.8,
+                 max_features=1000, redundancy_threshold=None, lags=[1, 5, 21], windows=[5, 21, 63],
+                 macro_cache_dir=None, target_col='ret_21D', dtype=np.float32):
+        self.data_folder = data_folder
+        self.output_dir = Path(output_dir)
+        self.chunk_rows = chunk_rows
+        self.column_group_size = column_group_size
+        self.nan_threshold = nan_threshold
+        self.max_features = max_features
+        self.redundancy_threshold = redundancy_threshold
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.macro_cache_dir = macro_cache_dir
+        self.target_col = target_col
+        self.dtype = dtype
+
+        self.loader = DataLoader(data_folder)
+        self.dates = None
+        self.target_source = None
+        self.macro_frame = None
+        self.cleaner = None
+        self.selected_features = []
+
+    def prepare(self):
+        self.dates = self.loader.load_date_index()
+        print(f"分块处理: {len(self.dates)} 行, 清洗每组 {self.column_group_size} 列, 特征工程每块 {self.chunk_rows} 行")
+
+        if self.macro_cache_dir is not None:
+            try:
+                enhancer = MacroDataEnhancer(cache_dir=self.macro_cache_dir)
+                enhancer.download_macro_data(self.dates[0].strftime('%Y-%m-%d'), self.dates[-1].strftime('%Y-%m-%d'))
+                self.macro_frame = enhancer.build_macro_frame()
+            except Exception as e:
+                print(f"宏观数据添加失败: {e}")
+                self.macro_frame = None
+
+    def iter_column_groups(self):
+        for group in self.loader.iter_column_groups(self.dates, self.column_group_size):
+            if self.target_source is None:
+                self.target_source = next((col for col in group.columns if 'ret_21' in col.lower()), None)
+            if self.target_source in group.columns:
+                group = group.rename(columns={self.target_source: self.target_col})
+            yield group
+        if self.macro_frame is not None:
+            yield self.macro_frame.reindex(self.dates)
+
+    def scan(self):
+        self.cleaner = ChunkedDataCleaner(nan_threshold=self.nan_threshold)
+        for group in self.iter_column_groups():
+            self.cleaner.observe(group)
+        if self.target_source is None:
+            raise ValueError("数据中未找到目标变量 'ret_21D'")
+        kept_features = self.cleaner.finalize()
+        if self.target_col not in kept_features:
+            raise ValueError(f"目标变量 {self.target_col} 缺失率超过阈值")
+        print(f"缺失率扫描完成: 保留 {len(kept_features)} / {len(self.cleaner.nan_ratios)} 列")
+        return kept_features
+
+    def clean(self):
+        feature_columns = [col for col in self.cleaner.kept_features if col != self.target_col]
+        writer = ChunkedMemmapWriter(self.output_dir / "cleaned", self.dates, feature_columns,
+                                     self.target_col, self.dtype)
+        position = 0
+        for group in self.iter_column_groups():
+            cleaned = self.cleaner.transform(group)
+            if self.target_col in cleaned.columns:
+                writer.target[:] = cleaned.pop(self.target_col).to_numpy()
+            writer.write_columns(position, cleaned.to_numpy())
+            position += cleaned.shape[1]
+        writer.close()
+        cleaned_data, _ = load_feature_memmap(self.output_dir / "cleaned")
+        print(f"清洗完成: {cleaned_data.shape[0]} 行 × {cleaned_data.shape[1]} 列 (内存映射)")
+        return cleaned_data
+
+    def select(self, cleaned_data):
+        selector = FeatureSelector(max_features=self.max_features, redundancy_threshold=self.redundancy_threshold,
+                                   correlation_block_size=self.column_group_size)
+        selector.select_features_static(cleaned_data, self.target_col)
+        self.selected_features = selector.selected_features
+        return self.selected_features
+
+    def engineer(self, cleaned_data):
+        processor = ChunkedFeatureProcessor(self.lags, self.windows, self.target_col, self.dtype)
+        input_columns = self.selected_features + [self.target_col]
+        output_columns = processor.output_columns(input_columns)
+        target_position = output_columns.index(self.target_col)
+        feature_positions = [i for i in range(len(output_columns)) if i != target_position]
+        writer = ChunkedMemmapWriter(self.output_dir / "features", self.dates,
+                                     [output_columns[i] for i in feature_positions], self.target_col, self.dtype)
+
+        column_positions = cleaned_data.columns.get_indexer(input_columns)
+        for start in range(0, len(cleaned_data), self.chunk_rows):
+            chunk = cleaned_data.iloc[start:start + self.chunk_rows, column_positions]
+            engineered = processor.transform(chunk)
+            writer.write(engineered[:, feature_positions], chunk[self.target_col].to_numpy())
+        writer.close()
+        print(f"特征工程完成: {len(self.dates)} 样本 × {len(output_columns)} 特征 (内存映射)")
+        return load_feature_memmap(self.output_dir / "features")
+
+    def run(self):
+        self.prepare()
+        self.scan()
+        cleaned_data = self.clean()
+        self.select(cleaned_data)
+        return self.engineer(cleaned_data)
@@ -4,8 +4,92 @@ class OutputConfig:
     SHOW_FEATURE_DETAILS = False
     SHOW_TRAINING_DETAILS = False
 
+# 性能追踪配置
+PROFILING_ENABLED = False
+
 # 路径配置
 DATA_FOLDER_PATH = "./dataset/raw_data"
 PROCESSED_DATA_PATH = "./dataset/processed_data/processed_data.parquet"
 OUTPUT_CSV_PATH = "./output/csv_results"
-OUTPUT_CHARTS_PATH = "./output/charts"
\ No newline at end of file
+OUTPUT_CHARTS_PATH = "./output/charts"
+SELECTED_DATA_PATH = "./dataset/processed_data/selected_data.parquet"
+MACRO_DATA_PATH = "./dataset/macro_data"
+STAGE_CACHE_PATH = "./dataset/stage_cache"
+SWEEP_MEMMAP_PATH = "./dataset/sweep_memmap"
+CHECKPOINT_PATH = "./dataset/checkpoints"
+DAILY_STATE_PATH = "./dataset/daily_state/daily_signal_state.pkl"
+DAILY_SIGNAL_PATH = "./output/csv_results/daily_signals.csv"
+BENCHMARK_DATA_PATH = "./dataset/benchmark_data"
+BENCHMARK_OUTPUT_PATH = "./output/benchmarks"
+PROFILE_OUTPUT_PATH = "./output/profiling"
+RESULT_STORE_PATH = "./output/results_store"
+CHUNKED_OUTPUT_PATH = "./dataset/chunked"
+
+# 数据处理配置
+NAN_THRESHOLD = 0.8
+MAX_SELECTED_FEATURES = 1000
+REDUNDANCY_THRESHOLD = 0.95
+STAGE_CACHE_ENABLED = True
+STAGE_CACHE_MAX_BYTES = 20 * 1024 ** 3
+CHUNKED_PIPELINE = False
+PIPELINE_CHUNK_ROWS = 250
+PIPELINE_COLUMN_GROUP_SIZE = 500
+
+# 特征工程配置
+FEATURE_LAGS = [1, 5, 21]
+ROLLING_WINDOWS = [5, 21, 63]
+LAZY_FEATURE_STORE = False
+LAZY_FEATURE_CACHE_SIZE = 2048
+
+# 策略参数配置
+MODEL_CONFIG = {
+    'model_type': 'xgboost',
+    'model_params': {
+        'n_estimators': 50,
+        'max_depth': 6,
+        'learning_rate': 0.05,
+        'subsample': 0.7,
+        'colsample_bytree': 0.7,
+        'random_state': 42,
+        'n_jobs': -1
+    },
+    'train_window': 756,
+    'retrain_freq': 42,
+    'prediction_horizon': 21,
+    'dynamic_feature_selection': True,
+    'max_features': 200,
+    'normalization_history_limit': None
+}
+PORTFOLIO_CONFIG = {
+    'initial_capital': 1000000,
+    'max_position': 0.02,
+    'transaction_cost': 0.005,
+    'kelly_fraction': 0.08,
+    'min_volatility': 0.03,
+    'prediction_threshold': 0.01
+}
+BACKTEST_START_DATE = None
+
+# 断点续跑配置
+CHECKPOINT_ENABLED = False
+CHECKPOINT_EVERY_RETRAINS = 1
+CHECKPOINT_KEEP_LAST = None
+RESUME_FROM_DATE = None
+
+# 参数扫描配置
+PARAMETER_SWEEP_GRID = {
+    'train_window': [504, 756],
+    'retrain_freq': [21, 42],
+    'kelly_fraction': [0.05, 0.08, 0.12],
+    'max_position': [0.02, 0.05]
+}
+SWEEP_MAX_WORKERS = None
+
+# 基准测试配置
+BENCHMARK_TIERS = {
+    'small': {'n_days': 2000, 'n_features': 1000},
+    'medium': {'n_days': 5000, 'n_features': 10000},
+    'large': {'n_days': 10000, 'n_features': 30000}
+}
+BENCHMARK_NAN_RATIO = 0.1
+BENCHMARK_SEED = 42
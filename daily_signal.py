@@ -0,0 +1,185 @@
+import re
+import sys
+import pickle
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+from config import (DATA_FOLDER_PATH, MACRO_DATA_PATH, DAILY_STATE_PATH, DAILY_SIGNAL_PATH,
+                    FEATURE_LAGS, ROLLING_WINDOWS)
+from data_loader import DataLoader, MacroDataEnhancer
+from feature_processor import FeatureProcessor, LazyFeatureStore
+from history_store import RecordHistory
+
+DERIVED_FEATURE_PATTERN = re.compile(r'_(?:lag_\d+|roll_(?:mean|std)_\d+)$')
+
+class DailySignalEngine:
+    def __init__(self, model, portfolio_manager, asset_state, base_history, lags=FEATURE_LAGS,
+                 windows=ROLLING_WINDOWS, target_col='ret_21D', target_source=None):
+        self.model = model
+        self.portfolio_manager = portfolio_manager
+        self.asset_state = asset_state
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.target_col = target_col
+        self.target_source = target_source
+        self.history_length = max(self.lags, default=0) + max(self.windows, default=1) + 1
+        self.base_columns = list(base_history.columns)
+        self.base_history = base_history.sort_index().tail(self.history_length)
+        self.signal_history = RecordHistory(['prediction', 'volatility', 'target_weight'])
+        self.processor = FeatureProcessor()
+        self._recipes = None
+
+    @classmethod
+    def from_backtest(cls, model, portfolio_manager, asset_state, processed_data, lags=FEATURE_LAGS,
+                      windows=ROLLING_WINDOWS, target_col='ret_21D', target_source=None):
+        if isinstance(processed_data, LazyFeatureStore):
+            base_data = processed_data.base_data
+        else:
+            base_columns = [col for col in processed_data.columns if not DERIVED_FEATURE_PATTERN.search(str(col))]
+            base_data = processed_data[base_columns]
+        return cls(model, portfolio_manager, asset_state, base_data, lags, windows, target_col, target_source)
+
+    @classmethod
+    def load(cls, path=DAILY_STATE_PATH):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, path=DAILY_STATE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix('.tmp')
+        with open(temp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_path.replace(path)
+
+    @property
+    def last_date(self):
+        return self.base_history.index[-1]
+
+    def active_features(self):
+        if hasattr(self.model.model, 'feature_names_in_'):
+            return list(self.model.model.feature_names_in_)
+        return sorted(self.model.current_feature_set or [])
+
+    def feature_recipes(self):
+        features = self.active_features()
+        if self._recipes is None or list(self._recipes) != features:
+            store = LazyFeatureStore(self.base_history.iloc[-1:], self.lags, self.windows, self.target_col)
+            self._recipes = {feature: store.parse_feature_name(feature) for feature in features}
+        return self._recipes
+
+    def active_base_columns(self):
+        active = {recipe[0] for recipe in self.feature_recipes().values()}
+        return [col for col in self.base_columns if col in active]
+
+    def load_raw_data(self, start_date, end_date, data_folder=DATA_FOLDER_PATH, macro_cache_dir=MACRO_DATA_PATH):
+        loader = DataLoader(data_folder)
+        if self.target_source is None:
+            self.target_source = loader.find_target_column(pd.DataFrame(columns=loader.list_columns()))
+
+        active_columns = self.active_base_columns()
+        macro_columns = [col for col in active_columns if col in MacroDataEnhancer.macro_tickers]
+        raw_columns = [col for col in active_columns if col not in macro_columns and col != self.target_col]
+        if self.target_source is not None:
+            raw_columns.append(self.target_source)
+
+        raw_data = loader.load_parquet_files(columns=raw_columns, start_date=start_date, end_date=end_date)
+        if self.target_source is not None:
+            raw_data = raw_data.rename(columns={self.target_source: self.target_col})
+
+        if macro_columns:
+            enhancer = MacroDataEnhancer(cache_dir=macro_cache_dir)
+            enhancer.macro_tickers = {name: MacroDataEnhancer.macro_tickers[name] for name in macro_columns}
+            macro_end = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+            raw_data = enhancer.add_all_macro_data(raw_data, pd.Timestamp(start_date).strftime('%Y-%m-%d'), macro_end)
+        return raw_data.sort_index()
+
+    def append_day(self, date, raw_row):
+        previous = self.base_history.iloc[-1]
+        row = raw_row.reindex(self.base_columns).astype(float)
+        row = row.where(row.notna(), previous)
+        new_row = pd.DataFrame([row.to_numpy()], index=pd.DatetimeIndex([date], name=self.base_history.index.name),
+                               columns=self.base_columns)
+        self.base_history = pd.concat([self.base_history, new_row]).tail(self.history_length)
+
+        target = row.get(self.target_col, np.nan)
+        self.asset_state.update(target)
+
+    def compute_features(self):
+        recipes = self.feature_recipes()
+        base_columns = self.active_base_columns()
+        base_positions = {col: i for i, col in enumerate(base_columns)}
+        values = self.base_history[base_columns].to_numpy(dtype=float)
+
+        rolled = {}
+        for window in {recipe[3] for recipe in recipes.values() if recipe[2] is not None}:
+            means, stds = self.processor.rolling_mean_std(values, window)
+            rolled[('mean', window)] = means
+            rolled[('std', window)] = stds
+
+        features = np.full(len(recipes), np.nan)
+        for i, (base_column, lag, stat, window) in enumerate(recipes.values()):
+            if lag < len(values):
+                source = values if stat is None else rolled[(stat, window)]
+                features[i] = source[-1 - lag, base_positions[base_column]]
+
+        features = pd.DataFrame([features], index=self.base_history.index[-1:], columns=list(recipes))
+        features[self.target_col] = self.base_history[self.target_col].iloc[-1:].to_numpy()
+        return features
+
+    def process_day(self, date, raw_row):
+        self.append_day(date, raw_row)
+        features = self.compute_features()
+        prediction = self.model.predict(features, date)
+        if prediction is None:
+            return None
+
+        volatility = self.portfolio_manager.calculate_state_volatility(self.asset_state)
+        recent_performance = self.portfolio_manager.get_recent_performance()
+        target_weight = self.portfolio_manager.conservative_kelly_sizing(prediction, volatility, recent_performance)
+        signal = {
+            'date': date,
+            'prediction': float(prediction),
+            'volatility': float(volatility),
+            'target_weight': float(target_weight)
+        }
+        self.signal_history.append(signal)
+        return signal
+
+    def update(self, end_date=None, data_folder=DATA_FOLDER_PATH, macro_cache_dir=MACRO_DATA_PATH):
+        start_date = self.last_date + pd.Timedelta(days=1)
+        end_date = pd.Timestamp(end_date) if end_date is not None else pd.Timestamp.today().normalize()
+        if start_date > end_date:
+            print(f"每日信号已是最新: {self.last_date.strftime('%Y-%m-%d')}")
+            return []
+
+        raw_data = self.load_raw_data(start_date, end_date, data_folder, macro_cache_dir)
+        signals = []
+        for date, raw_row in raw_data.iterrows():
+            signal = self.process_day(date, raw_row)
+            if signal is not None:
+                signals.append(signal)
+                print(f"{date.strftime('%Y-%m-%d')}: 预测={signal['prediction']:.4f}, "
+                      f"目标权重={signal['target_weight']:.4f}")
+        return signals
+
+def save_daily_state(model, portfolio_manager, asset_state, processed_data, path=DAILY_STATE_PATH):
+    engine = DailySignalEngine.from_backtest(model, portfolio_manager, asset_state, processed_data)
+    engine.save(path)
+    print(f"每日信号状态已保存至: {path}")
+    return engine
+
+def main():
+    end_date = sys.argv[1] if len(sys.argv) > 1 else None
+    engine = DailySignalEngine.load(DAILY_STATE_PATH)
+    signals = engine.update(end_date)
+    if signals:
+        signal_path = Path(DAILY_SIGNAL_PATH)
+        signal_path.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(signals).to_csv(signal_path, mode='a', header=not signal_path.exists(), index=False)
+        print(f"每日信号已保存至: {signal_path}")
+    engine.save(DAILY_STATE_PATH)
+
+if __name__ == "__main__":
+    main()
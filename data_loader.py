@@ -1,31 +1,121 @@
 import pandas as pd
 import numpy as np
+import json
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.parquet as pq
 import yfinance as yf
 from sklearn.preprocessing import StandardScaler
 import warnings
 warnings.filterwarnings('ignore')
 
 class DataLoader:
-    def __init__(self, data_folder_path):
+    def __init__(self, data_folder_path, max_workers=None):
         self.data_folder = Path(data_folder_path)
+        self.max_workers = max_workers
         self.feature_data = None
 
-    def load_parquet_files(self):
+    def find_date_field(self, schema):
+        if 'date' in schema.names:
+            return 'date'
+        pandas_metadata = schema.pandas_metadata or {}
+        for index_column in pandas_metadata.get('index_columns', []):
+            if isinstance(index_column, str) and index_column in schema.names:
+                return index_column
+        return None
+
+    def read_parquet_file(self, file_path, columns=None, start_date=None, end_date=None):
+        feature_name = file_path.stem
+        schema = pq.read_schema(file_path)
+        date_field = self.find_date_field(schema)
+
+        read_columns = None
+        if columns is not None:
+            prefix = f"{feature_name}_"
+            read_columns = [col[len(prefix):] for col in columns
+                            if col.startswith(prefix) and col[len(prefix):] in schema.names]
+            if not read_columns:
+                return feature_name, None
+            if date_field == 'date' and 'date' not in read_columns:
+                read_columns.append('date')
+
+        filters = []
+        if date_field is not None and start_date is not None:
+            filters.append((date_field, '>=', pd.Timestamp(start_date)))
+        if date_field is not None and end_date is not None:
+            filters.append((date_field, '<=', pd.Timestamp(end_date)))
+
+        if filters:
+            try:
+                df = pd.read_parquet(file_path, columns=read_columns, filters=filters)
+            except (pa.ArrowNotImplementedError, pa.ArrowTypeError, pa.ArrowInvalid) as e:
+                print(f"{feature_name} 的日期过滤无法下推 ({e})，读取后再过滤")
+                df = pd.read_parquet(file_path, columns=read_columns)
+        else:
+            df = pd.read_parquet(file_path, columns=read_columns)
+
+        if df.index.name != 'date' and 'date' in df.columns:
+            df = df.set_index('date')
+        df.index = pd.to_datetime(df.index)
+        if start_date is not None:
+            df = df[df.index >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            df = df[df.index <= pd.Timestamp(end_date)]
+        return feature_name, df.add_prefix(f"{feature_name}_")
+
+    def list_columns(self):
+        columns = []
+        for file_path in sorted(self.data_folder.glob("*.parquet")):
+            schema = pq.read_schema(file_path)
+            date_field = self.find_date_field(schema)
+            columns.extend(f"{file_path.stem}_{name}" for name in schema.names
+                           if name != date_field and not name.startswith('__index_level_'))
+        return columns
+
+    def load_date_index(self):
+        dates = []
+        for file_path in self.data_folder.glob("*.parquet"):
+            schema = pq.read_schema(file_path)
+            date_field = self.find_date_field(schema)
+            if date_field is not None:
+                dates.append(pd.to_datetime(pq.read_table(file_path, columns=[date_field]).column(0).to_pandas()).values)
+        if not dates:
+            raise ValueError(f"在 {self.data_folder} 中没有找到带日期字段的parquet文件")
+        return pd.DatetimeIndex(np.unique(np.concatenate(dates)), name='date')
+
+    def iter_column_groups(self, index, group_size=500):
+        for file_path in self.data_folder.glob("*.parquet"):
+            schema = pq.read_schema(file_path)
+            date_field = self.find_date_field(schema)
+            columns = [f"{file_path.stem}_{name}" for name in schema.names
+                       if name != date_field and not name.startswith('__index_level_')]
+            for start in range(0, len(columns), group_size):
+                _, df = self.read_parquet_file(file_path, columns[start:start + group_size])
+                if df is not None:
+                    yield df.reindex(index)
+
+    def load_parquet_files(self, columns=None, start_date=None, end_date=None):
         parquet_files = list(self.data_folder.glob("*.parquet"))
         if not parquet_files:
             raise ValueError(f"在 {self.data_folder} 中没有找到parquet文件")
 
-        features_dict = {}
-        for file_path in parquet_files:
-            feature_name = file_path.stem
+        def read_file(file_path):
             try:
-                df = pd.read_parquet(file_path)
-                df = df.add_prefix(f"{feature_name}_")
+                return self.read_parquet_file(file_path, columns, start_date, end_date), None
+            except Exception as e:
+                return (file_path.stem, None), e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(read_file, parquet_files))
+
+        features_dict = {}
+        for (feature_name, df), error in results:
+            if error is not None:
+                print(f"加载 {feature_name} 失败: {error}")
+            elif df is not None:
                 features_dict[feature_name] = df
                 print(f"成功加载特征: {feature_name}, 形状: {df.shape}")
-            except Exception as e:
-                print(f"加载 {feature_name} 失败: {e}")
 
         return self.merge_features(features_dict)
 
@@ -37,13 +127,19 @@ class DataLoader:
             if df.index.name != 'date' and 'date' in df.columns:
                 df = df.set_index('date')
             df.index = pd.to_datetime(df.index)
-            features_dict[name] = df.sort_index()
+            features_dict[name] = df
 
+        union_index = pd.DatetimeIndex(np.unique(np.concatenate(
+            [df.index.values for df in features_dict.values()])))
+        index_names = {df.index.name for df in features_dict.values()}
+        union_index.name = index_names.pop() if len(index_names) == 1 else None
         all_data = []
         for name, df in features_dict.items():
+            if not df.index.equals(union_index):
+                df = df.reindex(union_index)
             all_data.append(df)
 
-        merged_data = pd.concat(all_data, axis=1, join='outer')
+        merged_data = pd.concat(all_data, axis=1)
         print(f"合并后数据形状: {merged_data.shape}")
         return merged_data
 
@@ -95,63 +191,215 @@ class DataCleaner:
             print(f"警告: 数据中仍有 {remaining_nans} 个NaN值")
         return data_filled
 
+class ChunkedDataCleaner(DataCleaner):
+    def __init__(self, nan_threshold=0.8):
+        super().__init__(nan_threshold)
+        self.nan_ratios = {}
+
+    def observe(self, chunk):
+        self.nan_ratios.update((chunk.isnull().sum() / len(chunk)).to_dict())
+
+    def finalize(self):
+        self.kept_features = [col for col, ratio in self.nan_ratios.items() if ratio <= self.nan_threshold]
+        return self.kept_features
+
+    def transform(self, chunk):
+        kept = [col for col in chunk.columns if self.nan_ratios.get(col, 1.0) <= self.nan_threshold]
+        return chunk[kept].ffill().bfill().fillna(0)
+
+class YFinanceMacroFetcher:
+    def __init__(self, probe_days=14):
+        self.probe_days = probe_days
+
+    def download(self, ticker, start_date, end_date):
+        return yf.download(ticker, start=start_date, end=end_date, progress=False, auto_adjust=True)
+
+    def fetch(self, name, ticker, start_date, end_date):
+        data = self.download(ticker, start_date, end_date)
+        if data.empty:
+            probe_start = (pd.Timestamp(start_date) - pd.Timedelta(days=self.probe_days)).strftime('%Y-%m-%d')
+            if self.download(ticker, probe_start, end_date).empty:
+                raise ValueError(f"{ticker} 在 {start_date} 至 {end_date} 没有返回数据")
+            return pd.Series([], dtype=float, name=name, index=pd.DatetimeIndex([]))
+        if 'Adj Close' in data.columns:
+            macro_series = data['Adj Close']
+        else:
+            macro_series = data['Close']
+        if isinstance(macro_series, pd.DataFrame):
+            macro_series = macro_series.iloc[:, 0]
+        macro_series.name = name
+        return macro_series
+
+class LocalFileMacroFetcher:
+    def __init__(self, folder_path):
+        self.folder = Path(folder_path)
+
+    def fetch(self, name, ticker, start_date, end_date):
+        file_path = self.folder / f"{name}.parquet"
+        if file_path.exists():
+            frame = pd.read_parquet(file_path)
+        else:
+            frame = pd.read_csv(self.folder / f"{name}.csv", index_col=0)
+        macro_series = frame.iloc[:, 0]
+        macro_series.index = pd.to_datetime(macro_series.index)
+        macro_series = macro_series[(macro_series.index >= pd.Timestamp(start_date)) &
+                                    (macro_series.index < pd.Timestamp(end_date))]
+        macro_series.name = name
+        return macro_series
+
+class MacroDataStore:
+    def __init__(self, cache_dir, fetcher=None):
+        self.cache_dir = Path(cache_dir)
+        self.fetcher = fetcher or YFinanceMacroFetcher()
+        self.manifest_path = self.cache_dir / "manifest.json"
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        return {}
+
+    def save_manifest(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+
+    def load_series(self, name):
+        file_path = self.cache_dir / f"{name}.parquet"
+        if not file_path.exists():
+            return pd.Series([], dtype=float, name=name, index=pd.DatetimeIndex([]))
+        macro_series = pd.read_parquet(file_path).iloc[:, 0]
+        macro_series.index = pd.to_datetime(macro_series.index)
+        macro_series.name = name
+        return macro_series
+
+    def save_series(self, name, macro_series):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        macro_series.to_frame(name).to_parquet(self.cache_dir / f"{name}.parquet")
+
+    def missing_ranges(self, name, ticker, start_date, end_date):
+        entry = self.manifest.get(name)
+        if entry is None or entry.get('ticker') != ticker:
+            return [(start_date, end_date)]
+
+        covered_start = pd.Timestamp(entry['start'])
+        covered_end = pd.Timestamp(entry['end'])
+        ranges = []
+        if start_date < covered_start:
+            ranges.append((start_date, min(covered_start, end_date)))
+        if end_date > covered_end:
+            ranges.append((max(covered_end, start_date), end_date))
+        return ranges
+
+    def get_series(self, name, ticker, start_date, end_date):
+        start_date = pd.Timestamp(start_date)
+        end_date = pd.Timestamp(end_date)
+        entry = self.manifest.get(name)
+        if entry is not None and entry.get('ticker') == ticker:
+            cached = self.load_series(name)
+            covered = (pd.Timestamp(entry['start']), pd.Timestamp(entry['end']))
+        else:
+            cached = pd.Series([], dtype=float, name=name, index=pd.DatetimeIndex([]))
+            covered = None
+
+        fetched_parts = []
+        coverage_changed = False
+        for range_start, range_end in self.missing_ranges(name, ticker, start_date, end_date):
+            try:
+                part = self.fetcher.fetch(name, ticker, range_start.strftime('%Y-%m-%d'), range_end.strftime('%Y-%m-%d'))
+            except Exception as e:
+                print(f"获取 {name} {range_start.strftime('%Y-%m-%d')} 至 {range_end.strftime('%Y-%m-%d')} 失败: {e}")
+                continue
+            if len(part) > 0:
+                part.index = pd.to_datetime(part.index)
+                fetched_parts.append(part)
+            coverage_changed = True
+            if covered is None:
+                covered = (range_start, range_end)
+            else:
+                covered = (min(covered[0], range_start), max(covered[1], range_end))
+
+        if coverage_changed:
+            if fetched_parts:
+                cached = pd.concat([part for part in [cached] + fetched_parts if len(part) > 0])
+                cached = cached[~cached.index.duplicated(keep='last')].sort_index()
+                cached.name = name
+            self.save_series(name, cached)
+            self.manifest[name] = {
+                'ticker': ticker,
+                'start': covered[0].strftime('%Y-%m-%d'),
+                'end': covered[1].strftime('%Y-%m-%d')
+            }
+            self.save_manifest()
+
+        return cached[(cached.index >= start_date) & (cached.index < end_date)]
+
 class MacroDataEnhancer:
-    def __init__(self):
+    macro_tickers = {
+        'dollar_index': 'DX-Y.NYB',
+        'vix': '^VIX',
+        'bond_yield_10y': '^TNX',
+        'sp500': '^GSPC',
+        'gold': 'GC=F',
+        'oil': 'CL=F'
+    }
+
+    def __init__(self, cache_dir=None, fetcher=None):
         self.macro_features = []
         self.downloaded_data = {}
+        self.fetcher = fetcher or YFinanceMacroFetcher()
+        self.store = MacroDataStore(cache_dir, self.fetcher) if cache_dir is not None else None
 
     def download_macro_data(self, start_date, end_date):
-        macro_tickers = {
-            'dollar_index': 'DX-Y.NYB',
-            'vix': '^VIX',
-            'bond_yield_10y': '^TNX',
-            'sp500': '^GSPC',
-            'gold': 'GC=F',
-            'oil': 'CL=F'
-        }
-
-        for name, ticker in macro_tickers.items():
+        for name, ticker in self.macro_tickers.items():
             try:
-                print(f"正在下载 {name} 数据...")
-                data = yf.download(ticker, start=start_date, end=end_date, progress=False, auto_adjust=True)
-                if not data.empty:
-                    if 'Adj Close' in data.columns:
-                        macro_series = data['Adj Close']
-                    else:
-                        macro_series = data['Close']
-                    macro_series.name = name
+                print(f"正在获取 {name} 数据...")
+                if self.store is not None:
+                    macro_series = self.store.get_series(name, ticker, start_date, end_date)
+                else:
+                    macro_series = self.fetcher.fetch(name, ticker, start_date, end_date)
+                if len(macro_series) > 0:
                     self.downloaded_data[name] = macro_series
-                    print(f"成功下载 {name} 数据，共 {len(macro_series)} 个数据点")
+                    print(f"成功获取 {name} 数据，共 {len(macro_series)} 个数据点")
                 else:
                     print(f"警告: {name} 数据为空")
             except Exception as e:
-                print(f"下载 {name} 失败: {str(e)}")
+                print(f"获取 {name} 失败: {str(e)}")
                 empty_series = pd.Series([], dtype=float, name=name)
                 self.downloaded_data[name] = empty_series
 
-    def add_all_macro_data(self, data, start_date, end_date):
-        self.download_macro_data(start_date, end_date)
-        enhanced_data = data.copy()
-        macro_data_added = 0
-
+    def build_macro_frame(self):
+        macro_columns = {}
         for macro_name, macro_series in self.downloaded_data.items():
             if len(macro_series) == 0:
                 print(f"跳过空的宏观数据: {macro_name}")
                 continue
-            try:
-                macro_series.index = pd.to_datetime(macro_series.index)
-                enhanced_data.index = pd.to_datetime(enhanced_data.index)
-                if isinstance(macro_series, pd.DataFrame):
-                    print(f"警告: {macro_name} 是DataFrame而不是Series，尝试提取第一列")
-                    macro_series = macro_series.iloc[:, 0]
-                    macro_series.name = macro_name
-                macro_df = pd.DataFrame({macro_name: macro_series})
-                enhanced_data = enhanced_data.merge(macro_df, left_index=True, right_index=True, how='left')
-                self.macro_features.append(macro_name)
-                macro_data_added += 1
-                print(f"已添加宏观特征: {macro_name}")
-            except Exception as e:
-                print(f"添加宏观特征 {macro_name} 失败: {str(e)}")
+            if isinstance(macro_series, pd.DataFrame):
+                print(f"警告: {macro_name} 是DataFrame而不是Series，尝试提取第一列")
+                macro_series = macro_series.iloc[:, 0]
+            macro_series = macro_series.copy()
+            macro_series.index = pd.to_datetime(macro_series.index)
+            macro_columns[macro_name] = macro_series[~macro_series.index.duplicated(keep='last')]
+
+        if not macro_columns:
+            return None
+        return pd.concat(macro_columns, axis=1)
+
+    def add_all_macro_data(self, data, start_date, end_date):
+        self.download_macro_data(start_date, end_date)
+        enhanced_data = data.copy()
+        enhanced_data.index = pd.to_datetime(enhanced_data.index)
+
+        try:
+            macro_frame = self.build_macro_frame()
+            if macro_frame is not None:
+                enhanced_data = enhanced_data.join(macro_frame, how='left')
+                for macro_name in macro_frame.columns:
+                    self.macro_features.append(macro_name)
+                    print(f"已添加宏观特征: {macro_name}")
+        except Exception as e:
+            print(f"添加宏观特征失败: {str(e)}")
 
-        print(f"宏观数据添加完成，成功添加 {macro_data_added} 个宏观特征")
-        return enhanced_data
\ No newline at end of file
+        print(f"宏观数据添加完成，成功添加 {len(self.macro_features)} 个宏观特征")
+        return enhanced_data
@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+from signal_builder import FeatureMatrix
+
+def write_feature_memmap(data, folder, target_col='ret_21D', column_block_size=1000):
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index(kind='stable')
+
+    feature_columns = [col for col in data.columns if col != target_col]
+    values = np.lib.format.open_memmap(folder / "features.npy", mode='w+', dtype=np.float64,
+                                       shape=(len(data), len(feature_columns)))
+    for start in range(0, len(feature_columns), column_block_size):
+        block = feature_columns[start:start + column_block_size]
+        values[:, start:start + len(block)] = data[block].to_numpy(dtype=np.float64)
+    values.flush()
+    del values
+
+    np.save(folder / "target.npy", data[target_col].to_numpy(dtype=float))
+    np.save(folder / "index.npy", data.index.values)
+    with open(folder / "columns.json", 'w') as f:
+        json.dump({'feature_columns': feature_columns, 'target_col': target_col}, f)
+    return folder
+
+def load_feature_memmap(folder):
+    folder = Path(folder)
+    with open(folder / "columns.json") as f:
+        meta = json.load(f)
+
+    values = np.load(folder / "features.npy", mmap_mode='r')
+    index = pd.DatetimeIndex(np.load(folder / "index.npy"))
+    data = pd.DataFrame(values, index=index, columns=meta['feature_columns'], copy=False)
+    data[meta['target_col']] = np.load(folder / "target.npy")
+    return data, FeatureMatrix(data, meta['target_col'], values=values)
+
+class ChunkedMemmapWriter:
+    def __init__(self, folder, index, feature_columns, target_col='ret_21D', dtype=np.float32):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.feature_columns = list(feature_columns)
+        self.target_col = target_col
+        self.values = np.lib.format.open_memmap(self.folder / "features.npy", mode='w+', dtype=dtype,
+                                                shape=(len(index), len(self.feature_columns)))
+        self.target = np.full(len(index), np.nan)
+        self.position = 0
+        np.save(self.folder / "index.npy", index.values)
+
+    def write(self, values, target):
+        end = self.position + len(values)
+        self.values[self.position:end] = values
+        self.target[self.position:end] = target
+        self.position = end
+
+    def write_columns(self, start, values):
+        self.values[:, start:start + values.shape[1]] = values
+
+    def close(self):
+        self.values.flush()
+        del self.values
+        np.save(self.folder / "target.npy", self.target)
+        with open(self.folder / "columns.json", 'w') as f:
+            json.dump({'feature_columns': self.feature_columns, 'target_col': self.target_col}, f)
+        return self.folder
@@ -1,63 +1,213 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import spearmanr
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from sklearn.feature_selection import mutual_info_regression
 
+_mutual_info_worker_state = {}
+
+def _score_mutual_info_columns(values, column_positions, random_state):
+    target = values[:, -1]
+    scores = []
+    for position in column_positions:
+        try:
+            scores.append(mutual_info_regression(values[:, [position]], target, random_state=random_state)[0])
+        except Exception:
+            scores.append(0)
+    return scores
+
+def _init_mutual_info_worker(shm_name, shape, random_state):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _mutual_info_worker_state['shm'] = shm
+    _mutual_info_worker_state['values'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _mutual_info_worker_state['random_state'] = random_state
+
+def _score_mutual_info_batch(column_positions):
+    values = _mutual_info_worker_state['values']
+    random_state = _mutual_info_worker_state['random_state']
+    return column_positions, _score_mutual_info_columns(values, column_positions, random_state)
+
 class FeatureSelector:
     def __init__(self, max_features=1000, correlation_threshold=0.01,
-                 mutual_info_threshold=0.01, variance_threshold=0.01):
+                 mutual_info_threshold=0.01, variance_threshold=0.01,
+                 correlation_block_size=1000, mutual_info_n_jobs=-1,
+                 mutual_info_batch_size=256, mutual_info_max_features=None,
+                 redundancy_threshold=None, redundancy_sketch_size=256, redundancy_sketch_margin=0.1,
+                 random_state=42):
         self.max_features = max_features
         self.correlation_threshold = correlation_threshold
         self.mutual_info_threshold = mutual_info_threshold
         self.variance_threshold = variance_threshold
+        self.correlation_block_size = correlation_block_size
+        self.mutual_info_n_jobs = mutual_info_n_jobs
+        self.mutual_info_batch_size = mutual_info_batch_size
+        self.mutual_info_max_features = mutual_info_max_features
+        self.redundancy_threshold = redundancy_threshold
+        self.redundancy_sketch_size = redundancy_sketch_size
+        self.redundancy_sketch_margin = redundancy_sketch_margin
+        self.random_state = random_state
         self.selected_features = []
+        self.redundancy_clusters = {}
+
+    def calculate_feature_variance(self, data, feature_columns=None):
+        if feature_columns is None:
+            return data.var()
+        return pd.concat([data[feature_columns[start:start + self.correlation_block_size]].var()
+                          for start in range(0, len(feature_columns), self.correlation_block_size)])
 
-    def calculate_feature_variance(self, data):
-        return data.var()
+    def calculate_masked_correlation(self, x_values, y_values, valid, valid_counts):
+        counts = np.maximum(valid_counts, 1)
+        x_mean = np.where(valid, x_values, 0).sum(axis=0) / counts
+        y_mean = np.where(valid, y_values, 0).sum(axis=0) / counts
+        x_centered = np.where(valid, x_values - x_mean, 0)
+        y_centered = np.where(valid, y_values - y_mean, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (x_centered * y_centered).sum(axis=0) / np.sqrt(
+                (x_centered ** 2).sum(axis=0) * (y_centered ** 2).sum(axis=0))
 
-    def calculate_target_correlation(self, data, target_col='ret_21D'):
+    def calculate_target_correlation(self, data, target_col='ret_21D', feature_columns=None):
         correlations = {}
-        target = data[target_col]
+        if feature_columns is None:
+            feature_columns = [col for col in data.columns if col != target_col]
+        target = data[target_col].to_numpy(dtype=float)
+        target_valid = ~np.isnan(target)
+
+        for start in range(0, len(feature_columns), self.correlation_block_size):
+            block_columns = feature_columns[start:start + self.correlation_block_size]
+            block = data[block_columns].to_numpy(dtype=float, copy=True)
+            valid = ~np.isnan(block) & target_valid[:, None]
+            valid_counts = valid.sum(axis=0)
 
-        for column in data.columns:
-            if column != target_col:
-                valid_data = data[[column, target_col]].dropna()
-                if len(valid_data) > 10:
-                    corr, _ = spearmanr(valid_data[column], valid_data[target_col])
+            block[~valid] = np.nan
+            target_block = np.where(valid, target[:, None], np.nan)
+            feature_ranks = pd.DataFrame(block).rank(method='average').to_numpy()
+            target_ranks = pd.DataFrame(target_block).rank(method='average').to_numpy()
+            block_correlations = self.calculate_masked_correlation(feature_ranks, target_ranks, valid, valid_counts)
+
+            for column, count, corr in zip(block_columns, valid_counts, block_correlations):
+                if count > 10:
                     correlations[column] = abs(corr) if not np.isnan(corr) else 0
         return correlations
 
-    def calculate_mutual_information(self, data, target_col='ret_21D', sample_fraction=0.1):
-        sample_data = data.sample(frac=sample_fraction, random_state=42) if len(data) > 1000 else data
+    def resolve_mutual_info_workers(self, n_batches):
+        n_jobs = self.mutual_info_n_jobs
+        if n_jobs is None or n_jobs < 0:
+            n_jobs = os.cpu_count() or 1
+        return max(1, min(n_jobs, n_batches))
+
+    def calculate_mutual_information(self, data, target_col='ret_21D', sample_fraction=0.1, feature_columns=None):
+        columns = list(data.columns) if feature_columns is None else list(feature_columns) + [target_col]
+        rows = np.arange(len(data))
+        if len(data) > 1000:
+            rows = pd.Series(rows).sample(frac=sample_fraction, random_state=self.random_state).to_numpy()
+        sample_data = data.iloc[rows, data.columns.get_indexer(columns)]
         sample_data = sample_data.dropna()
         if len(sample_data) < 50:
             return {}
 
-        X_sample = sample_data.drop(target_col, axis=1)
-        y_sample = sample_data[target_col]
-        max_features_to_test = min(1000, len(X_sample.columns))
-        features_to_test = np.random.choice(X_sample.columns, max_features_to_test, replace=False)
+        feature_columns = [col for col in sample_data.columns if col != target_col]
+        if self.mutual_info_max_features is not None and self.mutual_info_max_features < len(feature_columns):
+            rng = np.random.default_rng(self.random_state)
+            chosen = rng.choice(len(feature_columns), self.mutual_info_max_features, replace=False)
+            feature_columns = [feature_columns[i] for i in chosen]
 
-        mi_scores = {}
-        for feature in features_to_test:
+        sample_values = np.ascontiguousarray(sample_data[feature_columns + [target_col]].to_numpy(dtype=np.float64))
+        positions = list(range(len(feature_columns)))
+        batches = [positions[i:i + self.mutual_info_batch_size]
+                   for i in range(0, len(positions), self.mutual_info_batch_size)]
+        n_workers = self.resolve_mutual_info_workers(len(batches))
+
+        scores = np.zeros(len(feature_columns))
+        if n_workers == 1:
+            for batch in batches:
+                scores[batch] = _score_mutual_info_columns(sample_values, batch, self.random_state)
+        else:
+            shm = shared_memory.SharedMemory(create=True, size=sample_values.nbytes)
             try:
-                mi = mutual_info_regression(X_sample[[feature]].values.reshape(-1, 1), y_sample, random_state=42)[0]
-                mi_scores[feature] = mi
-            except:
-                mi_scores[feature] = 0
-        return mi_scores
+                shared_values = np.ndarray(sample_values.shape, dtype=np.float64, buffer=shm.buf)
+                shared_values[:] = sample_values
+                with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_mutual_info_worker,
+                                         initargs=(shm.name, sample_values.shape, self.random_state)) as executor:
+                    for batch, batch_scores in executor.map(_score_mutual_info_batch, batches):
+                        scores[batch] = batch_scores
+            finally:
+                shm.close()
+                shm.unlink()
+
+        return dict(zip(feature_columns, scores))
+
+    def standardize_columns(self, values):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.nanmean(values, axis=0)
+            stds = np.nanstd(values, axis=0)
+        stds = np.where(stds > 1e-12, stds, np.inf)
+        return np.nan_to_num((values - means) / stds) / np.sqrt(len(values))
+
+    def prune_redundant_features(self, data, ranked_features):
+        n_rows = len(data)
+        sketch = None
+        screen_threshold = self.redundancy_threshold
+        if n_rows > self.redundancy_sketch_size:
+            rng = np.random.default_rng(self.random_state)
+            sketch = rng.standard_normal((self.redundancy_sketch_size, n_rows)) / np.sqrt(self.redundancy_sketch_size)
+            screen_threshold = max(self.redundancy_threshold - self.redundancy_sketch_margin, 0)
+
+        representative_values = np.empty((n_rows, len(ranked_features)))
+        representative_sketches = np.empty((len(sketch) if sketch is not None else n_rows, len(ranked_features)))
+        representatives = []
+        clusters = {}
+
+        for start in range(0, len(ranked_features), self.correlation_block_size):
+            block_columns = ranked_features[start:start + self.correlation_block_size]
+            block_values = self.standardize_columns(data[block_columns].to_numpy(dtype=float))
+            block_sketches = block_values
+            if sketch is not None:
+                block_sketches = sketch @ block_values
+                norms = np.linalg.norm(block_sketches, axis=0)
+                block_sketches = block_sketches / np.where(norms > 0, norms, 1.0)
+            n_before = len(representatives)
+            block_screen = np.abs(block_sketches.T @ representative_sketches[:, :n_before])
+
+            for j, column in enumerate(block_columns):
+                n_current = len(representatives)
+                screen = block_screen[j]
+                if n_current > n_before:
+                    screen = np.concatenate([screen, np.abs(
+                        block_sketches[:, j] @ representative_sketches[:, n_before:n_current])])
+
+                candidates = np.flatnonzero(screen >= screen_threshold)
+                if len(candidates) > 0:
+                    exact = np.abs(block_values[:, j] @ representative_values[:, candidates])
+                    best = np.argmax(exact)
+                    if exact[best] >= self.redundancy_threshold:
+                        clusters[representatives[candidates[best]]].append(column)
+                        continue
+
+                representative_values[:, n_current] = block_values[:, j]
+                representative_sketches[:, n_current] = block_sketches[:, j]
+                representatives.append(column)
+                clusters[column] = [column]
+
+        self.redundancy_clusters = clusters
+        n_merged = sum(len(members) - 1 for members in clusters.values())
+        print(f"冗余特征剔除: {n_merged} 个高相关特征 (|ρ| >= {self.redundancy_threshold}) 被合并, "
+              f"保留 {len(representatives)} 个代表特征")
+        return representatives
 
     def select_features_static(self, data, target_col='ret_21D'):
         print(f"原始特征数量: {len(data.columns)}")
-        variances = self.calculate_feature_variance(data.drop(target_col, axis=1))
+        variances = self.calculate_feature_variance(data, [col for col in data.columns if col != target_col])
         high_variance_features = variances[variances > self.variance_threshold].index.tolist()
         print(f"高方差特征数量: {len(high_variance_features)}")
 
-        correlations = self.calculate_target_correlation(data[high_variance_features + [target_col]], target_col)
+        correlations = self.calculate_target_correlation(data, target_col, high_variance_features)
         mi_scores = {}
         if len(high_variance_features) > 1000:
             print("计算互信息...")
-            mi_scores = self.calculate_mutual_information(data[high_variance_features + [target_col]], target_col)
+            mi_scores = self.calculate_mutual_information(data, target_col, feature_columns=high_variance_features)
 
         feature_scores = {}
         for feature in high_variance_features:
@@ -68,6 +218,8 @@ class FeatureSelector:
 
         sorted_features = sorted(feature_scores.items(), key=lambda x: x[1], reverse=True)
         selected_features = [feature for feature, score in sorted_features[:self.max_features]]
+        if self.redundancy_threshold is not None:
+            selected_features = self.prune_redundant_features(data, selected_features)
         final_features = selected_features + [target_col]
 
         print(f"静态特征选择完成，选择 {len(selected_features)} 个特征")
@@ -76,35 +228,202 @@ class FeatureSelector:
         return data[final_features]
 
 class FeatureProcessor:
-    def __init__(self):
-        pass
+    def __init__(self, dtype=np.float64, column_block_size=1000):
+        self.dtype = dtype
+        self.column_block_size = column_block_size
+
+    def shift_values(self, values, lag):
+        shifted = np.full(values.shape, np.nan)
+        if lag == 0:
+            shifted[:] = values
+        elif 0 < lag < len(values):
+            shifted[lag:] = values[:-lag]
+        elif 0 < -lag < len(values):
+            shifted[:lag] = values[-lag:]
+        return shifted
+
+    def window_difference(self, cumulative, window):
+        windowed = cumulative[1:].copy()
+        windowed[window:] -= cumulative[1:-window] if window < len(cumulative) - 1 else 0
+        return windowed
+
+    def rolling_mean_std(self, values, window):
+        valid = ~np.isnan(values)
+        center = np.where(valid, values, 0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+        centered = np.where(valid, values - center, 0)
+
+        n_rows, n_cols = values.shape
+        zeros = np.zeros((1, n_cols))
+        counts = self.window_difference(np.vstack([zeros, np.cumsum(valid, axis=0)]), window)
+        sums = self.window_difference(np.vstack([zeros, np.cumsum(centered, axis=0)]), window)
+        sums_sq = self.window_difference(np.vstack([zeros, np.cumsum(centered ** 2, axis=0)]), window)
+
+        previous_valid = pd.DataFrame(values).ffill().shift(1).to_numpy()
+        changes = valid & ~np.isnan(previous_valid) & (values != previous_valid)
+        change_counts = self.window_difference(np.vstack([zeros, np.cumsum(changes, axis=0)]), window - 1) if window > 1 else np.zeros_like(counts)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(counts >= 1, sums / counts + center, np.nan)
+            variances = (sums_sq - sums * sums / counts) / (counts - 1)
+        variances = np.where(change_counts > 0, np.maximum(variances, 0), 0)
+        stds = np.where(counts >= 2, np.sqrt(variances), np.nan)
+        return means, stds
 
     def create_lag_features(self, data, lags=[1, 7, 21]):
-        lagged_data = data.copy()
         original_columns = [col for col in data.columns if col != 'ret_21D']
-        lag_features_created = 0
+        values = data[original_columns].to_numpy(dtype=float)
 
+        lag_blocks = []
         for lag in lags:
-            for column in original_columns:
-                new_col_name = f'{column}_lag_{lag}'
-                lagged_data[new_col_name] = data[column].shift(lag)
-                lag_features_created += 1
+            lag_blocks.append(pd.DataFrame(
+                self.shift_values(values, lag).astype(self.dtype, copy=False),
+                index=data.index,
+                columns=[f'{column}_lag_{lag}' for column in original_columns]
+            ))
 
+        lagged_data = pd.concat([data] + lag_blocks, axis=1)
         print(f"滞后特征处理后数据形状: {lagged_data.shape}")
         return lagged_data
 
     def calculate_rolling_features(self, data, windows=[7, 21, 63]):
         print("计算滚动特征...")
-        rolled_data = data.copy()
         original_columns = [col for col in data.columns if col != 'ret_21D']
         roll_features_created = 0
 
+        roll_blocks = []
         for window in windows:
-            for column in original_columns:
-                rolled_data[f'{column}_roll_mean_{window}'] = data[column].rolling(window, min_periods=1).mean()
-                rolled_data[f'{column}_roll_std_{window}'] = data[column].rolling(window, min_periods=1).std()
-                roll_features_created += 2
+            window_blocks = []
+            for start in range(0, len(original_columns), self.column_block_size):
+                block_columns = original_columns[start:start + self.column_block_size]
+                means, stds = self.rolling_mean_std(data[block_columns].to_numpy(dtype=float), window)
+                stats = np.stack([means, stds], axis=2).reshape(len(data), 2 * len(block_columns))
+                names = [name for column in block_columns
+                         for name in (f'{column}_roll_mean_{window}', f'{column}_roll_std_{window}')]
+                window_blocks.append(pd.DataFrame(stats.astype(self.dtype, copy=False), index=data.index, columns=names))
+                roll_features_created += 2 * len(block_columns)
+            roll_blocks.extend(window_blocks)
 
+        rolled_data = pd.concat([data] + roll_blocks, axis=1)
         print(f"创建了 {roll_features_created} 个滚动特征")
         print(f"滚动特征处理后数据形状: {rolled_data.shape}")
-        return rolled_data
\ No newline at end of file
+        return rolled_data
+
+class ChunkedFeatureProcessor(FeatureProcessor):
+    def __init__(self, lags=[1, 5, 21], windows=[5, 21, 63], target_col='ret_21D', dtype=np.float32,
+                 column_block_size=1000):
+        super().__init__(dtype, column_block_size)
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.target_col = target_col
+        self.history_length = max(self.lags, default=0) + max(self.windows, default=0)
+        self.tail = None
+
+    def output_columns(self, columns):
+        base_columns = [col for col in columns if col != self.target_col]
+        lag_columns = [f'{column}_lag_{lag}' for lag in self.lags for column in base_columns]
+        roll_columns = [name for window in self.windows for column in base_columns + lag_columns
+                        for name in (f'{column}_roll_mean_{window}', f'{column}_roll_std_{window}')]
+        return list(columns) + lag_columns + roll_columns
+
+    def transform(self, chunk):
+        values = chunk.to_numpy(dtype=float)
+        n_rows = len(values)
+        history = values if self.tail is None else np.vstack([self.tail, values])
+        self.tail = history[len(history) - min(self.history_length, len(history)):]
+
+        base_positions = [i for i, col in enumerate(chunk.columns) if col != self.target_col]
+        base = history[:, base_positions]
+        lagged = [self.shift_values(base, lag) for lag in self.lags]
+        sources = np.hstack([base] + lagged)
+
+        blocks = [values] + [block[-n_rows:] for block in lagged]
+        for window in self.windows:
+            for start in range(0, sources.shape[1], self.column_block_size):
+                means, stds = self.rolling_mean_std(sources[:, start:start + self.column_block_size], window)
+                blocks.append(np.stack([means[-n_rows:], stds[-n_rows:]], axis=2).reshape(n_rows, -1))
+        return np.hstack(blocks).astype(self.dtype, copy=False)
+
+class LazyFeatureStore:
+    def __init__(self, base_data, lags=[1, 5, 21], windows=[5, 21, 63],
+                 target_col='ret_21D', max_cached_columns=2048, dtype=np.float64):
+        if not base_data.index.is_monotonic_increasing:
+            base_data = base_data.sort_index(kind='stable')
+        self.base_data = base_data
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.target_col = target_col
+        self.max_cached_columns = max_cached_columns
+        self.dtype = dtype
+        self.processor = FeatureProcessor(dtype=dtype)
+
+        self.index = base_data.index
+        self.base_columns = [col for col in base_data.columns if col != target_col]
+        self.base_positions = {col: i for i, col in enumerate(self.base_columns)}
+        self.base_values = base_data[self.base_columns].to_numpy(dtype=float)
+        self.target = base_data[target_col].to_numpy(dtype=float) if target_col in base_data.columns else None
+
+        self.recipes = {col: (col, 0, None, None) for col in self.base_columns}
+        for lag in self.lags:
+            for col in self.base_columns:
+                self.recipes[f'{col}_lag_{lag}'] = (col, lag, None, None)
+        rolled_columns = list(self.recipes.items())
+        for window in self.windows:
+            for name, (col, lag, _, _) in rolled_columns:
+                self.recipes[f'{name}_roll_mean_{window}'] = (col, lag, 'mean', window)
+                self.recipes[f'{name}_roll_std_{window}'] = (col, lag, 'std', window)
+
+        self.feature_columns = list(self.recipes)
+        self.columns = list(base_data.columns) + self.feature_columns[len(self.base_columns):]
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.index)
+
+    def parse_feature_name(self, name):
+        if name in self.recipes:
+            return self.recipes[name]
+        match = re.match(r'^(?P<base>.+?)(?:_lag_(?P<lag>\d+))?(?:_roll_(?P<stat>mean|std)_(?P<window>\d+))?$', name)
+        if match is None or match.group('base') not in self.base_positions:
+            raise KeyError(f"无法解析特征: {name}")
+        lag = int(match.group('lag')) if match.group('lag') else 0
+        window = int(match.group('window')) if match.group('window') else None
+        return match.group('base'), lag, match.group('stat'), window
+
+    def compute_column(self, recipe):
+        base_column, lag, stat, window = recipe
+        values = self.base_values[:, [self.base_positions[base_column]]]
+        if stat is not None:
+            means, stds = self.processor.rolling_mean_std(values, window)
+            values = means if stat == 'mean' else stds
+        if lag:
+            values = self.processor.shift_values(values, lag)
+        return values[:, 0].astype(self.dtype, copy=False)
+
+    def get_column(self, name):
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return self._cache[name]
+
+        if name == self.target_col and self.target is not None:
+            return self.target
+        values = self.compute_column(self.parse_feature_name(name))
+        self._cache[name] = values
+        while len(self._cache) > self.max_cached_columns:
+            self._cache.popitem(last=False)
+        return values
+
+    def get_frame(self, columns=None, start=0, end=None, include_target=False):
+        if columns is None:
+            columns = self.feature_columns
+        columns = list(columns)
+        if include_target and self.target is not None:
+            columns = columns + [self.target_col]
+
+        end = len(self.index) if end is None else end
+        values = np.empty((max(0, end - start), len(columns)))
+        for i, column in enumerate(columns):
+            values[:, i] = self.get_column(column)[start:end]
+        return pd.DataFrame(values, index=self.index[start:end], columns=columns)
+
+    def materialize(self):
+        return self.get_frame(self.columns)
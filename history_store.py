@@ -0,0 +1,250 @@
+import numpy as np
+import pandas as pd
+
+NORMALIZATION_METHODS = ['standard_normalization', 'robust_normalization', 'median_centering']
+
+class FeatureRegistry:
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, names):
+        ids = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            feature_id = self.ids.get(name)
+            if feature_id is None:
+                feature_id = len(self.names)
+                self.ids[name] = feature_id
+                self.names.append(name)
+            ids[i] = feature_id
+        return ids
+
+class GrowableMatrix:
+    def __init__(self, n_columns=0, dtype=np.float64, fill_value=np.nan, capacity=16):
+        self.dtype = dtype
+        self.fill_value = fill_value
+        self.n_rows = 0
+        self.n_columns = n_columns
+        self.data = np.full((capacity, max(n_columns, 1)), fill_value, dtype=dtype)
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def values(self):
+        return self.data[:self.n_rows, :self.n_columns]
+
+    def reserve(self, n_rows, n_columns):
+        capacity_rows, capacity_columns = self.data.shape
+        if n_rows > capacity_rows or n_columns > capacity_columns:
+            grown = np.full((max(n_rows, 2 * capacity_rows), max(n_columns, 2 * capacity_columns)),
+                            self.fill_value, dtype=self.dtype)
+            grown[:self.n_rows, :self.n_columns] = self.values
+            self.data = grown
+        self.n_columns = max(self.n_columns, n_columns)
+
+    def append(self, values, positions=None, n_columns=None):
+        n_columns = self.n_columns if n_columns is None else max(self.n_columns, n_columns)
+        self.reserve(self.n_rows + 1, n_columns)
+        if positions is None:
+            self.data[self.n_rows, :len(values)] = values
+        else:
+            self.data[self.n_rows, positions] = values
+        self.n_rows += 1
+
+    def drop_first(self, n_rows):
+        n_rows = min(n_rows, self.n_rows)
+        if n_rows <= 0:
+            return
+        remaining = self.n_rows - n_rows
+        self.data[:remaining] = self.data[n_rows:self.n_rows]
+        self.data[remaining:self.n_rows] = self.fill_value
+        self.n_rows = remaining
+
+class RecordHistory:
+    def __init__(self, fields=None):
+        self.fields = []
+        self.field_positions = {}
+        self.dates = GrowableMatrix(1, 'datetime64[ns]', np.datetime64('NaT'))
+        self.values = GrowableMatrix(0)
+        self.assets = FeatureRegistry()
+        self.weights = GrowableMatrix(0, fill_value=0.0)
+        self.has_weights = False
+        for field in fields or []:
+            self.add_field(field)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.record(i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        return self.record(key)
+
+    def add_field(self, field):
+        self.field_positions[field] = len(self.fields)
+        self.fields.append(field)
+        self.values.reserve(len(self.values), len(self.fields))
+
+    def append(self, record):
+        row = np.full(len(self.fields), np.nan)
+        date = np.datetime64('NaT')
+        weights = None
+        for key, value in record.items():
+            if key == 'date':
+                date = np.datetime64(pd.Timestamp(value), 'ns')
+            elif key == 'weights':
+                weights = value
+            else:
+                if key not in self.field_positions:
+                    self.add_field(key)
+                    row = np.append(row, np.nan)
+                row[self.field_positions[key]] = np.nan if value is None else float(value)
+
+        self.dates.append([date])
+        self.values.append(row, n_columns=len(self.fields))
+        if weights is not None:
+            self.has_weights = True
+        if weights:
+            positions = self.assets.intern(list(weights))
+            self.weights.append(np.array(list(weights.values()), dtype=float), positions, len(self.assets))
+        else:
+            self.weights.append([], n_columns=len(self.assets))
+
+    def record(self, i):
+        record = {'date': pd.Timestamp(self.dates.data[i, 0])}
+        for position, field in enumerate(self.fields):
+            record[field] = self.values.data[i, position]
+        if self.has_weights:
+            row = self.weights.data[i, :self.weights.n_columns]
+            record['weights'] = {self.assets.names[j]: row[j] for j in np.flatnonzero(row)}
+        return record
+
+    def column(self, field):
+        if field == 'date':
+            return self.dates.values[:, 0]
+        return self.values.values[:, self.field_positions[field]]
+
+    def to_frame(self):
+        frame = pd.DataFrame(self.values.values, columns=self.fields)
+        frame.insert(0, 'date', self.dates.values[:, 0])
+        if self.has_weights:
+            for position, asset in enumerate(self.assets.names):
+                frame[f'weight_{asset}'] = self.weights.values[:, position]
+        return frame
+
+class ImportanceHistory:
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else FeatureRegistry()
+        self.dates = GrowableMatrix(1, 'datetime64[ns]', np.datetime64('NaT'))
+        self.importances = GrowableMatrix(0)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.frame(i)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.frame(i)
+
+    def append(self, date, features, importances):
+        positions = self.registry.intern(list(features))
+        self.dates.append([np.datetime64(pd.Timestamp(date), 'ns')])
+        self.importances.append(np.asarray(importances, dtype=float), positions, len(self.registry))
+
+    def frame(self, i):
+        row = self.importances.data[i, :self.importances.n_columns]
+        positions = np.flatnonzero(~np.isnan(row))
+        return pd.DataFrame({
+            'feature': [self.registry.names[j] for j in positions],
+            'importance': row[positions],
+            'date': pd.Timestamp(self.dates.data[i, 0])
+        }).sort_values('importance', ascending=False)
+
+    def matrix(self):
+        return pd.DataFrame(self.importances.values, index=pd.DatetimeIndex(self.dates.values[:, 0], name='date'),
+                            columns=self.registry.names[:self.importances.n_columns])
+
+    def to_frame(self):
+        values = self.importances.values
+        rows, positions = np.nonzero(~np.isnan(values))
+        names = np.asarray(self.registry.names, dtype=object)
+        frame = pd.DataFrame({
+            'feature': names[positions] if len(positions) else np.array([], dtype=object),
+            'importance': values[rows, positions],
+            'date': self.dates.values[rows, 0],
+            'retrain': rows
+        })
+        return frame.sort_values(['retrain', 'importance'], ascending=[True, False], kind='stable')
+
+class NormalizationHistory:
+    def __init__(self, registry=None, max_entries=None):
+        self.registry = registry if registry is not None else FeatureRegistry()
+        self.max_entries = max_entries
+        self.dates = GrowableMatrix(1, 'datetime64[ns]', np.datetime64('NaT'))
+        self.centers = GrowableMatrix(0)
+        self.scales = GrowableMatrix(0)
+        self.methods = GrowableMatrix(0, np.int8, -1)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, column):
+        position = self.registry.ids.get(column)
+        return (position is not None and position < self.methods.n_columns
+                and bool((self.methods.values[:, position] >= 0).any()))
+
+    def __getitem__(self, column):
+        if column not in self:
+            raise KeyError(column)
+        position = self.registry.ids[column]
+        methods = self.methods.values[:, position]
+        return [{
+            'date': pd.Timestamp(self.dates.data[i, 0]),
+            'mean': self.centers.data[i, position],
+            'std': self.scales.data[i, position],
+            'method': NORMALIZATION_METHODS[methods[i]]
+        } for i in np.flatnonzero(methods >= 0)]
+
+    def append(self, date, columns, centers, scales, methods):
+        positions = self.registry.intern(list(columns))
+        method_codes = np.array([NORMALIZATION_METHODS.index(str(method)) for method in methods], dtype=np.int8)
+        n_columns = len(self.registry)
+        self.dates.append([np.datetime64(pd.Timestamp(date), 'ns')])
+        self.centers.append(np.asarray(centers, dtype=float), positions, n_columns)
+        self.scales.append(np.asarray(scales, dtype=float), positions, n_columns)
+        self.methods.append(method_codes, positions, n_columns)
+
+        if self.max_entries is not None and len(self) > self.max_entries:
+            excess = len(self) - self.max_entries
+            for history in (self.dates, self.centers, self.scales, self.methods):
+                history.drop_first(excess)
+
+    def to_frame(self):
+        methods = self.methods.values
+        rows, positions = np.nonzero(methods >= 0)
+        names = np.asarray(self.registry.names, dtype=object)
+        return pd.DataFrame({
+            'date': self.dates.values[rows, 0],
+            'feature': names[positions] if len(positions) else np.array([], dtype=object),
+            'mean': self.centers.values[rows, positions],
+            'std': self.scales.values[rows, positions],
+            'method': np.asarray(NORMALIZATION_METHODS, dtype=object)[methods[rows, positions]]
+        })
@@ -0,0 +1,160 @@
+import sys
+import json
+import time
+import threading
+import functools
+import contextlib
+from pathlib import Path
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+class Tracer:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+        self.local = threading.local()
+        self.origin = time.perf_counter()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['local'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.local = threading.local()
+
+    def reset(self):
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def active_spans(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def record_span(self, name, category):
+        stack = self.active_spans()
+        span = {'rows': None, 'columns': None}
+        stack.append(span)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield span
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            stack.pop()
+            self.events.append({
+                'name': name,
+                'category': category,
+                'start': wall_start - self.origin,
+                'wall': wall,
+                'cpu': cpu,
+                'depth': len(stack),
+                'thread': threading.get_ident(),
+                'rows': span['rows'],
+                'columns': span['columns']
+            })
+
+    def span(self, name, category='default'):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self.record_span(name, category)
+
+    def annotate(self, rows=None, columns=None, shape=None):
+        if not self.enabled:
+            return
+        stack = self.active_spans()
+        if not stack:
+            return
+        if shape is not None:
+            rows, columns = (shape[0], shape[1]) if len(shape) > 1 else (shape[0], None)
+        if rows is not None:
+            stack[-1]['rows'] = int(rows)
+        if columns is not None:
+            stack[-1]['columns'] = int(columns)
+
+    def traced(self, name=None, category='default'):
+        def decorator(func):
+            label = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.record_span(label, category):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        if not self.events:
+            return pd.DataFrame(columns=['name', 'category', 'calls', 'total_wall_s', 'mean_wall_ms', 'max_wall_ms',
+                                         'total_cpu_s', 'rows', 'max_columns'])
+        events = pd.DataFrame(self.events)
+        summary = events.groupby(['name', 'category'], sort=False).agg(
+            calls=('wall', 'size'),
+            total_wall_s=('wall', 'sum'),
+            mean_wall_ms=('wall', 'mean'),
+            max_wall_ms=('wall', 'max'),
+            total_cpu_s=('cpu', 'sum'),
+            rows=('rows', 'sum'),
+            max_columns=('columns', 'max')
+        ).reset_index()
+        summary['mean_wall_ms'] *= 1000
+        summary['max_wall_ms'] *= 1000
+        return summary.sort_values('total_wall_s', ascending=False).reset_index(drop=True)
+
+    def print_summary(self, top=20):
+        summary = self.summary()
+        if summary.empty:
+            print("性能追踪: 没有记录")
+            return summary
+        print("\n" + "=" * 60)
+        print("性能追踪摘要")
+        print("=" * 60)
+        print(summary.head(top).to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+        process_peak = peak_rss_mb()
+        if process_peak is not None:
+            print(f"进程峰值内存: {process_peak:.1f} MB")
+        return summary
+
+    def export_json(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'events': self.events, 'summary': self.summary().to_dict(orient='records'),
+                       'process_peak_rss_mb': peak_rss_mb()}, f, indent=2, default=str)
+        return path
+
+    def export_chrome_trace(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        trace_events = [{
+            'name': event['name'],
+            'cat': event['category'],
+            'ph': 'X',
+            'ts': event['start'] * 1e6,
+            'dur': event['wall'] * 1e6,
+            'pid': 0,
+            'tid': event['thread'],
+            'args': {key: event[key] for key in ('cpu', 'rows', 'columns') if event[key] is not None}
+        } for event in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+        return path
+
+tracer = Tracer()
+traced = tracer.traced
@@ -8,134 +8,257 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import *
 from data_loader import DataLoader, DataCleaner, MacroDataEnhancer
-from feature_processor import FeatureSelector, FeatureProcessor
+from feature_processor import FeatureSelector, FeatureProcessor, LazyFeatureStore
 from signal_builder import OnlineTreeModel, AdvancedPortfolioManager
 from backtester import EnhancedStrategyBacktester
-
-def run_data_pipeline():
+from stage_cache import StageCache
+from checkpoint_store import CheckpointStore
+from daily_signal import save_daily_state
+from instrumentation import tracer
+from chunked_pipeline import ChunkedPipeline
+from results_store import ResultStore
+
+PIPELINE_STAGES = ['load', 'macro', 'clean', 'select', 'engineer']
+
+def build_stage_keys(stage_cache):
+    raw_files = list(Path(DATA_FOLDER_PATH).glob("*.parquet"))
+    stage_params = {
+        'load': {'files': stage_cache.fingerprint_files(raw_files)},
+        'macro': {'tickers': MacroDataEnhancer.macro_tickers},
+        'clean': {'nan_threshold': NAN_THRESHOLD},
+        'select': {'max_features': MAX_SELECTED_FEATURES, 'redundancy_threshold': REDUNDANCY_THRESHOLD},
+        'engineer': {'lags': FEATURE_LAGS, 'windows': ROLLING_WINDOWS}
+    }
+
+    stage_keys = {}
+    upstream_key = None
+    for stage in PIPELINE_STAGES:
+        upstream_key = stage_cache.make_key(stage, upstream_key, stage_params[stage])
+        stage_keys[stage] = upstream_key
+    return stage_keys
+
+def run_data_pipeline(lazy_features=False, stage_cache=None):
     print("=" * 60)
     print("开始数据处理流程")
     print("=" * 60)
 
-    print("\n1. 加载数据...")
-    data_loader = DataLoader(DATA_FOLDER_PATH)
-    try:
-        main_data = data_loader.load_parquet_files()
-        print(f"成功加载数据: {main_data.shape[0]} 行 × {main_data.shape[1]} 列")
-        print(f"时间范围: {main_data.index.min().strftime('%Y-%m-%d')} 至 {main_data.index.max().strftime('%Y-%m-%d')}")
-
-        target_col = data_loader.find_target_column(main_data)
-        if target_col:
-            main_data = main_data.rename(columns={target_col: 'ret_21D'})
-            target_stats = main_data['ret_21D'].describe()
-            print(f"目标变量: 均值={target_stats['mean']:.4f}, 标准差={target_stats['std']:.4f}")
-        else:
-            print("警告: 数据中未找到目标变量 'ret_21D'")
-            return None
-
-    except Exception as e:
-        print(f"数据加载失败: {e}")
-        return None
+    stage_keys = {}
+    cached_stage, cached_data = None, None
+    if stage_cache is not None:
+        stage_keys = build_stage_keys(stage_cache)
+        cacheable_stages = PIPELINE_STAGES[:-1] if lazy_features else PIPELINE_STAGES
+        for stage in reversed(cacheable_stages):
+            if stage_cache.contains(stage_keys[stage]):
+                cached_stage = stage
+                cached_data = stage_cache.get(stage_keys[stage])
+                print(f"使用阶段缓存: {stage} ({stage_keys[stage]})")
+                break
+
+    def should_run(stage):
+        return cached_stage is None or PIPELINE_STAGES.index(stage) > PIPELINE_STAGES.index(cached_stage)
+
+    degraded_stage = None
+
+    def store_stage(stage, data):
+        if stage_cache is not None and degraded_stage is None:
+            stage_cache.put(stage_keys[stage], stage, data)
+
+    main_data = cached_data if cached_stage == 'load' else None
+    if should_run('load'):
+        print("\n1. 加载数据...")
+        with tracer.span('pipeline.load', 'pipeline'):
+            data_loader = DataLoader(DATA_FOLDER_PATH)
+            try:
+                main_data = data_loader.load_parquet_files()
+                print(f"成功加载数据: {main_data.shape[0]} 行 × {main_data.shape[1]} 列")
+                print(f"时间范围: {main_data.index.min().strftime('%Y-%m-%d')} 至 {main_data.index.max().strftime('%Y-%m-%d')}")
+
+                target_col = data_loader.find_target_column(main_data)
+                if target_col:
+                    main_data = main_data.rename(columns={target_col: 'ret_21D'})
+                    target_stats = main_data['ret_21D'].describe()
+                    print(f"目标变量: 均值={target_stats['mean']:.4f}, 标准差={target_stats['std']:.4f}")
+                else:
+                    print("警告: 数据中未找到目标变量 'ret_21D'")
+                    return None
+
+            except Exception as e:
+                print(f"数据加载失败: {e}")
+                return None
+            tracer.annotate(shape=main_data.shape)
+            store_stage('load', main_data)
+
+    enhanced_data = cached_data if cached_stage == 'macro' else None
+    if should_run('macro'):
+        print("\n2. 添加宏观数据...")
+        with tracer.span('pipeline.macro', 'pipeline'):
+            try:
+                macro_enhancer = MacroDataEnhancer(cache_dir=MACRO_DATA_PATH)
+                start_date = main_data.index.min().strftime('%Y-%m-%d')
+                end_date = main_data.index.max().strftime('%Y-%m-%d')
+                enhanced_data = macro_enhancer.add_all_macro_data(main_data, start_date, end_date)
+                print(f"成功添加 {len(macro_enhancer.macro_features)} 个宏观特征")
+                if len(macro_enhancer.macro_features) == len(MacroDataEnhancer.macro_tickers):
+                    store_stage('macro', enhanced_data)
+                else:
+                    degraded_stage = 'macro'
+            except Exception as e:
+                print(f"宏观数据添加失败: {e}")
+                enhanced_data = main_data.copy()
+                degraded_stage = 'macro'
+            if degraded_stage is not None:
+                print("宏观数据不完整, 后续阶段不写入缓存")
+            tracer.annotate(shape=enhanced_data.shape)
+
+    cleaned_data = cached_data if cached_stage == 'clean' else None
+    if should_run('clean'):
+        print("\n3. 数据清洗...")
+        with tracer.span('pipeline.clean', 'pipeline'):
+            try:
+                cleaner = DataCleaner(nan_threshold=NAN_THRESHOLD)
+                cleaned_data = cleaner.clean_data(enhanced_data)
+                print(f"清洗完成: 保留 {len(cleaner.kept_features)} 个特征")
+            except Exception as e:
+                print(f"数据清洗失败: {e}")
+                return None
+            tracer.annotate(shape=cleaned_data.shape)
+            store_stage('clean', cleaned_data)
+
+    selected_data = cached_data if cached_stage == 'select' else None
+    if should_run('select'):
+        print("\n4. 特征选择...")
+        with tracer.span('pipeline.select', 'pipeline'):
+            try:
+                feature_selector = FeatureSelector(max_features=MAX_SELECTED_FEATURES,
+                                                   redundancy_threshold=REDUNDANCY_THRESHOLD)
+                selected_data = feature_selector.select_features_static(cleaned_data)
+                print(f"特征选择完成: 从 {len(cleaned_data.columns)} 个特征中选择 {len(feature_selector.selected_features)} 个")
+                store_stage('select', selected_data)
+            except Exception as e:
+                print(f"特征选择失败: {e}")
+                selected_data = cleaned_data
+                degraded_stage = 'select'
+            tracer.annotate(shape=selected_data.shape)
+
+    data_with_features = cached_data if cached_stage == 'engineer' else None
+    if should_run('engineer'):
+        print("\n5. 特征工程...")
+        with tracer.span('pipeline.engineer', 'pipeline'):
+            try:
+                if lazy_features:
+                    data_with_features = LazyFeatureStore(selected_data, lags=FEATURE_LAGS, windows=ROLLING_WINDOWS,
+                                                          max_cached_columns=LAZY_FEATURE_CACHE_SIZE)
+                    print(f"延迟特征工程: {len(data_with_features.base_columns)} 个基础特征, {len(data_with_features.feature_columns)} 个可用特征")
+                    tracer.annotate(rows=len(data_with_features), columns=len(data_with_features.feature_columns))
+                else:
+                    processor = FeatureProcessor()
+                    data_with_lags = processor.create_lag_features(selected_data, lags=FEATURE_LAGS)
+                    data_with_features = processor.calculate_rolling_features(data_with_lags, windows=ROLLING_WINDOWS)
+                    print(f"特征工程完成")
+                    print(f"最终数据维度: {data_with_features.shape[0]} 样本 × {data_with_features.shape[1]} 特征")
+                    tracer.annotate(shape=data_with_features.shape)
+                    store_stage('engineer', data_with_features)
+
+            except Exception as e:
+                print(f"特征工程失败: {e}")
+                return None
 
-    print("\n2. 添加宏观数据...")
-    try:
-        macro_enhancer = MacroDataEnhancer()
-        start_date = main_data.index.min().strftime('%Y-%m-%d')
-        end_date = main_data.index.max().strftime('%Y-%m-%d')
-        enhanced_data = macro_enhancer.add_all_macro_data(main_data, start_date, end_date)
-        print(f"成功添加 {len(macro_enhancer.macro_features)} 个宏观特征")
-    except Exception as e:
-        print(f"宏观数据添加失败: {e}")
-        enhanced_data = main_data.copy()
+    print("\n" + "=" * 60)
+    print("✅ 数据处理流程完成!")
+    print("=" * 60)
 
-    print("\n3. 数据清洗...")
-    try:
-        cleaner = DataCleaner(nan_threshold=0.8)
-        cleaned_data = cleaner.clean_data(enhanced_data)
-        print(f"清洗完成: 保留 {len(cleaner.kept_features)} 个特征")
-    except Exception as e:
-        print(f"数据清洗失败: {e}")
-        return None
+    return data_with_features
 
-    print("\n4. 特征选择...")
-    try:
-        feature_selector = FeatureSelector(max_features=1000)
-        selected_data = feature_selector.select_features_static(cleaned_data)
-        print(f"特征选择完成: 从 {len(cleaned_data.columns)} 个特征中选择 {len(feature_selector.selected_features)} 个")
-    except Exception as e:
-        print(f"特征选择失败: {e}")
-        selected_data = cleaned_data
+def run_chunked_data_pipeline():
+    print("=" * 60)
+    print("开始分块数据处理流程")
+    print("=" * 60)
 
-    print("\n5. 特征工程...")
+    pipeline = ChunkedPipeline(DATA_FOLDER_PATH, CHUNKED_OUTPUT_PATH, chunk_rows=PIPELINE_CHUNK_ROWS,
+                               column_group_size=PIPELINE_COLUMN_GROUP_SIZE,
+                               nan_threshold=NAN_THRESHOLD, max_features=MAX_SELECTED_FEATURES,
+                               redundancy_threshold=REDUNDANCY_THRESHOLD, lags=FEATURE_LAGS,
+                               windows=ROLLING_WINDOWS, macro_cache_dir=MACRO_DATA_PATH)
     try:
-        processor = FeatureProcessor()
-        data_with_lags = processor.create_lag_features(selected_data, lags=[1, 5, 21])
-        data_with_features = processor.calculate_rolling_features(data_with_lags, windows=[5, 21, 63])
-        print(f"特征工程完成")
-        print(f"最终数据维度: {data_with_features.shape[0]} 样本 × {data_with_features.shape[1]} 特征")
-
+        with tracer.span('pipeline.chunked_prepare', 'pipeline'):
+            print("\n1. 扫描数据...")
+            pipeline.prepare()
+        with tracer.span('pipeline.chunked_scan', 'pipeline'):
+            print("\n2. 统计缺失率...")
+            pipeline.scan()
+        with tracer.span('pipeline.chunked_clean', 'pipeline'):
+            print("\n3. 分块数据清洗...")
+            cleaned_data = pipeline.clean()
+            tracer.annotate(shape=cleaned_data.shape)
+        with tracer.span('pipeline.select', 'pipeline'):
+            print("\n4. 特征选择...")
+            pipeline.select(cleaned_data)
+        with tracer.span('pipeline.chunked_engineer', 'pipeline'):
+            print("\n5. 分块特征工程...")
+            processed_data, feature_matrix = pipeline.engineer(cleaned_data)
+            tracer.annotate(shape=processed_data.shape)
     except Exception as e:
-        print(f"特征工程失败: {e}")
-        return None
+        print(f"分块数据处理失败: {e}")
+        return None, None
 
     print("\n" + "=" * 60)
-    print("✅ 数据处理流程完成!")
+    print("✅ 分块数据处理流程完成!")
     print("=" * 60)
+    return processed_data, feature_matrix
 
-    return data_with_features
-
-def run_online_learning_strategy(processed_data):
+def run_online_learning_strategy(processed_data, feature_matrix=None):
     print("开始在线学习树模型策略")
 
     print("\n1. 初始化在线学习模型...")
-    online_model = OnlineTreeModel(
-        model_type='xgboost',
-        model_params={
-            'n_estimators': 50,
-            'max_depth': 6,
-            'learning_rate': 0.05,
-            'subsample': 0.7,
-            'colsample_bytree': 0.7,
-            'random_state': 42,
-            'n_jobs': -1
-        },
-        train_window=756,
-        retrain_freq=42,
-        prediction_horizon=21,
-        dynamic_feature_selection=True,
-        max_features=200
-    )
+    online_model = OnlineTreeModel(**MODEL_CONFIG)
+    if feature_matrix is not None:
+        online_model.feature_matrix = feature_matrix
 
     print("2. 初始化投资组合管理器...")
-    portfolio_manager = AdvancedPortfolioManager(
-        initial_capital=1000000,
-        max_position=0.02,
-        transaction_cost=0.005,
-        kelly_fraction=0.08,
-        min_volatility=0.03,
-        prediction_threshold=0.01
-    )
+    portfolio_manager = AdvancedPortfolioManager(**PORTFOLIO_CONFIG)
 
     print("3. 初始化策略回测器...")
-    backtester = EnhancedStrategyBacktester(online_model, portfolio_manager)
+    backtester = EnhancedStrategyBacktester(online_model, portfolio_manager,
+                                            checkpoint_every=CHECKPOINT_EVERY_RETRAINS)
 
     print("4. 运行回测...")
-    split_idx = int(len(processed_data) * 0.3)
-    start_date = processed_data.index[split_idx]
+    if BACKTEST_START_DATE is not None:
+        start_date = pd.Timestamp(BACKTEST_START_DATE)
+    else:
+        split_idx = int(len(processed_data) * 0.3)
+        start_date = processed_data.index[split_idx]
     end_date = processed_data.index[-1]
 
     print(f"回测期间: {start_date} 到 {end_date}")
-    print(f"回测数据量: {len(processed_data[processed_data.index >= start_date])} 个交易日")
-
-    print("进行初始模型训练...")
-    initial_success = online_model.train_model(processed_data, start_date, initial_training=True)
-    if not initial_success:
-        print("初始训练失败，调整参数重试...")
-        online_model.train_window = min(online_model.train_window, len(processed_data) // 2)
+    print(f"回测数据量: {(processed_data.index >= start_date).sum()} 个交易日")
+
+    checkpoint_store = None
+    checkpoint = None
+    if CHECKPOINT_ENABLED:
+        run_key = CheckpointStore.make_key({
+            'model': MODEL_CONFIG,
+            'portfolio': PORTFOLIO_CONFIG,
+            'start_date': start_date
+        })
+        checkpoint_store = CheckpointStore(CHECKPOINT_PATH, run_key=run_key, keep_last=CHECKPOINT_KEEP_LAST)
+        checkpoint = backtester.load_checkpoint(checkpoint_store, processed_data, start_date, end_date,
+                                                RESUME_FROM_DATE)
+
+    if checkpoint is not None:
+        print("已加载检查点，跳过初始训练")
+        initial_success = True
+    else:
+        print("进行初始模型训练...")
         initial_success = online_model.train_model(processed_data, start_date, initial_training=True)
+        if not initial_success:
+            print("初始训练失败，调整参数重试...")
+            online_model.train_window = min(online_model.train_window, len(processed_data) // 2)
+            initial_success = online_model.train_model(processed_data, start_date, initial_training=True)
 
     if initial_success:
-        backtest_results = backtester.run_enhanced_backtest(processed_data, start_date, end_date)
+        backtest_results = backtester.run_enhanced_backtest(processed_data, start_date, end_date,
+                                                            checkpoint_store=checkpoint_store,
+                                                            checkpoint=checkpoint)
         print("\n5. 生成回测报告...")
         backtester.generate_enhanced_report(backtest_results)
         return backtest_results, online_model, backtester
@@ -148,15 +271,20 @@ def save_results(backtest_results, model, backtester):
     Path(OUTPUT_CHARTS_PATH).mkdir(parents=True, exist_ok=True)
 
     print("\n保存结果...")
-    predictions_df = pd.DataFrame(model.prediction_history)
+    predictions_df = model.prediction_history.to_frame()
     predictions_df.to_csv(f"{OUTPUT_CSV_PATH}/prediction_history.csv", index=False)
     print("预测历史已保存")
 
-    if model.feature_importance_history:
-        feature_importance_df = pd.concat(model.feature_importance_history)
+    if len(model.feature_importance_history) > 0:
+        feature_importance_df = model.feature_importance_history.to_frame()
         feature_importance_df.to_csv(f"{OUTPUT_CSV_PATH}/feature_importance_history.csv", index=False)
         print("特征重要性历史已保存")
 
+    if len(model.normalization_history) > 0:
+        normalization_df = model.normalization_history.to_frame()
+        normalization_df.to_csv(f"{OUTPUT_CSV_PATH}/normalization_history.csv", index=False)
+        print("标准化参数历史已保存")
+
     portfolio_results = pd.DataFrame({
         'date': backtest_results['portfolio_dates'],
         'portfolio_value': backtest_results['portfolio_values']
@@ -169,17 +297,45 @@ def save_results(backtest_results, model, backtester):
     print("绩效指标已保存")
 
     if 'weights_history' in backtest_results:
-        weights_history = pd.DataFrame(backtest_results['weights_history'])
+        weights_history = backtest_results['weights_history'].to_frame()
         weights_history.to_csv(f"{OUTPUT_CSV_PATH}/weights_history.csv", index=False)
         print("权重历史已保存")
 
-def main():
-    print("=" * 80)
-    print("开始在线学习模型训练和回测流程")
-    print("=" * 80)
+    store = ResultStore(RESULT_STORE_PATH)
+    run_id = store.write_run(ResultStore.make_run_id(), backtest_results, model,
+                             params={**MODEL_CONFIG, **PORTFOLIO_CONFIG})
+    print(f"列式结果已保存至: {RESULT_STORE_PATH} (run_id={run_id})")
+
+def save_profile():
+    Path(PROFILE_OUTPUT_PATH).mkdir(parents=True, exist_ok=True)
+    summary = tracer.print_summary()
+    summary.to_csv(f"{PROFILE_OUTPUT_PATH}/profile_summary.csv", index=False)
+    tracer.export_json(f"{PROFILE_OUTPUT_PATH}/profile_events.json")
+    tracer.export_chrome_trace(f"{PROFILE_OUTPUT_PATH}/chrome_trace.json")
+    print(f"性能追踪已保存至: {PROFILE_OUTPUT_PATH}")
 
+def load_processed_data():
     processed_data_path = Path(PROCESSED_DATA_PATH)
-    if processed_data_path.exists():
+    selected_data_path = Path(SELECTED_DATA_PATH)
+    feature_matrix = None
+    if CHUNKED_PIPELINE:
+        processed_data, feature_matrix = run_chunked_data_pipeline()
+    elif STAGE_CACHE_ENABLED:
+        stage_cache = StageCache(STAGE_CACHE_PATH, max_bytes=STAGE_CACHE_MAX_BYTES)
+        processed_data = run_data_pipeline(lazy_features=LAZY_FEATURE_STORE, stage_cache=stage_cache)
+    elif LAZY_FEATURE_STORE:
+        if selected_data_path.exists():
+            print("加载已选择的基础特征...")
+            processed_data = LazyFeatureStore(pd.read_parquet(selected_data_path), lags=FEATURE_LAGS,
+                                              windows=ROLLING_WINDOWS, max_cached_columns=LAZY_FEATURE_CACHE_SIZE)
+        else:
+            print("处理原始数据...")
+            processed_data = run_data_pipeline(lazy_features=True)
+            if processed_data is not None:
+                Path(selected_data_path.parent).mkdir(parents=True, exist_ok=True)
+                processed_data.base_data.to_parquet(selected_data_path)
+                print(f"基础特征已保存至: {selected_data_path}")
+    elif processed_data_path.exists():
         print("加载已处理的数据...")
         processed_data = pd.read_parquet(processed_data_path)
     else:
@@ -190,12 +346,25 @@ def main():
             processed_data.to_parquet(processed_data_path)
             print(f"处理后的数据已保存至: {processed_data_path}")
 
+    return processed_data, feature_matrix
+
+def main():
+    print("=" * 80)
+    print("开始在线学习模型训练和回测流程")
+    print("=" * 80)
+
+    tracer.enabled = PROFILING_ENABLED
+    tracer.reset()
+
+    processed_data, feature_matrix = load_processed_data()
+
     if processed_data is not None:
         print("\n运行模型训练与回测...")
-        backtest_results, model, backtester = run_online_learning_strategy(processed_data)
+        backtest_results, model, backtester = run_online_learning_strategy(processed_data, feature_matrix)
 
         if backtest_results is not None:
             save_results(backtest_results, model, backtester)
+            save_daily_state(model, backtester.portfolio_manager, backtester.asset_state, processed_data)
 
             print("\n" + "=" * 60)
             print("流程完成摘要")
@@ -225,5 +394,8 @@ def main():
     else:
         print("数据处理失败")
 
+    if PROFILING_ENABLED:
+        save_profile()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,173 @@
+import io
+import os
+import json
+import time
+import copy
+import inspect
+import itertools
+import contextlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+
+from config import (MODEL_CONFIG, PORTFOLIO_CONFIG, PARAMETER_SWEEP_GRID, SWEEP_MAX_WORKERS,
+                    SWEEP_MEMMAP_PATH, OUTPUT_CSV_PATH, RESULT_STORE_PATH)
+from results_store import ResultStore
+from checkpoint_store import CheckpointStore
+from feature_memmap import write_feature_memmap, load_feature_memmap
+from feature_processor import LazyFeatureStore
+from main import load_processed_data
+from signal_builder import OnlineTreeModel, AdvancedPortfolioManager
+from backtester import EnhancedStrategyBacktester
+
+MODEL_PARAMETERS = set(inspect.signature(OnlineTreeModel.__init__).parameters) - {'self'}
+PORTFOLIO_PARAMETERS = set(inspect.signature(AdvancedPortfolioManager.__init__).parameters) - {'self'}
+
+_sweep_worker_state = {}
+
+def expand_parameter_grid(param_grid):
+    keys = list(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[key] for key in keys))]
+
+def split_parameters(params):
+    model_part = {key: value for key, value in params.items() if key not in PORTFOLIO_PARAMETERS}
+    portfolio_part = {key: value for key, value in params.items() if key in PORTFOLIO_PARAMETERS}
+    return model_part, portfolio_part
+
+def build_configs(model_part, portfolio_part):
+    model_config = copy.deepcopy(MODEL_CONFIG)
+    for key, value in model_part.items():
+        if key in MODEL_PARAMETERS:
+            model_config[key] = value
+        else:
+            model_config.setdefault('model_params', {})[key] = value
+
+    portfolio_config = dict(PORTFOLIO_CONFIG)
+    portfolio_config.update(portfolio_part)
+    return model_config, portfolio_config
+
+def group_parameter_grid(param_grid):
+    groups = {}
+    for params in expand_parameter_grid(param_grid):
+        model_part, portfolio_part = split_parameters(params)
+        group_key = json.dumps(model_part, sort_keys=True, default=str)
+        groups.setdefault(group_key, (model_part, []))[1].append(portfolio_part)
+    return list(groups.values())
+
+def sweep_run_id(params, start_date, end_date, data_fingerprint):
+    return ResultStore.make_run_id({**params, 'start_date': start_date, 'end_date': end_date,
+                                    'data': data_fingerprint})
+
+def _init_sweep_worker(memmap_dir, result_store_dir=None, data_fingerprint=None):
+    data, feature_matrix = load_feature_memmap(memmap_dir)
+    _sweep_worker_state['data'] = data
+    _sweep_worker_state['feature_matrix'] = feature_matrix
+    _sweep_worker_state['result_store'] = ResultStore(result_store_dir) if result_store_dir else None
+    _sweep_worker_state['data_fingerprint'] = data_fingerprint
+
+def _run_sweep_group(model_part, portfolio_parts, start_date, end_date):
+    data = _sweep_worker_state['data']
+    feature_matrix = _sweep_worker_state['feature_matrix']
+    result_store = _sweep_worker_state['result_store']
+    data_fingerprint = _sweep_worker_state['data_fingerprint']
+
+    rows = []
+    model = None
+    cached_predictions = None
+    for portfolio_part in portfolio_parts:
+        model_config, portfolio_config = build_configs(model_part, portfolio_part)
+        params = {**model_part, **portfolio_part}
+        row = dict(params)
+        if result_store is not None:
+            row['run_id'] = sweep_run_id(params, start_date, end_date, data_fingerprint)
+        started = time.time()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            portfolio_manager = AdvancedPortfolioManager(**portfolio_config)
+            if cached_predictions is None:
+                model = OnlineTreeModel(**model_config)
+                model.feature_matrix = feature_matrix
+                success = model.train_model(data, start_date, initial_training=True)
+                if not success:
+                    model.train_window = min(model.train_window, len(data) // 2)
+                    success = model.train_model(data, start_date, initial_training=True)
+                if not success:
+                    for part in portfolio_parts:
+                        failed_row = {**model_part, **part, 'status': 'failed'}
+                        if result_store is not None:
+                            failed_row['run_id'] = sweep_run_id({**model_part, **part}, start_date, end_date,
+                                                                data_fingerprint)
+                            result_store.write_metrics(failed_row['run_id'], {'status': 'failed'}, {**model_part, **part})
+                        rows.append(failed_row)
+                    return rows
+
+                backtester = EnhancedStrategyBacktester(model, portfolio_manager)
+                results = backtester.run_enhanced_backtest(data, start_date, end_date)
+                cached_predictions = dict(zip(results['signal_dates'], results['predictions']))
+                row['retrained'] = True
+            else:
+                backtester = EnhancedStrategyBacktester(model, portfolio_manager)
+                results = backtester.run_enhanced_backtest(data, start_date, end_date,
+                                                           cached_predictions=cached_predictions)
+                row['retrained'] = False
+
+        row['status'] = 'ok'
+        row.update(results['metrics'])
+        row['elapsed_seconds'] = time.time() - started
+        if result_store is not None:
+            result_store.write_run(row['run_id'], results, model,
+                                   params={**params, 'status': 'ok', 'retrained': row['retrained'],
+                                           'elapsed_seconds': row['elapsed_seconds']})
+        rows.append(row)
+    return rows
+
+def run_parameter_sweep(processed_data, param_grid=None, start_date=None, end_date=None,
+                        max_workers=None, memmap_dir=SWEEP_MEMMAP_PATH, result_store_dir=RESULT_STORE_PATH):
+    param_grid = param_grid or PARAMETER_SWEEP_GRID
+    index = processed_data.index.sort_values()
+    if start_date is None:
+        start_date = index[int(len(index) * 0.3)]
+    if end_date is None:
+        end_date = index[-1]
+
+    groups = group_parameter_grid(param_grid)
+    n_runs = sum(len(portfolio_parts) for _, portfolio_parts in groups)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(groups)))
+    print(f"参数扫描: {n_runs} 组参数, {len(groups)} 个模型配置, {max_workers} 个进程")
+
+    write_feature_memmap(processed_data, memmap_dir)
+    print(f"特征矩阵已写入内存映射文件: {memmap_dir}")
+    data_fingerprint = CheckpointStore.fingerprint_data(load_feature_memmap(memmap_dir)[1])
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep_worker,
+                             initargs=(str(memmap_dir), str(result_store_dir) if result_store_dir else None,
+                                       data_fingerprint)) as executor:
+        futures = [executor.submit(_run_sweep_group, model_part, portfolio_parts, start_date, end_date)
+                   for model_part, portfolio_parts in groups]
+        for i, future in enumerate(futures):
+            rows.extend(future.result())
+            print(f"模型配置 {i + 1}/{len(groups)} 完成")
+
+    results = pd.DataFrame(rows)
+    if 'Sharpe Ratio' in results.columns:
+        results = results.sort_values('Sharpe Ratio', ascending=False).reset_index(drop=True)
+    return results
+
+def main():
+    processed_data, _ = load_processed_data()
+    if processed_data is None:
+        print("数据处理失败, 无法进行参数扫描")
+        return
+    if isinstance(processed_data, LazyFeatureStore):
+        processed_data = processed_data.materialize()
+    results = run_parameter_sweep(processed_data, PARAMETER_SWEEP_GRID, max_workers=SWEEP_MAX_WORKERS)
+
+    Path(OUTPUT_CSV_PATH).mkdir(parents=True, exist_ok=True)
+    results.to_csv(f"{OUTPUT_CSV_PATH}/parameter_sweep.csv", index=False)
+    print(f"参数扫描结果已保存至: {OUTPUT_CSV_PATH}/parameter_sweep.csv")
+    print(results.head(10).to_string())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import json
+import uuid
+import hashlib
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+
+from history_store import NORMALIZATION_METHODS
+
+class ResultStore:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.partitioning = ds.partitioning(pa.schema([('run_id', pa.string())]), flavor='hive')
+
+    @staticmethod
+    def make_run_id(params=None):
+        if params is None:
+            return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        payload = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def write_table(self, name, run_id, table):
+        folder = self.root / name / f"run_id={run_id}"
+        folder.mkdir(parents=True, exist_ok=True)
+        temp_path = folder / "_part-0.parquet"
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, folder / "part-0.parquet")
+
+    def write_metrics(self, run_id, metrics, params=None):
+        row = {'created': pd.Timestamp.now()}
+        for key, value in {**(params or {}), **metrics}.items():
+            if value is None or isinstance(value, (bool, int, float, str, np.generic, pd.Timestamp)):
+                row[key] = value
+            else:
+                row[key] = json.dumps(value, sort_keys=True, default=str)
+        self.write_table('metrics', run_id, pa.Table.from_pandas(pd.DataFrame([row]), preserve_index=False))
+
+    def write_run(self, run_id, backtest_results, model=None, params=None):
+        self.write_metrics(run_id, backtest_results.get('metrics', {}), params)
+
+        self.write_table('signals', run_id, pa.table({
+            'date': pa.array(pd.DatetimeIndex(backtest_results['signal_dates']).values, pa.timestamp('ns')),
+            'prediction': pa.array(np.asarray(backtest_results['predictions'], dtype=float)),
+            'actual_return': pa.array(np.asarray(backtest_results['actual_returns'], dtype=float))
+        }))
+        self.write_table('portfolio', run_id, pa.table({
+            'date': pa.array(pd.DatetimeIndex(backtest_results['portfolio_dates']).values, pa.timestamp('ns')),
+            'portfolio_value': pa.array(np.asarray(backtest_results['portfolio_values'], dtype=float))
+        }))
+        if 'weights_history' in backtest_results:
+            self.write_table('weights', run_id, pa.Table.from_pandas(backtest_results['weights_history'].to_frame(),
+                                                                     preserve_index=False))
+
+        if model is not None:
+            self.write_model_histories(run_id, model)
+        return run_id
+
+    def write_model_histories(self, run_id, model):
+        self.write_table('predictions', run_id, pa.Table.from_pandas(model.prediction_history.to_frame(),
+                                                                     preserve_index=False))
+
+        importance_history = model.feature_importance_history
+        values = importance_history.importances.values
+        rows, positions = np.nonzero(~np.isnan(values))
+        self.write_table('importances', run_id, pa.table({
+            'retrain': pa.array(rows.astype(np.int32)),
+            'date': pa.array(importance_history.dates.values[rows, 0], pa.timestamp('ns')),
+            'feature_id': pa.array(positions.astype(np.int32)),
+            'importance': pa.array(values[rows, positions])
+        }))
+
+        normalization_history = model.normalization_history
+        methods = normalization_history.methods.values
+        rows, positions = np.nonzero(methods >= 0)
+        self.write_table('normalization', run_id, pa.table({
+            'date': pa.array(normalization_history.dates.values[rows, 0], pa.timestamp('ns')),
+            'feature_id': pa.array(positions.astype(np.int32)),
+            'mean': pa.array(normalization_history.centers.values[rows, positions]),
+            'std': pa.array(normalization_history.scales.values[rows, positions]),
+            'method': pa.DictionaryArray.from_arrays(pa.array(methods[rows, positions].astype(np.int32)),
+                                                     pa.array(NORMALIZATION_METHODS))
+        }))
+
+        registry = model.feature_registry
+        self.write_table('features', run_id, pa.table({
+            'feature_id': pa.array(np.arange(len(registry), dtype=np.int32)),
+            'feature': pa.array(registry.names, pa.string())
+        }))
+
+    def runs(self, name='metrics'):
+        folder = self.root / name
+        if not folder.exists():
+            return []
+        return sorted(path.name[len('run_id='):] for path in folder.iterdir()
+                      if path.name.startswith('run_id=') and (path / "part-0.parquet").exists())
+
+    def dataset(self, name, run_ids=None):
+        if run_ids is None:
+            files = sorted((self.root / name).glob("run_id=*/part-0.parquet"))
+        else:
+            files = [self.root / name / f"run_id={run_id}" / "part-0.parquet" for run_id in run_ids]
+            files = [path for path in files if path.exists()]
+        if not files:
+            raise FileNotFoundError(f"结果表 {name} 中没有可读取的运行: {self.root / name}")
+        schema = pa.unify_schemas([pq.read_schema(path) for path in files] + [self.partitioning.schema],
+                                promote_options='permissive')
+        return ds.dataset([str(path) for path in files], schema=schema, format='parquet',
+                          partitioning=self.partitioning, partition_base_dir=str(self.root / name))
+
+    def load(self, name, columns=None, run_ids=None, start_date=None, end_date=None):
+        if isinstance(run_ids, str):
+            run_ids = [run_ids]
+        dataset = self.dataset(name, run_ids)
+
+        condition = None
+        if start_date is not None and 'date' in dataset.schema.names:
+            condition = ds.field('date') >= pd.Timestamp(start_date).to_datetime64()
+        if end_date is not None and 'date' in dataset.schema.names:
+            end_condition = ds.field('date') <= pd.Timestamp(end_date).to_datetime64()
+            condition = end_condition if condition is None else condition & end_condition
+
+        return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+    def load_importances(self, run_id, start_date=None, end_date=None):
+        importances = self.load('importances', ['retrain', 'date', 'feature_id', 'importance'], run_id,
+                                start_date, end_date)
+        features = self.load('features', ['feature_id', 'feature'], run_id)
+        names = np.empty(len(features), dtype=object)
+        names[features['feature_id'].to_numpy()] = features['feature'].to_numpy()
+        importances.insert(2, 'feature', names[importances['feature_id'].to_numpy()])
+        return importances
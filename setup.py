@@ -15,6 +15,7 @@ setup(
         "matplotlib>=3.5.0",
         "seaborn>=0.11.0",
         "scipy>=1.7.0",
+        "pyarrow>=14.0.0",
     ],
     python_requires=">=3.8",
 )
\ No newline at end of file
@@ -0,0 +1,1105 @@
+import pandas as pd
+import numpy as np
+import warnings
+from bisect import insort, bisect_left
+from collections import deque
+from config import OutputConfig
+from feature_processor import LazyFeatureStore
+from history_store import FeatureRegistry, RecordHistory, ImportanceHistory, NormalizationHistory
+from instrumentation import tracer, traced
+
+class FeatureMatrix:
+    def __init__(self, data, target_col='ret_21D', dtype=np.float64, values=None):
+        self.source = data
+        self.target_col = target_col
+        self.lazy = isinstance(data, LazyFeatureStore)
+        if self.lazy:
+            self.store = data
+            self.data = None
+            self.feature_columns = data.feature_columns
+            self.values = None
+            self.target = data.target
+        else:
+            if not data.index.is_monotonic_increasing:
+                data = data.sort_index(kind='stable')
+            self.store = None
+            self.data = data
+            self.feature_columns = [col for col in data.columns if col != target_col]
+            if values is None:
+                values = np.ascontiguousarray(data[self.feature_columns].to_numpy(dtype=dtype))
+            self.values = values
+            if target_col in data.columns:
+                self.target = data[target_col].to_numpy(dtype=float)
+            else:
+                self.target = None
+
+        self.index = data.index
+        self.dates = data.index.values
+        self.row_positions = {}
+        for position, date in enumerate(data.index):
+            if date not in self.row_positions:
+                self.row_positions[date] = position
+        self.column_positions = {col: i for i, col in enumerate(self.feature_columns)}
+
+    def row_position(self, date):
+        return self.row_positions.get(pd.Timestamp(date))
+
+    def end_position(self, date):
+        return int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date)), side='right'))
+
+    def rows(self, start, end, columns=None):
+        if self.lazy:
+            return self.store.get_frame(columns, start, end, include_target=True)
+        if columns is None:
+            return self.data.iloc[start:end]
+        return self.data.iloc[start:end][list(columns) + [self.target_col]]
+
+    def history(self, date, window=None, columns=None):
+        end = self.end_position(date)
+        start = 0 if window is None else max(0, end - window)
+        return self.rows(start, end, columns)
+
+    def take(self, positions, column_positions):
+        if self.lazy:
+            taken = np.empty((len(positions), len(column_positions)))
+            for i, column_position in enumerate(column_positions):
+                taken[:, i] = self.store.get_column(self.feature_columns[column_position])[positions]
+            return taken
+        return self.values[np.ix_(positions, column_positions)]
+
+    def value(self, position, column_position):
+        if self.lazy:
+            return self.store.get_column(self.feature_columns[column_position])[position]
+        return self.values[position, column_position]
+
+    def row(self, date, columns=None):
+        position = self.row_position(date)
+        if position is None:
+            return None
+        if columns is None:
+            columns = self.feature_columns
+        if self.lazy:
+            return np.array([self.store.get_column(col)[position] for col in columns])
+        return self.values[position, [self.column_positions[col] for col in columns]]
+
+    def target_at(self, date):
+        position = self.row_position(date)
+        if position is None or self.target is None:
+            return None
+        return self.target[position]
+
+class AssetState:
+    def __init__(self, volatility_window=63, robust_window=126, recent_window=5,
+                 initial_price=100, min_periods=10):
+        self.volatility_window = volatility_window
+        self.robust_window = robust_window
+        self.recent_window = recent_window
+        self.min_periods = min_periods
+
+        self.price = initial_price
+        self.count = 0
+        self.last_return = np.nan
+
+        self._vol_values = deque()
+        self._vol_sum = 0.0
+        self._vol_sumsq = 0.0
+        self._vol_valid = 0
+
+        self._robust_values = deque()
+        self._robust_sorted = []
+        self._robust_cache = None
+
+        self._recent_values = deque()
+        self._recent_sum = 0.0
+        self._recent_valid = 0
+
+    def update(self, value):
+        value = float(value)
+        is_valid = not np.isnan(value)
+        self.count += 1
+        self.last_return = value
+        if is_valid:
+            self.price *= 1 + value
+
+        self._vol_values.append(value)
+        if is_valid:
+            self._vol_sum += value
+            self._vol_sumsq += value * value
+            self._vol_valid += 1
+        if len(self._vol_values) > self.volatility_window:
+            old = self._vol_values.popleft()
+            if not np.isnan(old):
+                self._vol_sum -= old
+                self._vol_sumsq -= old * old
+                self._vol_valid -= 1
+
+        self._robust_values.append(value)
+        if is_valid:
+            insort(self._robust_sorted, value)
+        if len(self._robust_values) > self.robust_window:
+            old = self._robust_values.popleft()
+            if not np.isnan(old):
+                del self._robust_sorted[bisect_left(self._robust_sorted, old)]
+        self._robust_cache = None
+
+        self._recent_values.append(value)
+        if is_valid:
+            self._recent_sum += value
+            self._recent_valid += 1
+        if len(self._recent_values) > self.recent_window:
+            old = self._recent_values.popleft()
+            if not np.isnan(old):
+                self._recent_sum -= old
+                self._recent_valid -= 1
+
+    def rolling_volatility(self, default=0.02):
+        if self.count == 0:
+            return default
+        n = self._vol_valid
+        if self.count >= self.volatility_window and n < self.min_periods:
+            return np.nan
+        if n < 2:
+            return np.nan
+        mean = self._vol_sum / n
+        variance = max((self._vol_sumsq - n * mean * mean) / (n - 1), 0.0)
+        return np.sqrt(variance)
+
+    def robust_stats(self):
+        if self._robust_cache is None:
+            values = np.asarray(self._robust_sorted)
+            if len(values) == 0:
+                self._robust_cache = (np.nan, np.nan, 0)
+            else:
+                median = np.median(values)
+                mad = np.median(np.abs(values - median))
+                self._robust_cache = (median, mad, len(values))
+        return self._robust_cache
+
+    def recent_mean(self):
+        if self._recent_valid == 0:
+            return np.nan
+        return np.float64(self._recent_sum / self._recent_valid)
+
+class TrainingMatrixCache:
+    def __init__(self, dtype=np.float32):
+        self.dtype = dtype
+        self.source = None
+        self.columns = None
+        self.column_positions = {}
+        self.source_positions = None
+        self.buffer = None
+        self.window = None
+        self.start = 0
+        self.end = 0
+        self.offset = 0
+
+    def rebuild(self, feature_matrix, start, end, window, columns):
+        if not feature_matrix.lazy:
+            columns = feature_matrix.feature_columns
+        self.source = feature_matrix
+        self.columns = list(columns)
+        self.column_positions = {col: i for i, col in enumerate(self.columns)}
+        self.source_positions = [feature_matrix.column_positions[col] for col in self.columns]
+        self.window = window
+        self.buffer = np.empty((2 * window, len(self.columns)), dtype=self.dtype)
+        self.buffer[:end - start] = feature_matrix.take(np.arange(start, end), self.source_positions)
+        self.offset = 0
+
+    def update(self, feature_matrix, end, window, columns):
+        start = max(0, end - window)
+        if (feature_matrix is not self.source or window != self.window
+                or any(col not in self.column_positions for col in columns)
+                or start < self.start or end < self.end or start >= self.end):
+            self.rebuild(feature_matrix, start, end, window, columns)
+        elif end > self.end:
+            kept = self.end - start
+            self.offset += start - self.start
+            if self.offset + end - start > len(self.buffer):
+                self.buffer[:kept] = self.buffer[self.offset:self.offset + kept]
+                self.offset = 0
+            self.buffer[self.offset + kept:self.offset + end - start] = feature_matrix.take(
+                np.arange(self.end, end), self.source_positions
+            )
+        else:
+            self.offset += start - self.start
+
+        self.start = start
+        self.end = end
+        window_values = self.buffer[self.offset:self.offset + end - start]
+        positions = [self.column_positions[col] for col in columns]
+        if positions == list(range(len(self.columns))):
+            return window_values
+        return window_values[:, positions]
+
+
+class RecursiveLeastSquaresRegressor:
+    def __init__(self, forgetting_factor=0.995, regularization=1.0, fit_intercept=True):
+        self.forgetting_factor = forgetting_factor
+        self.regularization = regularization
+        self.fit_intercept = fit_intercept
+        self.weights = None
+        self.covariance = None
+
+    def design_matrix(self, X):
+        values = np.asarray(X, dtype=float)
+        if self.fit_intercept:
+            values = np.column_stack([values, np.ones(len(values))])
+        return values
+
+    def fit(self, X, y):
+        if hasattr(X, 'columns'):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        values = self.design_matrix(X)
+        target = np.asarray(y, dtype=float)
+
+        sample_weights = self.forgetting_factor ** np.arange(len(values) - 1, -1, -1)
+        weighted_values = values * sample_weights[:, None]
+        penalty = np.full(values.shape[1], float(self.regularization))
+        if self.fit_intercept:
+            penalty[-1] = 0.0
+        gram = weighted_values.T @ values + np.diag(penalty)
+        self.covariance = np.linalg.solve(gram, np.eye(values.shape[1]))
+        self.covariance = (self.covariance + self.covariance.T) / 2
+        self.weights = np.linalg.solve(gram, weighted_values.T @ target)
+        return self
+
+    def partial_fit(self, X, y):
+        if self.weights is None:
+            return self.fit(X, y)
+
+        for x, target in zip(self.design_matrix(X), np.asarray(y, dtype=float)):
+            projected = self.covariance @ x
+            gain = projected / (self.forgetting_factor + x @ projected)
+            self.weights = self.weights + gain * (target - x @ self.weights)
+            self.covariance = (self.covariance - np.outer(gain, projected)) / self.forgetting_factor
+        self.covariance = (self.covariance + self.covariance.T) / 2
+        return self
+
+    def predict(self, X):
+        return self.design_matrix(X) @ self.weights
+
+    @property
+    def coef_(self):
+        return self.weights[:-1] if self.fit_intercept else self.weights
+
+    @property
+    def intercept_(self):
+        return self.weights[-1] if self.fit_intercept else 0.0
+
+    @property
+    def feature_importances_(self):
+        importance = np.abs(self.coef_)
+        total = importance.sum()
+        return importance / total if total > 0 else importance
+
+
+class DynamicFeatureOptimizer:
+    def __init__(self, initial_features, max_features=500,
+                 importance_threshold=0.001, stability_window=5):
+        self.initial_features = initial_features
+        self.max_features = max_features
+        self.importance_threshold = importance_threshold
+        self.stability_window = stability_window
+
+        self.feature_importance_history = ImportanceHistory()
+        self.current_feature_set = set(initial_features)
+        self.feature_stability_count = {}
+
+    def update_feature_set(self, feature_importance_df, current_date):
+        if feature_importance_df is None or len(feature_importance_df) == 0:
+            return self.current_feature_set
+
+        self.feature_importance_history.append(current_date, feature_importance_df['feature'],
+                                               feature_importance_df['importance'].to_numpy())
+
+        for feature in feature_importance_df['feature']:
+            if feature in self.feature_stability_count:
+                self.feature_stability_count[feature] += 1
+            else:
+                self.feature_stability_count[feature] = 1
+
+        recent_importance = feature_importance_df.set_index('feature')['importance']
+        important_features = recent_importance[recent_importance > self.importance_threshold].index.tolist()
+        feature_stability = pd.Series(self.feature_stability_count)
+        stable_features = feature_stability[feature_stability >= self.stability_window].index.tolist()
+        candidate_features = set(important_features) & set(stable_features)
+
+        if len(candidate_features) < self.max_features // 2:
+            top_features = recent_importance.nlargest(self.max_features).index.tolist()
+            candidate_features.update(top_features[:self.max_features // 2])
+
+        if len(candidate_features) > self.max_features:
+            candidate_importance = recent_importance.reindex(list(candidate_features)).fillna(0)
+            top_candidates = candidate_importance.nlargest(self.max_features).index.tolist()
+            self.current_feature_set = set(top_candidates)
+        else:
+            self.current_feature_set = candidate_features
+
+        print(f"动态特征优化: 从 {len(feature_importance_df)} 个特征中选择 {len(self.current_feature_set)} 个特征")
+        return self.current_feature_set
+
+class OnlineTreeModel:
+    def __init__(self, model_type='xgboost', model_params=None,
+                 train_window=756, retrain_freq=42, prediction_horizon=21,
+                 normalization_window=252, dynamic_feature_selection=True,
+                 max_features=200, incremental_training=False, incremental_estimators=10,
+                 full_refit_every=6, max_trees=None, cache_training_matrix=False,
+                 training_cache_dtype=np.float32, normalization_history_limit=None):
+        self.model_type = model_type
+        self.model_params = model_params or {}
+        self.train_window = train_window
+        self.retrain_freq = retrain_freq
+        self.prediction_horizon = prediction_horizon
+        self.normalization_window = normalization_window
+        self.dynamic_feature_selection = dynamic_feature_selection
+        self.max_features = max_features
+        self.incremental_training = incremental_training
+        self.incremental_estimators = incremental_estimators
+        self.full_refit_every = full_refit_every
+        self.max_trees = max_trees
+        self.cache_training_matrix = cache_training_matrix
+
+        self.model = None
+        self.feature_registry = FeatureRegistry()
+        self.feature_importance_history = ImportanceHistory(self.feature_registry)
+        self.prediction_history = RecordHistory(['prediction', 'actual'])
+        self.normalization_params = {}
+        self.normalization_history = NormalizationHistory(self.feature_registry, normalization_history_limit)
+        self.feature_optimizer = None
+        self.current_feature_set = None
+        self.feature_matrix = None
+        self.trained_features = None
+        self.last_train_date = None
+        self.retrains_since_refit = 0
+        self.pending_feature_set = None
+        self.training_cache = TrainingMatrixCache(training_cache_dtype)
+
+        if not self.model_params:
+            if model_type == 'xgboost':
+                self.model_params = {
+                    'n_estimators': 50,
+                    'max_depth': 6,
+                    'learning_rate': 0.05,
+                    'subsample': 0.7,
+                    'colsample_bytree': 0.7,
+                    'random_state': 42,
+                    'n_jobs': -1
+                }
+            elif model_type == 'rls':
+                self.model_params = {
+                    'forgetting_factor': 0.995,
+                    'regularization': 1.0
+                }
+
+    def initialize_model(self):
+        if self.model_type == 'xgboost':
+            import xgboost as xgb
+            self.model = xgb.XGBRegressor(**self.model_params)
+        elif self.model_type == 'random_forest':
+            from sklearn.ensemble import RandomForestRegressor
+            self.model = RandomForestRegressor(**self.model_params)
+        elif self.model_type == 'rls':
+            self.model = RecursiveLeastSquaresRegressor(**self.model_params)
+        else:
+            raise ValueError(f"不支持的模型类型: {self.model_type}")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['feature_matrix'] = None
+        state['training_cache'] = TrainingMatrixCache(self.training_cache.dtype)
+        return state
+
+    def get_feature_matrix(self, data):
+        if self.feature_matrix is None or self.feature_matrix.source is not data:
+            self.feature_matrix = FeatureMatrix(data)
+        return self.feature_matrix
+
+    def calculate_mad(self, series):
+        if len(series) == 0:
+            return 0
+        median = series.median()
+        return (series - median).abs().mean()
+
+    def calculate_window_statistics(self, window_values):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            valid_counts = np.sum(~np.isnan(window_values), axis=0)
+            mean_vals = np.nanmean(window_values, axis=0)
+            std_vals = np.nanstd(window_values, axis=0, ddof=1)
+            median_vals = np.nanmedian(window_values, axis=0)
+            mad_vals = np.nanmean(np.abs(window_values - median_vals), axis=0)
+        return valid_counts, mean_vals, std_vals, median_vals, mad_vals
+
+    def calculate_normalization_params(self, data, current_date):
+        if data.index.is_monotonic_increasing:
+            end_position = data.index.searchsorted(current_date, side='right')
+            window_data = data.iloc[max(0, end_position - self.normalization_window):end_position]
+        else:
+            window_data = data[data.index <= current_date].tail(self.normalization_window)
+
+        columns = [col for col in data.columns if col != 'ret_21D']
+        window_values = window_data[columns].to_numpy(dtype=float)
+        return self.calculate_array_normalization_params(window_values, columns, current_date)
+
+    def calculate_array_normalization_params(self, window_values, columns, current_date):
+        valid_counts, mean_vals, std_vals, median_vals, mad_vals = self.calculate_window_statistics(window_values)
+
+        is_constant = std_vals < 1e-10
+        is_robust = ~is_constant & (std_vals > 10 * mad_vals)
+        centers = np.where(is_constant | is_robust, median_vals, mean_vals)
+        scales = np.where(is_constant, 1.0, np.where(is_robust, np.where(mad_vals > 1e-10, mad_vals, 1.0), std_vals))
+        methods = np.where(is_constant, 'median_centering',
+                           np.where(is_robust, 'robust_normalization', 'standard_normalization'))
+
+        valid = np.flatnonzero(valid_counts >= 10)
+        normalization_params = {}
+        for i in valid:
+            normalization_params[columns[i]] = {
+                'mean': centers[i],
+                'std': scales[i],
+                'method': str(methods[i])
+            }
+
+        self.normalization_history.append(current_date, [columns[i] for i in valid],
+                                          centers[valid], scales[valid], methods[valid])
+        return normalization_params
+
+    def apply_normalization(self, data, normalization_params):
+        columns = [col for col in normalization_params if col in data.columns]
+        if not columns:
+            return data.copy()
+
+        centers = np.array([normalization_params[col]['mean'] for col in columns], dtype=float)
+        scales = np.array([normalization_params[col]['std'] for col in columns], dtype=float)
+        scales = np.where(scales > 1e-10, scales, 1.0)
+
+        column_positions = data.columns.get_indexer(columns)
+        values = data.to_numpy(dtype=float, copy=True)
+        values[:, column_positions] = (values[:, column_positions] - centers) / scales
+        return pd.DataFrame(values, index=data.index, columns=data.columns)
+
+    def fill_gaps(self, values):
+        missing = np.isnan(values)
+        if not missing.any():
+            return values
+        rows = np.where(missing, 0, np.arange(len(values))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        column_range = np.arange(values.shape[1])
+        filled = values[rows, column_range]
+        first_valid = values[np.argmax(~missing, axis=0), column_range]
+        filled = np.where(np.isnan(filled), first_valid, filled)
+        return np.nan_to_num(filled, nan=0.0, copy=False)
+
+    def prepare_cached_training_data(self, feature_matrix, current_date, initial_training=False,
+                                     reuse_normalization=False):
+        columns = feature_matrix.feature_columns
+        if initial_training or self.feature_optimizer is None:
+            if self.dynamic_feature_selection:
+                self.feature_optimizer = DynamicFeatureOptimizer(
+                    initial_features=list(columns),
+                    max_features=self.max_features
+                )
+                self.current_feature_set = set(columns)
+
+        if self.dynamic_feature_selection and self.feature_optimizer and not initial_training:
+            available_features = set(columns) & self.current_feature_set
+            if available_features:
+                columns = list(available_features)
+
+        end = feature_matrix.end_position(current_date)
+        values = self.training_cache.update(feature_matrix, end, self.train_window, columns)
+        start = end - len(values)
+        target = feature_matrix.target[start:end]
+        valid_rows = ~np.isnan(target)
+        if valid_rows.sum() < 100:
+            return None, None, None
+
+        values = values[valid_rows]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            varying = np.nanmin(values, axis=0) < np.nanmax(values, axis=0)
+        if not varying.any():
+            return None, None, None
+
+        columns = [col for col, keep in zip(columns, varying) if keep]
+        values = values[:, varying]
+        if reuse_normalization and self.can_reuse_features(columns):
+            column_order = {col: i for i, col in enumerate(columns)}
+            values = values[:, [column_order[col] for col in self.trained_features]]
+            columns = self.trained_features
+        else:
+            window_values = values[-self.normalization_window:].astype(float)
+            self.normalization_params = self.calculate_array_normalization_params(
+                window_values, columns, current_date
+            )
+
+        centers = np.zeros(len(columns))
+        scales = np.ones(len(columns))
+        for i, col in enumerate(columns):
+            if col in self.normalization_params:
+                centers[i] = self.normalization_params[col]['mean']
+                scales[i] = self.normalization_params[col]['std']
+        scales = np.where(scales > 1e-10, scales, 1.0)
+        values = self.fill_gaps((values - centers.astype(values.dtype)) / scales.astype(values.dtype))
+
+        index = feature_matrix.index[start:end][valid_rows]
+        X = pd.DataFrame(values, index=index, columns=columns)
+        y = pd.Series(target[valid_rows], index=index, name='ret_21D')
+        return X, y, list(columns)
+
+    def prepare_training_data(self, data, current_date, initial_training=False, reuse_normalization=False):
+        feature_matrix = self.get_feature_matrix(data)
+        if self.cache_training_matrix and feature_matrix.target is not None:
+            return self.prepare_cached_training_data(
+                feature_matrix, current_date, initial_training, reuse_normalization
+            )
+        requested_columns = None
+        if (feature_matrix.lazy and self.dynamic_feature_selection and self.feature_optimizer
+                and not initial_training and self.current_feature_set):
+            requested_columns = [col for col in feature_matrix.feature_columns if col in self.current_feature_set]
+        train_data = feature_matrix.history(current_date, self.train_window, requested_columns)
+
+        train_data = train_data.dropna(subset=['ret_21D'])
+        if len(train_data) < 100:
+            return None, None, None
+
+        X = train_data.drop('ret_21D', axis=1)
+        y = train_data['ret_21D']
+
+        if initial_training or self.feature_optimizer is None:
+            if self.dynamic_feature_selection:
+                self.feature_optimizer = DynamicFeatureOptimizer(
+                    initial_features=X.columns.tolist(),
+                    max_features=self.max_features
+                )
+                self.current_feature_set = set(X.columns.tolist())
+
+        if self.dynamic_feature_selection and self.feature_optimizer and not initial_training:
+            available_features = set(X.columns) & self.current_feature_set
+            if available_features:
+                X = X[list(available_features)]
+
+        X = X.dropna(axis=1, how='all')
+        constant_cols = [col for col in X.columns if X[col].nunique() <= 1]
+        X = X.drop(columns=constant_cols)
+
+        if len(X.columns) == 0:
+            return None, None, None
+
+        if reuse_normalization and self.can_reuse_features(X.columns):
+            X = X[self.trained_features]
+        else:
+            self.normalization_params = self.calculate_normalization_params(X, current_date)
+        X_normalized = self.apply_normalization(X, self.normalization_params)
+        X_normalized = X_normalized.ffill().bfill().fillna(0)
+
+        return X_normalized, y, X_normalized.columns.tolist()
+
+    def can_reuse_features(self, columns):
+        if not self.trained_features:
+            return False
+        if self.model_type == 'rls':
+            return set(self.trained_features) <= set(columns)
+        return set(columns) == set(self.trained_features)
+
+    def limit_linear_features(self, X, y):
+        if X.shape[1] <= self.max_features:
+            return X
+        values = X.to_numpy(dtype=float)
+        centered = values - values.mean(axis=0)
+        target = y.to_numpy(dtype=float) - y.mean()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = np.abs(centered.T @ target) / np.sqrt((centered ** 2).sum(axis=0) * (target @ target))
+        keep = np.sort(np.argsort(-np.nan_to_num(correlation), kind='stable')[:self.max_features])
+        return X.iloc[:, keep]
+
+    def full_refit_due(self, initial_training=False):
+        return (not self.incremental_training or initial_training or self.trained_features is None
+                or self.retrains_since_refit >= self.full_refit_every)
+
+    def fit_full(self, X, y):
+        if self.model is None or self.incremental_training:
+            self.initialize_model()
+
+        self.model.fit(X, y)
+        self.retrains_since_refit = 0
+
+    def fit_incremental(self, X, y):
+        if len(X) == 0:
+            return
+
+        if self.model_type == 'xgboost':
+            self.model.set_params(n_estimators=self.incremental_estimators)
+            self.model.fit(X, y, xgb_model=self.model.get_booster())
+            booster = self.model.get_booster()
+            n_rounds = booster.num_boosted_rounds()
+            if self.max_trees and n_rounds > self.max_trees:
+                self.model._Booster = booster[n_rounds - self.max_trees:n_rounds]
+        elif self.model_type == 'random_forest':
+            n_trees = len(self.model.estimators_)
+            self.model.set_params(warm_start=True, n_estimators=n_trees + self.incremental_estimators)
+            self.model.fit(X, y)
+            if self.max_trees and len(self.model.estimators_) > self.max_trees:
+                self.model.estimators_ = self.model.estimators_[-self.max_trees:]
+                self.model.n_estimators = self.max_trees
+        elif self.model_type == 'rls':
+            self.model.partial_fit(X, y)
+        else:
+            raise ValueError(f"不支持的模型类型: {self.model_type}")
+
+        self.retrains_since_refit += 1
+
+    @traced('OnlineTreeModel.train_model', 'model')
+    def train_model(self, data, current_date, initial_training=False):
+        full_refit = self.full_refit_due(initial_training)
+        if full_refit and self.pending_feature_set is not None:
+            self.current_feature_set = self.pending_feature_set
+            self.pending_feature_set = None
+
+        X, y, feature_names = self.prepare_training_data(
+            data, current_date, initial_training, reuse_normalization=not full_refit
+        )
+
+        if X is None or len(X) == 0:
+            if OutputConfig.SHOW_TRAINING_DETAILS:
+                print(f"在 {current_date.strftime('%Y-%m-%d')} 训练数据不足，跳过训练")
+            return False
+        if self.model_type == 'rls' and feature_names != self.trained_features:
+            X = self.limit_linear_features(X, y)
+            feature_names = X.columns.tolist()
+        tracer.annotate(shape=X.shape)
+
+        try:
+            if full_refit or feature_names != self.trained_features:
+                self.fit_full(X, y)
+                n_samples = len(X)
+                full_refit = True
+            else:
+                new_rows = X.index > self.last_train_date
+                self.fit_incremental(X[new_rows], y[new_rows])
+                n_samples = int(new_rows.sum())
+
+            self.trained_features = feature_names
+            self.last_train_date = X.index.max()
+
+            if hasattr(self.model, 'feature_importances_'):
+                self.feature_importance_history.append(current_date, feature_names, self.model.feature_importances_)
+
+                if self.dynamic_feature_selection and self.feature_optimizer and not initial_training:
+                    importance_df = pd.DataFrame({
+                        'feature': feature_names,
+                        'importance': self.model.feature_importances_,
+                        'date': current_date
+                    }).sort_values('importance', ascending=False)
+                    if not self.incremental_training:
+                        self.current_feature_set = self.feature_optimizer.update_feature_set(
+                            importance_df, current_date
+                        )
+                    elif full_refit:
+                        self.pending_feature_set = self.feature_optimizer.update_feature_set(
+                            importance_df, current_date
+                        )
+
+            if initial_training or OutputConfig.SHOW_TRAINING_DETAILS:
+                mode = "训练" if full_refit else "增量训练"
+                print(f"{current_date.strftime('%Y-%m-%d')}: {mode}完成 - {n_samples} 样本, {len(feature_names)} 特征")
+            return True
+
+        except Exception as e:
+            if OutputConfig.SHOW_TRAINING_DETAILS:
+                print(f"{current_date.strftime('%Y-%m-%d')}: 训练失败 - {e}")
+            return False
+
+    @traced('OnlineTreeModel.update_online', 'model')
+    def update_online(self, data, current_date):
+        if (self.model_type != 'rls' or self.model is None or self.last_train_date is None
+                or not hasattr(self.model, 'feature_names_in_')):
+            return False
+
+        feature_matrix = self.get_feature_matrix(data)
+        if feature_matrix.target is None:
+            return False
+
+        start = feature_matrix.end_position(self.last_train_date)
+        matured_end = feature_matrix.end_position(current_date) - self.prediction_horizon
+        if matured_end <= start:
+            return False
+
+        positions = np.arange(start, matured_end)
+        target = feature_matrix.target[positions]
+        valid = ~np.isnan(target)
+        self.last_train_date = feature_matrix.index[matured_end - 1]
+        if not valid.any():
+            return False
+
+        row_values = self.build_prediction_rows(feature_matrix, positions[valid], self.model.feature_names_in_)
+        self.model.partial_fit(row_values, target[valid])
+        return True
+
+    def build_prediction_rows(self, feature_matrix, positions, expected_features):
+        use_feature_set = self.dynamic_feature_selection and self.current_feature_set and self.model_type != 'rls'
+        used_features, column_positions = [], []
+        centers = np.zeros(len(expected_features))
+        scales = np.ones(len(expected_features))
+        for i, feature in enumerate(expected_features):
+            column_position = feature_matrix.column_positions.get(feature)
+            if column_position is None:
+                continue
+            if use_feature_set and feature not in self.current_feature_set:
+                continue
+            used_features.append(i)
+            column_positions.append(column_position)
+            params = self.normalization_params.get(feature)
+            if params is not None:
+                centers[i] = params['mean']
+                if params['std'] > 1e-10:
+                    scales[i] = params['std']
+
+        row_values = np.zeros((len(positions), len(expected_features)))
+        if used_features:
+            values = feature_matrix.take(positions, column_positions)
+            row_values[:, used_features] = (values - centers[used_features]) / scales[used_features]
+        row_values[np.isnan(row_values)] = 0
+        return row_values
+
+    def build_prediction_row(self, feature_matrix, position, expected_features):
+        return self.build_prediction_rows(feature_matrix, [position], expected_features)[0]
+
+    @traced('OnlineTreeModel.predict_block', 'model')
+    def predict_block(self, data, dates):
+        if self.model is None or not hasattr(self.model, 'feature_names_in_'):
+            return pd.Series(dtype=float)
+
+        try:
+            feature_matrix = self.get_feature_matrix(data)
+            block_dates, positions = [], []
+            for date in dates:
+                position = feature_matrix.row_position(date)
+                if position is not None:
+                    block_dates.append(date)
+                    positions.append(position)
+            if not positions:
+                return pd.Series(dtype=float)
+
+            expected_features = self.model.feature_names_in_
+            row_values = self.build_prediction_rows(feature_matrix, positions, expected_features)
+            tracer.annotate(shape=row_values.shape)
+            predictions = self.model.predict(pd.DataFrame(row_values, columns=expected_features))
+            return pd.Series(predictions, index=pd.DatetimeIndex(block_dates))
+
+        except Exception as e:
+            print(f"批量预测失败: {e}")
+            return pd.Series(dtype=float)
+
+    @traced('OnlineTreeModel.predict', 'model')
+    def predict(self, data, current_date):
+        if self.model is None:
+            return None
+
+        try:
+            feature_matrix = self.get_feature_matrix(data)
+            position = feature_matrix.row_position(current_date)
+            if position is None:
+                return None
+
+            if hasattr(self.model, 'feature_names_in_'):
+                expected_features = self.model.feature_names_in_
+                row_values = self.build_prediction_row(feature_matrix, position, expected_features)
+                current_features_normalized = pd.DataFrame([row_values], columns=expected_features)
+            else:
+                current_features = feature_matrix.rows(position, position + 1).drop('ret_21D', axis=1)
+                if self.dynamic_feature_selection and self.current_feature_set:
+                    available_features = set(current_features.columns) & self.current_feature_set
+                    current_features = current_features[list(available_features)]
+                current_features_normalized = self.apply_normalization(current_features, self.normalization_params)
+                current_features_normalized = current_features_normalized.fillna(0)
+
+            tracer.annotate(shape=current_features_normalized.shape)
+            prediction = self.model.predict(current_features_normalized)[0]
+            self.record_prediction(data, current_date, prediction)
+            return prediction
+
+        except Exception as e:
+            print(f"在 {current_date} 预测失败: {e}")
+            return None
+
+    def record_prediction(self, data, current_date, prediction):
+        self.prediction_history.append({
+            'date': current_date,
+            'prediction': prediction,
+            'actual': self.get_feature_matrix(data).target_at(current_date)
+        })
+
+class AdvancedPortfolioManager:
+    def __init__(self, initial_capital=1000000, max_position=0.02,
+                 transaction_cost=0.005, volatility_lookback=126,
+                 kelly_fraction=0.08, min_volatility=0.03,
+                 prediction_threshold=0.01):
+        self.initial_capital = initial_capital
+        self.current_capital = initial_capital
+        self.max_position = max_position
+        self.transaction_cost = transaction_cost
+        self.volatility_lookback = volatility_lookback
+        self.kelly_fraction = kelly_fraction
+        self.min_volatility = min_volatility
+        self.prediction_threshold = prediction_threshold
+
+        self.portfolio_value = [initial_capital]
+        self.dates = []
+        self.positions = {}
+        self.trade_history = RecordHistory(['portfolio_return', 'transaction_cost', 'capital_before',
+                                            'capital_after', 'prediction'])
+        self.portfolio_weights_history = RecordHistory(['portfolio_return', 'transaction_cost', 'capital_before',
+                                                        'capital_after', 'prediction'])
+
+        self.consecutive_losses = 0
+        self.max_consecutive_losses = 5
+
+    def calculate_volatility(self, returns_series, lookback=None):
+        if lookback is None:
+            lookback = self.volatility_lookback
+
+        if len(returns_series) < 30:
+            return self.min_volatility
+
+        available_data = returns_series.tail(min(lookback, len(returns_series))).dropna()
+        if len(available_data) < 30:
+            return self.min_volatility
+
+        median = available_data.median()
+        mad = (available_data - median).abs().median()
+        volatility = mad * 1.4826
+        volatility = max(volatility, self.min_volatility)
+        volatility = min(volatility, 0.30)
+        return volatility
+
+    def calculate_state_volatility(self, asset_state):
+        if asset_state.count < 30:
+            return self.min_volatility
+
+        _, mad, valid_count = asset_state.robust_stats()
+        if valid_count < 30:
+            return self.min_volatility
+
+        volatility = mad * 1.4826
+        volatility = max(volatility, self.min_volatility)
+        volatility = min(volatility, 0.30)
+        return volatility
+
+    def conservative_kelly_sizing(self, prediction, volatility, recent_performance=None):
+        if recent_performance is None:
+            recent_performance = {'consecutive_losses': 0, 'win_rate': 0.5}
+
+        if abs(prediction) < self.prediction_threshold:
+            return 0
+
+        performance_penalty = 1.0
+        if recent_performance.get('consecutive_losses', 0) > 2:
+            performance_penalty = 0.5
+        elif recent_performance.get('win_rate', 0.5) < 0.4:
+            performance_penalty = 0.7
+
+        raw_kelly = prediction / (volatility ** 2)
+        signal_strength = min(abs(prediction) / 0.08, 1.0)
+        vol_penalty = 1.0 / (1.0 + 3.0 * volatility)
+        adjusted_kelly = raw_kelly * signal_strength * vol_penalty * self.kelly_fraction * performance_penalty
+
+        position_size = np.clip(adjusted_kelly, -self.max_position, self.max_position)
+        if abs(position_size) < 0.002:
+            position_size = 0
+        return position_size
+
+    def get_recent_performance(self):
+        if len(self.trade_history) < 10:
+            return {'consecutive_losses': self.consecutive_losses, 'win_rate': 0.5}
+
+        recent_returns = self.trade_history.column('portfolio_return')[-10:]
+        win_rate = np.count_nonzero(recent_returns > 0) / len(recent_returns)
+        return {
+            'consecutive_losses': self.consecutive_losses,
+            'win_rate': win_rate
+        }
+
+    @traced('AdvancedPortfolioManager.execute_advanced_trades', 'portfolio')
+    def execute_advanced_trades(self, date, asset_data, predictions, current_capital):
+        self.current_capital = current_capital
+
+        if not predictions:
+            self.portfolio_value.append(current_capital)
+            self.dates.append(date)
+            return current_capital, 0, {}
+
+        tracer.annotate(rows=len(predictions), columns=len(asset_data))
+        asset_name = list(predictions.keys())[0] if predictions else 'primary_asset'
+        prediction = predictions.get(asset_name, 0)
+        recent_performance = self.get_recent_performance()
+
+        volatility = self.min_volatility
+        asset_state = asset_data.get(asset_name, {}).get('state')
+        if asset_state is not None:
+            volatility = self.calculate_state_volatility(asset_state)
+        elif asset_name in asset_data and 'returns' in asset_data[asset_name]:
+            returns_series = asset_data[asset_name]['returns']
+            volatility = self.calculate_volatility(returns_series)
+
+        position_size = self.conservative_kelly_sizing(prediction, volatility, recent_performance)
+
+        if position_size == 0:
+            self.portfolio_value.append(current_capital)
+            self.dates.append(date)
+            return current_capital, 0, {}
+
+        transaction_cost = abs(position_size) * self.transaction_cost
+
+        portfolio_return = 0
+        if asset_state is not None:
+            if asset_state.count > 0:
+                portfolio_return = position_size * asset_state.recent_mean()
+        elif asset_name in asset_data and 'returns' in asset_data[asset_name]:
+            returns_series = asset_data[asset_name]['returns']
+            if len(returns_series) > 0:
+                recent_returns = returns_series.tail(5)
+                asset_return = recent_returns.mean() if len(recent_returns) > 0 else 0
+                portfolio_return = position_size * asset_return
+
+        portfolio_return -= transaction_cost
+        new_capital = current_capital * (1 + portfolio_return)
+        self.current_capital = new_capital
+
+        weights = {asset_name: position_size}
+        trade_record = {
+            'date': date,
+            'weights': weights,
+            'portfolio_return': portfolio_return,
+            'transaction_cost': transaction_cost,
+            'capital_before': current_capital,
+            'capital_after': new_capital,
+            'prediction': prediction
+        }
+        self.trade_history.append(trade_record)
+        self.portfolio_value.append(new_capital)
+        self.dates.append(date)
+        self.portfolio_weights_history.append(trade_record)
+
+        if portfolio_return < 0:
+            self.consecutive_losses += 1
+        else:
+            self.consecutive_losses = 0
+
+        if self.consecutive_losses >= self.max_consecutive_losses:
+            print(f"警告: 连续{self.consecutive_losses}次亏损")
+
+        return new_capital, portfolio_return, weights
+
+    def kelly_weights(self, predictions, volatility, performance_penalty=1.0):
+        predictions = np.asarray(predictions, dtype=float)
+        volatility = np.asarray(volatility, dtype=float)
+
+        raw_kelly = predictions / (volatility ** 2)
+        signal_strength = np.minimum(np.abs(predictions) / 0.08, 1.0)
+        vol_penalty = 1.0 / (1.0 + 3.0 * volatility)
+        adjusted_kelly = raw_kelly * signal_strength * vol_penalty * self.kelly_fraction * performance_penalty
+
+        weights = np.clip(adjusted_kelly, -self.max_position, self.max_position)
+        inactive = (np.isnan(predictions) | (np.abs(predictions) < self.prediction_threshold)
+                    | np.isnan(weights) | (np.abs(weights) < 0.002))
+        weights[inactive] = 0
+        return weights
+
+    @traced('AdvancedPortfolioManager.run_cross_sectional', 'portfolio')
+    def run_cross_sectional(self, predictions, volatility, returns, cost_basis='position'):
+        if cost_basis not in ('position', 'turnover'):
+            raise ValueError(f"不支持的交易成本计算方式: {cost_basis}")
+
+        index, columns = predictions.index, predictions.columns
+        tracer.annotate(shape=predictions.shape)
+        prediction_values = predictions.to_numpy(dtype=float)
+        volatility_values = volatility.reindex(index=index, columns=columns).to_numpy(dtype=float)
+        volatility_values = np.clip(np.nan_to_num(volatility_values, nan=self.min_volatility),
+                                    self.min_volatility, 0.30)
+        return_values = np.nan_to_num(returns.reindex(index=index, columns=columns).to_numpy(dtype=float))
+
+        penalties = (1.0, 0.7, 0.5)
+        candidates = np.stack([self.kelly_weights(prediction_values, volatility_values, penalty)
+                               for penalty in penalties])
+        gross_exposure = np.abs(candidates).sum(axis=2)
+        gross_pnl = (candidates * return_values).sum(axis=2)
+        if cost_basis == 'turnover':
+            previous = np.concatenate([np.zeros((len(penalties), 1, len(columns))), candidates[:, :-1]], axis=1)
+            pair_turnover = np.stack([np.abs(candidates - previous[j]).sum(axis=2) for j in range(len(penalties))],
+                                     axis=1)
+
+        n_dates = len(index)
+        choices = np.zeros(n_dates, dtype=int)
+        traded = np.zeros(n_dates, dtype=bool)
+        portfolio_returns = np.zeros(n_dates)
+        recent_trades = deque(maxlen=10)
+        n_trades = 0
+        consecutive_losses = 0
+        previous_choice = 0
+        for t in range(n_dates):
+            win_rate = sum(1 for r in recent_trades if r > 0) / len(recent_trades) if n_trades >= 10 else 0.5
+            choice = 2 if consecutive_losses > 2 else (1 if win_rate < 0.4 else 0)
+            choices[t] = choice
+            if cost_basis == 'turnover':
+                cost = pair_turnover[choice, previous_choice, t] * self.transaction_cost
+            else:
+                cost = gross_exposure[choice, t] * self.transaction_cost
+            if gross_exposure[choice, t] == 0:
+                portfolio_returns[t] = -cost
+                previous_choice = choice
+                continue
+
+            portfolio_return = gross_pnl[choice, t] - cost
+            portfolio_returns[t] = portfolio_return
+            traded[t] = True
+            recent_trades.append(portfolio_return)
+            n_trades += 1
+            consecutive_losses = consecutive_losses + 1 if portfolio_return < 0 else 0
+            previous_choice = choice
+
+        weights = candidates[choices, np.arange(n_dates)]
+        turnover = np.abs(np.diff(weights, axis=0, prepend=np.zeros((1, len(columns)))))
+        costs = (turnover if cost_basis == 'turnover' else np.abs(weights)) * self.transaction_cost
+        pnl = weights * return_values - costs
+
+        portfolio_value = self.initial_capital * np.cumprod(1 + portfolio_returns)
+        return {
+            'weights': pd.DataFrame(weights, index=index, columns=columns),
+            'turnover': pd.DataFrame(turnover, index=index, columns=columns),
+            'pnl': pd.DataFrame(pnl, index=index, columns=columns),
+            'transaction_costs': pd.Series(costs.sum(axis=1), index=index),
+            'portfolio_returns': pd.Series(portfolio_returns, index=index),
+            'portfolio_value': pd.Series(portfolio_value, index=index),
+            'traded': pd.Series(traded, index=index),
+            'performance_penalty': pd.Series(np.asarray(penalties)[choices], index=index)
+        }
+
+    def get_performance_summary(self):
+        if len(self.portfolio_value) < 2:
+            return {}
+
+        portfolio_returns = pd.Series(self.portfolio_value).pct_change().dropna()
+        total_return = (self.portfolio_value[-1] / self.portfolio_value[0] - 1) * 100
+        annual_return = portfolio_returns.mean() * 252 * 100
+        annual_volatility = portfolio_returns.std() * np.sqrt(252) * 100
+        sharpe_ratio = annual_return / annual_volatility if annual_volatility > 0 else 0
+
+        portfolio_series = pd.Series(self.portfolio_value)
+        rolling_max = portfolio_series.expanding().max()
+        drawdowns = (portfolio_series - rolling_max) / rolling_max
+        max_drawdown = drawdowns.min() * 100
+
+        winning_periods = len([r for r in portfolio_returns if r > 0])
+        win_rate = winning_periods / len(portfolio_returns) * 100 if len(portfolio_returns) > 0 else 0
+
+        return {
+            'Total Return (%)': total_return,
+            'Annual Return (%)': annual_return,
+            'Annual Volatility (%)': annual_volatility,
+            'Sharpe Ratio': sharpe_ratio,
+            'Max Drawdown (%)': max_drawdown,
+            'Win Rate (%)': win_rate,
+            'Final Capital': self.portfolio_value[-1],
+            'Number of Trades': len(self.trade_history)
+        }
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+import pandas as pd
+
+class StageCache:
+    def __init__(self, cache_dir, max_bytes=20 * 1024 ** 3, version=1):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.version = version
+        self.index_path = self.cache_dir / "index.json"
+        self.entries = self.load_index()
+
+    def load_index(self):
+        if self.index_path.exists():
+            with open(self.index_path) as f:
+                return json.load(f)
+        return {}
+
+    def save_index(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+
+    def make_key(self, stage, upstream_key, params):
+        payload = json.dumps({
+            'stage': stage,
+            'upstream': upstream_key,
+            'params': params,
+            'version': self.version
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+    def fingerprint_files(self, paths):
+        files = []
+        for path in sorted(Path(p) for p in paths):
+            stat = path.stat()
+            files.append([path.name, stat.st_size, stat.st_mtime_ns])
+        return files
+
+    def stage_path(self, key):
+        return self.cache_dir / f"{self.entries[key]['stage']}-{key}.parquet"
+
+    def contains(self, key):
+        return key in self.entries and self.stage_path(key).exists()
+
+    def get(self, key):
+        if not self.contains(key):
+            return None
+        data = pd.read_parquet(self.stage_path(key))
+        self.entries[key]['last_access'] = time.time()
+        self.save_index()
+        return data
+
+    def put(self, key, stage, data):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        file_path = self.cache_dir / f"{stage}-{key}.parquet"
+        data.to_parquet(file_path)
+        self.entries[key] = {
+            'stage': stage,
+            'size': file_path.stat().st_size,
+            'last_access': time.time()
+        }
+        self.evict(keep=key)
+        self.save_index()
+
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self.entries.values())
+
+    def evict(self, keep=None):
+        candidates = sorted((entry['last_access'], key) for key, entry in self.entries.items() if key != keep)
+        for _, key in candidates:
+            if self.total_bytes() <= self.max_bytes:
+                break
+            file_path = self.stage_path(key)
+            if file_path.exists():
+                file_path.unlink()
+            print(f"阶段缓存淘汰: {self.entries[key]['stage']} ({key})")
+            del self.entries[key]
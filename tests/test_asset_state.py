@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester import EnhancedStrategyBacktester
+from signal_builder import AssetState, AdvancedPortfolioManager
+
+def make_returns(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = pd.Series(rng.normal(0.0005, 0.02, n), index=pd.bdate_range('2015-01-01', periods=n))
+    returns.iloc[[20, 21, 90, 200]] = np.nan
+    return returns
+
+def test_asset_state_matches_history_rescans():
+    returns = make_returns()
+    backtester = EnhancedStrategyBacktester(None, AdvancedPortfolioManager())
+    manager = backtester.portfolio_manager
+    state = AssetState(robust_window=manager.volatility_lookback)
+    for t, value in enumerate(returns):
+        state.update(value)
+        history = returns.iloc[:t + 1]
+
+        price = backtester.calculate_price_series(history).iloc[-1]
+        if not np.isnan(price):
+            assert state.price == pytest.approx(price, rel=1e-12)
+        np.testing.assert_allclose(state.rolling_volatility(), backtester.calculate_rolling_volatility(history),
+                                   rtol=1e-8)
+        assert manager.calculate_state_volatility(state) == pytest.approx(manager.calculate_volatility(history))
+        np.testing.assert_allclose(state.recent_mean(), history.tail(5).mean(), rtol=1e-10)
+
+def test_nan_return_keeps_last_price():
+    state = AssetState()
+    for value in (0.01, np.nan, 0.02):
+        state.update(value)
+    assert state.price == pytest.approx(100 * 1.01 * 1.02)
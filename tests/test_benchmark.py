@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+import benchmark
+
+def test_synthetic_dataset_is_deterministic_and_loadable(tmp_path):
+    first = benchmark.generate_synthetic_dataset(tmp_path / "a", n_days=120, n_features=25, nan_ratio=0.2,
+                                                 seed=3, columns_per_file=10)
+    second = benchmark.generate_synthetic_dataset(tmp_path / "b", n_days=120, n_features=25, nan_ratio=0.2,
+                                                  seed=3, columns_per_file=10)
+    assert sorted(path.name for path in first.glob("*.parquet")) == \
+        ['financials_000.parquet', 'financials_001.parquet', 'financials_002.parquet', 'ret_21d.parquet']
+
+    data = benchmark.load_stage(first)
+    pd.testing.assert_frame_equal(data, benchmark.load_stage(second))
+    assert data.shape == (120, 27)
+    assert 'ret_21D' in data.columns
+    assert 0.0 < data.drop(columns=['ret_21D', 'ret_21d_daily']).isna().to_numpy().mean() < 0.4
+
+    # 目标是 21 日前瞻收益：等于随后 21 个日收益之和
+    returns = pd.read_parquet(first / "ret_21d.parquet")
+    np.testing.assert_allclose(returns['forward'].iloc[:-21].to_numpy(),
+                               returns['daily'].rolling(21).sum().shift(-21).iloc[:-21].to_numpy())
+
+def test_synthetic_dataset_is_reused_for_same_manifest(tmp_path):
+    folder = benchmark.generate_synthetic_dataset(tmp_path, n_days=60, n_features=5, seed=1)
+    modified = {path.name: path.stat().st_mtime_ns for path in folder.glob("*.parquet")}
+    benchmark.generate_synthetic_dataset(tmp_path, n_days=60, n_features=5, seed=1)
+    assert {path.name: path.stat().st_mtime_ns for path in folder.glob("*.parquet")} == modified
+
+    benchmark.generate_synthetic_dataset(tmp_path, n_days=60, n_features=5, seed=2)
+    assert len(benchmark.load_stage(folder)) == 60
+
+def test_benchmark_tier_reports_each_requested_stage(tmp_path, capsys):
+    result = benchmark.run_benchmark_tier('tiny', 300, 20, stages=['load', 'clean', 'engineer'],
+                                          data_root=tmp_path, track_memory=False)
+    assert list(result['stages']) == ['load', 'clean', 'engineer']
+    assert result['stages']['load']['rows'] == 300
+    assert all(stage['seconds'] >= 0 for stage in result['stages'].values())
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from backtester import EnhancedStrategyBacktester
+from checkpoint_store import CheckpointStore
+from feature_processor import LazyFeatureStore
+from signal_builder import FeatureMatrix, OnlineTreeModel, AdvancedPortfolioManager
+
+def make_data(rows=300, cols=5, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.normal(size=(rows, cols)), index=pd.bdate_range('2015-01-01', periods=rows),
+                        columns=[f'feature_{i}' for i in range(cols)])
+    data['ret_21D'] = rng.normal(size=rows)
+    return data
+
+def test_fingerprint_is_stable_for_identical_data():
+    data = make_data()
+    assert (CheckpointStore.fingerprint_data(FeatureMatrix(data))
+            == CheckpointStore.fingerprint_data(FeatureMatrix(data.copy())))
+
+def test_fingerprint_changes_with_data():
+    data = make_data()
+    baseline = CheckpointStore.fingerprint_data(FeatureMatrix(data))
+
+    changed_values = data.copy()
+    changed_values.iloc[0, 0] += 1.0
+    changed_target = data.copy()
+    changed_target.iloc[150, -1] += 1.0
+    shifted_index = data.copy()
+    shifted_index.index = shifted_index.index + pd.Timedelta(days=1)
+    renamed = data.rename(columns={'feature_0': 'feature_x'})
+
+    for variant in (changed_values, changed_target, shifted_index, renamed):
+        assert CheckpointStore.fingerprint_data(FeatureMatrix(variant)) != baseline
+
+def test_fingerprint_supports_lazy_feature_store():
+    data = make_data()
+    lazy = CheckpointStore.fingerprint_data(FeatureMatrix(LazyFeatureStore(data, lags=[1], windows=[5])))
+    other = CheckpointStore.fingerprint_data(FeatureMatrix(LazyFeatureStore(data, lags=[1, 5], windows=[5])))
+    assert lazy != other
+
+def make_market(rows, total_rows=400, cols=6, horizon=21, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.01, total_rows)
+    data = pd.DataFrame(rng.normal(size=(total_rows, cols)), index=pd.bdate_range('2015-01-01', periods=total_rows),
+                        columns=[f'feature_{i}' for i in range(cols)])
+    data['feature_0'] = pd.Series(returns, index=data.index).rolling(5, min_periods=1).mean()
+    forward = pd.Series(returns, index=data.index).rolling(horizon).sum().shift(-horizon)
+    data = data.iloc[:rows].copy()
+    data['ret_21D'] = forward.iloc[:rows]
+    data.iloc[-horizon:, -1] = np.nan
+    return data
+
+def run_with_checkpoints(data, checkpoint_dir, start_date):
+    model = OnlineTreeModel(model_type='rls', train_window=120, retrain_freq=20, max_features=4)
+    backtester = EnhancedStrategyBacktester(model, AdvancedPortfolioManager())
+    store = CheckpointStore(checkpoint_dir, run_key='run')
+    checkpoint = backtester.load_checkpoint(store, data, start_date, data.index[-1])
+    if checkpoint is None:
+        model.train_model(data, start_date, initial_training=True)
+    results = backtester.run_enhanced_backtest(data, start_date, data.index[-1], checkpoint_store=store,
+                                               checkpoint=checkpoint)
+    return checkpoint, results
+
+def test_fingerprint_ignores_appended_rows_and_maturing_targets():
+    short, extended = make_market(300), make_market(340)
+    end = 280
+    assert (CheckpointStore.fingerprint_data(FeatureMatrix(short), end, 21)
+            == CheckpointStore.fingerprint_data(FeatureMatrix(extended), end, 21))
+    assert CheckpointStore.fingerprint_data(FeatureMatrix(short)) != CheckpointStore.fingerprint_data(
+        FeatureMatrix(extended))
+
+def test_extended_backtest_resumes_from_checkpoint(tmp_path):
+    short, extended = make_market(300), make_market(340)
+    start_date = short.index[200]
+
+    checkpoint, first = run_with_checkpoints(short, tmp_path, start_date)
+    assert checkpoint is None
+
+    checkpoint, resumed = run_with_checkpoints(extended, tmp_path, start_date)
+    assert checkpoint is not None
+    assert checkpoint['last_date'] == short.index[-1]
+    assert checkpoint['position'] == 100
+    assert resumed['signal_dates'][:len(first['signal_dates'])] == first['signal_dates']
+    assert resumed['signal_dates'][-1] == extended.index[-1]
+
+def test_changed_history_refuses_checkpoint(tmp_path):
+    short, extended = make_market(300), make_market(340)
+    start_date = short.index[200]
+    run_with_checkpoints(short, tmp_path, start_date)
+
+    extended.iloc[10, -1] += 1.0
+    checkpoint, _ = run_with_checkpoints(extended, tmp_path, start_date)
+    assert checkpoint is None
@@ -0,0 +1,23 @@
+import numpy as np
+
+import benchmark
+from config import MAX_SELECTED_FEATURES, REDUNDANCY_THRESHOLD
+from chunked_pipeline import ChunkedPipeline
+
+def test_chunked_pipeline_matches_in_memory_pipeline(tmp_path, capsys):
+    data_folder = benchmark.generate_synthetic_dataset(tmp_path / "raw", n_days=300, n_features=20, nan_ratio=0.3,
+                                                       seed=7, columns_per_file=6)
+    cleaned = benchmark.clean_stage(benchmark.load_stage(data_folder))
+    selected = benchmark.select_stage(cleaned)
+    expected = benchmark.engineer_stage(selected)
+
+    # 块小于最长回看期 (21 + 63 行)，跨块的滞后和滚动窗口必须由尾部缓存衔接
+    pipeline = ChunkedPipeline(data_folder, tmp_path / "out", chunk_rows=40, column_group_size=7,
+                               max_features=MAX_SELECTED_FEATURES, redundancy_threshold=REDUNDANCY_THRESHOLD)
+    data, _ = pipeline.run()
+
+    assert pipeline.selected_features == [col for col in selected.columns if col != 'ret_21D']
+    assert list(data.columns) == [col for col in expected.columns if col != 'ret_21D'] + ['ret_21D']
+    assert data.index.equals(expected.index)
+    np.testing.assert_allclose(data.to_numpy(dtype=float), expected[data.columns].to_numpy(dtype=float),
+                               rtol=1e-4, atol=1e-5)
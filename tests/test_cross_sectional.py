@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from signal_builder import AdvancedPortfolioManager
+
+@pytest.mark.parametrize('cost_basis', ['position', 'turnover'])
+def test_portfolio_returns_match_pnl_net_of_costs(cost_basis):
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range('2020-01-01', periods=120)
+    columns = [f'asset_{i}' for i in range(5)]
+    predictions = pd.DataFrame(rng.normal(0, 0.05, (len(index), len(columns))), index=index, columns=columns)
+    predictions.iloc[::7] = 0.0
+    volatility = pd.DataFrame(rng.uniform(0.05, 0.2, predictions.shape), index=index, columns=columns)
+    returns = pd.DataFrame(rng.normal(0, 0.01, predictions.shape), index=index, columns=columns)
+
+    result = AdvancedPortfolioManager().run_cross_sectional(predictions, volatility, returns, cost_basis=cost_basis)
+
+    flat_days = result['weights'].abs().sum(axis=1) == 0
+    assert flat_days.any()
+    if cost_basis == 'turnover':
+        assert (result['transaction_costs'][flat_days] > 0).any()
+    np.testing.assert_allclose(result['portfolio_returns'].to_numpy(), result['pnl'].sum(axis=1).to_numpy(),
+                               atol=1e-12)
@@ -0,0 +1,43 @@
+import io
+import contextlib
+import numpy as np
+import pandas as pd
+
+from daily_signal import DailySignalEngine
+from feature_processor import FeatureProcessor
+from signal_builder import OnlineTreeModel, AdvancedPortfolioManager, AssetState
+
+LAGS = [1, 5]
+WINDOWS = [3, 10]
+
+def make_base_data(rows=360, cols=6, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.normal(size=(rows, cols)).cumsum(axis=0) * 0.01,
+                        index=pd.bdate_range('2015-01-01', periods=rows),
+                        columns=[f'feature_{i}' for i in range(cols)])
+    data['ret_21D'] = 0.02 * np.tanh(data['feature_0'] * 5) + rng.normal(scale=0.02, size=rows)
+    return data
+
+def engineer(data):
+    processor = FeatureProcessor()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return processor.calculate_rolling_features(processor.create_lag_features(data, lags=LAGS), windows=WINDOWS)
+
+def test_daily_updates_match_batch_features_and_predictions():
+    base = make_base_data()
+    engineered = engineer(base)
+    split = 300
+    model = OnlineTreeModel(model_params={'n_estimators': 10, 'max_depth': 3, 'random_state': 42, 'n_jobs': 1},
+                            train_window=200, max_features=12)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train_model(engineered, engineered.index[split - 1], initial_training=True)
+    engine = DailySignalEngine.from_backtest(model, AdvancedPortfolioManager(), AssetState(),
+                                             engineered.iloc[:split], LAGS, WINDOWS)
+
+    for date in base.index[split:]:
+        signal = engine.process_day(date, base.loc[date])
+        features = engine.compute_features()
+        np.testing.assert_allclose(features.to_numpy(), engineered.loc[[date], features.columns].to_numpy(),
+                                   rtol=1e-9, atol=1e-12)
+        assert signal['prediction'] == model.predict(engineered, date)
+    assert engine.last_date == base.index[-1]
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import DataLoader
+
+def write_files(folder, rows=120, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-01', periods=rows, name='date')
+    pd.DataFrame(rng.normal(size=(rows, 3)), index=dates, columns=['a', 'b', 'c']).to_parquet(folder / "alpha.parquet")
+    pd.DataFrame(rng.normal(size=(rows - 20, 2)), index=dates[10:-10], columns=['x', 'y']).to_parquet(
+        folder / "beta.parquet")
+    frame = pd.DataFrame(rng.normal(size=(rows, 1)), columns=['z'])
+    frame.insert(0, 'date', dates.strftime('%Y-%m-%d'))
+    frame.to_parquet(folder / "gamma.parquet", index=False)
+
+def reference_load(folder):
+    frames = []
+    for file_path in folder.glob("*.parquet"):
+        df = pd.read_parquet(file_path).add_prefix(f"{file_path.stem}_")
+        if f"{file_path.stem}_date" in df.columns:
+            df = df.set_index(f"{file_path.stem}_date").rename_axis('date')
+        df.index = pd.to_datetime(df.index)
+        frames.append(df.sort_index())
+    return pd.concat(frames, axis=1, join='outer')
+
+def test_concurrent_load_matches_sequential_merge(tmp_path):
+    write_files(tmp_path)
+    loaded = DataLoader(tmp_path, max_workers=3).load_parquet_files()
+    expected = reference_load(tmp_path)
+    pd.testing.assert_frame_equal(loaded.sort_index(axis=1), expected.sort_index(axis=1), check_freq=False)
+
+def test_projection_and_date_filters_match_full_load(tmp_path):
+    write_files(tmp_path)
+    start, end = pd.Timestamp('2020-02-03'), pd.Timestamp('2020-04-01')
+    columns = ['alpha_b', 'beta_y', 'gamma_z']
+    loaded = DataLoader(tmp_path).load_parquet_files(columns, start, end)
+    expected = reference_load(tmp_path).loc[start:end, columns]
+    pd.testing.assert_frame_equal(loaded[columns], expected, check_freq=False)
+
+def test_unrelated_read_errors_are_not_retried(tmp_path, monkeypatch):
+    write_files(tmp_path)
+    calls = []
+
+    def failing_read(path, **kwargs):
+        calls.append(kwargs)
+        raise OSError("disk error")
+
+    monkeypatch.setattr(pd, 'read_parquet', failing_read)
+    with pytest.raises(OSError):
+        DataLoader(tmp_path).read_parquet_file(tmp_path / "alpha.parquet", start_date='2020-02-03')
+    assert len(calls) == 1
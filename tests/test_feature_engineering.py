@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from feature_processor import FeatureProcessor, LazyFeatureStore
+from signal_builder import OnlineTreeModel
+
+LAGS = [1, 5]
+WINDOWS = [3, 10]
+
+def make_base_data(rows=120, cols=4, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.normal(size=(rows, cols)).cumsum(axis=0) + 100,
+                        index=pd.bdate_range('2015-01-01', periods=rows),
+                        columns=[f'feature_{i}' for i in range(cols)])
+    data.iloc[10:15, 0] = np.nan
+    data.iloc[40:60, 1] = 3.0
+    data.iloc[:8, 2] = np.nan
+    data['ret_21D'] = rng.normal(size=rows)
+    return data
+
+def reference_features(data, lags=LAGS, windows=WINDOWS):
+    lagged = data.copy()
+    base_columns = [col for col in data.columns if col != 'ret_21D']
+    for lag in lags:
+        for column in base_columns:
+            lagged[f'{column}_lag_{lag}'] = data[column].shift(lag)
+
+    rolled = lagged.copy()
+    for window in windows:
+        for column in [col for col in lagged.columns if col != 'ret_21D']:
+            rolled[f'{column}_roll_mean_{window}'] = lagged[column].rolling(window, min_periods=1).mean()
+            rolled[f'{column}_roll_std_{window}'] = lagged[column].rolling(window, min_periods=1).std()
+    return rolled
+
+def engineer(data, processor=None):
+    processor = processor or FeatureProcessor()
+    return processor.calculate_rolling_features(processor.create_lag_features(data, lags=LAGS), windows=WINDOWS)
+
+def test_columnar_features_match_pandas_shift_and_rolling():
+    data = make_base_data()
+    actual = engineer(data, FeatureProcessor(column_block_size=3))
+    expected = reference_features(data)
+    assert set(actual.columns) == set(expected.columns)
+    pd.testing.assert_frame_equal(actual[expected.columns], expected, rtol=1e-9, atol=1e-9, check_freq=False)
+
+def test_float32_output_matches_within_precision():
+    data = make_base_data()
+    actual = engineer(data, FeatureProcessor(dtype=np.float32))
+    expected = reference_features(data)
+    engineered = [col for col in expected.columns if col not in data.columns]
+    assert (actual[engineered].dtypes == np.float32).all()
+    np.testing.assert_allclose(actual[engineered].to_numpy(dtype=float), expected[engineered].to_numpy(),
+                               rtol=1e-5, atol=1e-4)
+
+def test_lazy_store_matches_eager_features():
+    data = make_base_data()
+    store = LazyFeatureStore(data, lags=LAGS, windows=WINDOWS, max_cached_columns=5)
+    expected = engineer(data)
+    assert set(store.columns) == set(expected.columns)
+
+    columns = ['feature_0_lag_5_roll_std_10', 'feature_1_roll_mean_3', 'feature_2_lag_1', 'feature_3']
+    frame = store.get_frame(columns, 20, 90, include_target=True)
+    pd.testing.assert_frame_equal(frame, expected.iloc[20:90][columns + ['ret_21D']], rtol=1e-9, atol=1e-9,
+                                  check_freq=False)
+    pd.testing.assert_frame_equal(store.materialize()[expected.columns], expected, rtol=1e-9, atol=1e-9,
+                                  check_freq=False)
+    assert len(store._cache) <= 5
+
+def test_model_trains_on_lazy_store_like_eager_frame():
+    data = make_base_data()
+    date = data.index[110]
+    eager = OnlineTreeModel(train_window=100, dynamic_feature_selection=False)
+    lazy = OnlineTreeModel(train_window=100, dynamic_feature_selection=False)
+    expected = eager.prepare_training_data(engineer(data), date, initial_training=True)
+    actual = lazy.prepare_training_data(LazyFeatureStore(data, lags=LAGS, windows=WINDOWS), date,
+                                        initial_training=True)
+    assert set(actual[2]) == set(expected[2])
+    pd.testing.assert_frame_equal(actual[0][expected[2]], expected[0], rtol=1e-9, atol=1e-9, check_freq=False)
+    pd.testing.assert_series_equal(actual[1], expected[1], check_freq=False)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import spearmanr
+from sklearn.feature_selection import mutual_info_regression
+
+from feature_processor import FeatureSelector
+
+def make_scoring_data(rows=300, cols=25, seed=0):
+    rng = np.random.default_rng(seed)
+    target = rng.normal(size=rows)
+    values = rng.normal(size=(rows, cols)) + target[:, None] * rng.uniform(0, 1, cols)
+    values[:, 3] = np.round(values[:, 3])
+    values[rng.random((rows, cols)) < 0.1] = np.nan
+    values[:295, 7] = np.nan
+    values[:, 9] = 1.0
+    data = pd.DataFrame(values, index=pd.bdate_range('2015-01-01', periods=rows),
+                        columns=[f'feature_{i}' for i in range(cols)])
+    target[::13] = np.nan
+    data['ret_21D'] = target
+    return data
+
+def reference_target_correlation(data, target_col='ret_21D'):
+    correlations = {}
+    for column in data.columns:
+        if column != target_col:
+            valid_data = data[[column, target_col]].dropna()
+            if len(valid_data) > 10:
+                corr, _ = spearmanr(valid_data[column], valid_data[target_col])
+                correlations[column] = abs(corr) if not np.isnan(corr) else 0
+    return correlations
+
+@pytest.mark.filterwarnings('ignore::scipy.stats.ConstantInputWarning')
+def test_blockwise_spearman_matches_scipy():
+    data = make_scoring_data()
+    expected = reference_target_correlation(data)
+    for block_size in (4, 1000):
+        actual = FeatureSelector(correlation_block_size=block_size).calculate_target_correlation(data)
+        assert list(actual) == list(expected)
+        np.testing.assert_allclose(list(actual.values()), list(expected.values()), rtol=1e-10, atol=1e-12)
+    assert 'feature_7' not in expected
+    assert expected['feature_9'] == 0
+
+def test_mutual_information_scores_every_feature_deterministically():
+    data = make_scoring_data(rows=200, cols=12).dropna(axis=1, thresh=150)
+    sequential = FeatureSelector(mutual_info_n_jobs=1, mutual_info_batch_size=5).calculate_mutual_information(data)
+    parallel = FeatureSelector(mutual_info_n_jobs=2, mutual_info_batch_size=5).calculate_mutual_information(data)
+
+    feature_columns = [col for col in data.columns if col != 'ret_21D']
+    assert list(sequential) == feature_columns
+    assert parallel == sequential
+
+    sample = data.dropna()
+    expected = mutual_info_regression(sample[['feature_0']].to_numpy(), sample['ret_21D'], random_state=42)[0]
+    assert sequential['feature_0'] == expected
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_processor import FeatureSelector
+
+def make_duplicated_features(rows=400, n_factors=10, copies=3, seed=0):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(size=(rows, n_factors))
+    columns = {}
+    for i in range(n_factors):
+        for copy in range(copies):
+            columns[f'factor_{i}_copy_{copy}'] = factors[:, i] + rng.normal(scale=0.05, size=rows)
+    data = pd.DataFrame(columns, index=pd.bdate_range('2015-01-01', periods=rows))
+    data['ret_21D'] = factors @ rng.uniform(0.5, 1.0, n_factors) + rng.normal(size=rows)
+    return data
+
+@pytest.mark.parametrize('rows', [200, 400])
+def test_redundant_copies_reduce_selected_width(rows):
+    data = make_duplicated_features(rows=rows)
+    max_features = data.shape[1] - 1
+
+    unpruned = FeatureSelector(max_features=max_features).select_features_static(data)
+    pruned_selector = FeatureSelector(max_features=max_features, redundancy_threshold=0.95)
+    pruned = pruned_selector.select_features_static(data)
+
+    assert unpruned.shape[1] == max_features + 1
+    assert pruned.shape[1] == 10 + 1
+    assert sorted({name.split('_copy_')[0] for name in pruned_selector.selected_features}) == \
+        sorted(f'factor_{i}' for i in range(10))
+    assert all(len(members) == 3 for members in pruned_selector.redundancy_clusters.values())
+
+def test_pruning_only_considers_top_scored_features():
+    data = make_duplicated_features()
+    selector = FeatureSelector(max_features=6, redundancy_threshold=0.95)
+    selector.select_features_static(data)
+    assert len(selector.selected_features) < 6
+    assert sum(len(members) for members in selector.redundancy_clusters.values()) == 6
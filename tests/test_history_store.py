@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from history_store import RecordHistory, ImportanceHistory, NormalizationHistory
+
+DATES = pd.bdate_range('2020-01-01', periods=6)
+
+def test_record_history_round_trips_dict_records():
+    records = [
+        {'date': DATES[0], 'prediction': 0.1, 'actual': None},
+        {'date': DATES[1], 'prediction': -0.2, 'actual': 0.05, 'weights': {'A': 0.5}},
+        {'date': DATES[2], 'prediction': 0.3, 'actual': -0.01, 'weights': {'B': -0.25, 'A': 0.1}, 'cost': 12.5},
+        {'date': DATES[3], 'prediction': 0.0, 'actual': 0.02, 'weights': {}},
+    ]
+    history = RecordHistory(['prediction', 'actual'])
+    for record in records:
+        history.append(record)
+
+    assert len(history) == len(records)
+    for got, expected in zip(history, records):
+        assert got['date'] == expected['date']
+        for field in ('prediction', 'actual', 'cost'):
+            value = expected.get(field)
+            assert np.isnan(got[field]) if value is None else got[field] == value
+        assert got['weights'] == expected.get('weights', {})
+    assert history[-1]['prediction'] == 0.0
+    assert [record['date'] for record in history[1:3]] == list(DATES[1:3])
+
+    frame = history.to_frame()
+    assert list(frame.columns) == ['date', 'prediction', 'actual', 'cost', 'weight_A', 'weight_B']
+    np.testing.assert_array_equal(frame['prediction'], [0.1, -0.2, 0.3, 0.0])
+    np.testing.assert_array_equal(frame['weight_B'], [0.0, 0.0, -0.25, 0.0])
+    np.testing.assert_array_equal(history.column('actual'), frame['actual'])
+
+def test_importance_history_matches_frame_list():
+    feature_sets = [['a', 'b', 'c'], ['c', 'd'], ['b', 'e', 'a']]
+    rng = np.random.default_rng(0)
+    history = ImportanceHistory()
+    expected = []
+    for date, features in zip(DATES, feature_sets):
+        importances = rng.random(len(features))
+        history.append(date, features, importances)
+        expected.append(pd.DataFrame({'feature': features, 'importance': importances, 'date': date})
+                        .sort_values('importance', ascending=False))
+
+    assert len(history) == len(expected)
+    for got, reference in zip(history, expected):
+        pd.testing.assert_frame_equal(got.reset_index(drop=True), reference.reset_index(drop=True),
+                                      check_dtype=False)
+    stacked = history.to_frame()
+    assert len(stacked) == sum(len(features) for features in feature_sets)
+    assert np.isnan(history.matrix().loc[DATES[1], 'a'])
+
+def test_normalization_history_matches_per_column_lists():
+    history = NormalizationHistory(max_entries=3)
+    expected = {}
+    methods = ['standard_normalization', 'robust_normalization', 'median_centering']
+    for i, date in enumerate(DATES[:5]):
+        columns = ['x', 'y'] if i % 2 == 0 else ['y', 'z']
+        centers, scales = [i + 0.5, -i], [1.0 + i, 2.0]
+        history.append(date, columns, centers, scales, [methods[i % 3]] * 2)
+        for column, center, scale in zip(columns, centers, scales):
+            expected.setdefault(column, []).append({'date': date, 'mean': center, 'std': scale,
+                                                    'method': methods[i % 3]})
+
+    kept_dates = set(DATES[2:5])
+    for column, entries in expected.items():
+        assert history[column] == [entry for entry in entries if entry['date'] in kept_dates]
+    assert len(history.to_frame()) == 6
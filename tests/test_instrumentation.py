@@ -0,0 +1,25 @@
+import json
+
+from instrumentation import Tracer
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    with tracer.span('stage'):
+        tracer.annotate(rows=10)
+    assert tracer.events == []
+
+def test_process_peak_is_reported_once(tmp_path):
+    tracer = Tracer(enabled=True)
+    for _ in range(3):
+        with tracer.span('stage', 'pipeline'):
+            tracer.annotate(shape=(10, 4))
+
+    summary = tracer.summary()
+    assert summary.loc[0, 'calls'] == 3
+    assert summary.loc[0, 'rows'] == 30
+    assert all('peak_rss_mb' not in event for event in tracer.events)
+    assert 'peak_rss_mb' not in summary.columns
+
+    with open(tracer.export_json(tmp_path / "events.json")) as f:
+        exported = json.load(f)
+    assert 'process_peak_rss_mb' in exported
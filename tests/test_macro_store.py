@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+import data_loader
+from data_loader import MacroDataStore, YFinanceMacroFetcher
+
+class ScriptedFetcher:
+    def __init__(self, online=False):
+        self.online = online
+        self.calls = []
+
+    def fetch(self, name, ticker, start_date, end_date):
+        self.calls.append((start_date, end_date))
+        if not self.online:
+            raise ConnectionError("offline")
+        dates = pd.bdate_range(start_date, end_date, inclusive='left')
+        return pd.Series(range(len(dates)), index=dates, dtype=float, name=name)
+
+def test_failed_fetch_does_not_mark_range_covered(tmp_path):
+    fetcher = ScriptedFetcher(online=False)
+    store = MacroDataStore(tmp_path, fetcher)
+    assert len(store.get_series('vix', '^VIX', '2020-01-01', '2020-03-01')) == 0
+    assert 'vix' not in store.manifest
+
+    fetcher.online = True
+    store = MacroDataStore(tmp_path, fetcher)
+    series = store.get_series('vix', '^VIX', '2020-01-01', '2020-03-01')
+    assert len(fetcher.calls) == 2
+    assert len(series) > 0
+    assert store.manifest['vix']['start'] == '2020-01-01'
+
+def test_empty_weekend_fetch_is_covered(tmp_path):
+    fetcher = ScriptedFetcher(online=True)
+    store = MacroDataStore(tmp_path, fetcher)
+    store.get_series('vix', '^VIX', '2020-01-01', '2020-03-07')
+    store.get_series('vix', '^VIX', '2020-01-01', '2020-03-09')
+    assert fetcher.calls[-1] == ('2020-03-07', '2020-03-09')
+    assert store.manifest['vix']['end'] == '2020-03-09'
+
+    store = MacroDataStore(tmp_path, fetcher)
+    store.get_series('vix', '^VIX', '2020-01-01', '2020-03-09')
+    assert len(fetcher.calls) == 2
+
+def test_yfinance_fetch_returns_empty_when_probe_has_data(monkeypatch):
+    def download(ticker, start=None, end=None, **kwargs):
+        dates = pd.bdate_range(start, end, inclusive='left')
+        dates = dates[dates < pd.Timestamp('2020-03-07')]
+        return pd.DataFrame({'Close': range(len(dates))}, index=dates, dtype=float)
+
+    monkeypatch.setattr(data_loader.yf, 'download', download)
+    assert len(YFinanceMacroFetcher().fetch('vix', '^VIX', '2020-03-07', '2020-03-09')) == 0
+
+def test_yfinance_fetch_raises_on_empty_download(monkeypatch):
+    monkeypatch.setattr(data_loader.yf, 'download', lambda *args, **kwargs: pd.DataFrame())
+    with pytest.raises(ValueError):
+        YFinanceMacroFetcher().fetch('vix', '^VIX', '2020-01-01', '2020-03-01')
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from signal_builder import FeatureMatrix, OnlineTreeModel
+
+MODEL_PARAMS = {'n_estimators': 10, 'max_depth': 3, 'random_state': 42, 'n_jobs': 1}
+
+def make_data(rows=400, cols=12, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.normal(size=(rows, cols)).cumsum(axis=0) * 0.01,
+                        index=pd.bdate_range('2015-01-01', periods=rows),
+                        columns=[f'ret_21d_{i}' for i in range(cols)])
+    data.iloc[3:30, 2] = np.nan
+    data.iloc[::17, 5] = np.nan
+    data['const'] = 1.0
+    data['ret_21D'] = 0.02 * np.tanh(data['ret_21d_0'] * 5) + rng.normal(scale=0.02, size=rows)
+    data.iloc[-21:, -1] = np.nan
+    return data
+
+def reference_normalization_params(data, current_date, window=252):
+    window_data = data[data.index <= current_date].tail(window)
+    params = {}
+    for column in data.columns:
+        if column == 'ret_21D':
+            continue
+        values = window_data[column].dropna()
+        if len(values) < 10:
+            continue
+        mean_val, std_val = values.mean(), values.std()
+        if std_val < 1e-10:
+            params[column] = {'mean': values.median(), 'std': 1.0, 'method': 'median_centering'}
+            continue
+        mad_val = (values - values.median()).abs().mean()
+        if std_val > 10 * mad_val:
+            params[column] = {'mean': values.median(), 'std': mad_val if mad_val > 1e-10 else 1.0,
+                              'method': 'robust_normalization'}
+        else:
+            params[column] = {'mean': mean_val, 'std': std_val, 'method': 'standard_normalization'}
+    return params
+
+def reference_predict(model, data, current_date):
+    current_features = data[data.index == current_date].drop('ret_21D', axis=1)
+    if model.dynamic_feature_selection and model.current_feature_set:
+        available_features = set(current_features.columns) & model.current_feature_set
+        current_features = current_features[list(available_features)]
+    normalized = current_features.copy()
+    for column, params in model.normalization_params.items():
+        if column in normalized.columns:
+            if params['std'] > 1e-10:
+                normalized[column] = (current_features[column] - params['mean']) / params['std']
+            else:
+                normalized[column] = current_features[column] - params['mean']
+    for feature in set(model.model.feature_names_in_) - set(normalized.columns):
+        normalized[feature] = 0
+    normalized = normalized[model.model.feature_names_in_].ffill().bfill().fillna(0)
+    return model.model.predict(normalized)[0]
+
+def test_feature_matrix_lookups_match_boolean_masks():
+    data = make_data()
+    shuffled = data.sample(frac=1.0, random_state=0)
+    feature_matrix = FeatureMatrix(shuffled)
+    columns = ['ret_21d_4', 'ret_21d_1', 'const']
+    for date in data.index[[0, 57, 200, 399]]:
+        np.testing.assert_array_equal(feature_matrix.row(date, columns),
+                                      shuffled.loc[shuffled.index == date, columns].to_numpy()[0])
+        np.testing.assert_array_equal(feature_matrix.target_at(date),
+                                      shuffled.loc[shuffled.index == date, 'ret_21D'].iloc[0])
+        pd.testing.assert_frame_equal(feature_matrix.history(date, 120),
+                                      shuffled[shuffled.index <= date].sort_index().tail(120))
+    assert feature_matrix.row(pd.Timestamp('2030-01-01')) is None
+    assert feature_matrix.target_at(pd.Timestamp('2030-01-01')) is None
+
+def test_predict_matches_notebook_row_lookup():
+    data = make_data()
+    model = OnlineTreeModel(model_params=dict(MODEL_PARAMS), train_window=200, max_features=6)
+    model.train_model(data, data.index[250], initial_training=True)
+    model.current_feature_set = set(list(model.model.feature_names_in_)[:4])
+    for date in data.index[251:400:7]:
+        assert model.predict(data, date) == reference_predict(model, data, date)
+
+def test_normalization_params_match_per_column_loop():
+    data = make_data()
+    data.iloc[:300, 7] = 0.0
+    data.iloc[150, 7] = 50.0
+    data.iloc[:395, 8] = np.nan
+    model = OnlineTreeModel()
+    for date in data.index[[20, 150, 399]]:
+        actual = model.calculate_normalization_params(data, date)
+        expected = reference_normalization_params(data, date)
+        assert list(actual) == list(expected)
+        for column, params in expected.items():
+            assert actual[column]['method'] == params['method']
+            np.testing.assert_allclose([actual[column]['mean'], actual[column]['std']],
+                                       [params['mean'], params['std']], rtol=1e-12, atol=1e-15)
+    assert {params['method'] for params in expected.values()} == {
+        'standard_normalization', 'robust_normalization', 'median_centering'}
+
+def test_training_matrix_matches_notebook_preparation():
+    data = make_data()
+    model = OnlineTreeModel(train_window=200, dynamic_feature_selection=False)
+    date = data.index[300]
+    X, y, feature_names = model.prepare_training_data(data, date, initial_training=True)
+
+    train_data = data[data.index <= date].tail(200).dropna(subset=['ret_21D'])
+    expected = train_data.drop(columns=['ret_21D', 'const'])
+    params = reference_normalization_params(expected, date)
+    for column, column_params in params.items():
+        expected[column] = (expected[column] - column_params['mean']) / column_params['std']
+    expected = expected.ffill().bfill().fillna(0)
+
+    assert feature_names == expected.columns.tolist()
+    pd.testing.assert_series_equal(y, train_data['ret_21D'])
+    np.testing.assert_allclose(X.to_numpy(), expected.to_numpy(), rtol=1e-10, atol=1e-12)
+
+def test_block_predictions_match_per_day_predictions():
+    data = make_data()
+    model = OnlineTreeModel(model_params=dict(MODEL_PARAMS), train_window=200, max_features=6)
+    model.train_model(data, data.index[250], initial_training=True)
+    model.current_feature_set = set(list(model.model.feature_names_in_)[:4])
+    dates = list(data.index[251:293]) + [pd.Timestamp('2030-01-01')]
+
+    block = model.predict_block(data, dates)
+    assert list(block.index) == dates[:-1]
+    per_day = [model.predict(data, date) for date in dates[:-1]]
+    np.testing.assert_array_equal(block.to_numpy(), np.asarray(per_day))
+
+def test_incremental_training_appends_trees_and_refits_on_schedule():
+    data = make_data()
+    model = OnlineTreeModel(model_params=dict(MODEL_PARAMS), train_window=200, max_features=6,
+                            incremental_training=True, incremental_estimators=3, full_refit_every=2, max_trees=14)
+    model.train_model(data, data.index[250], initial_training=True)
+    model.current_feature_set = set(model.trained_features)
+
+    rounds = [model.model.get_booster().num_boosted_rounds()]
+    for position in (270, 290, 310, 330):
+        assert model.train_model(data, data.index[position])
+        rounds.append(model.model.get_booster().num_boosted_rounds())
+    # 两次增量后第三次按计划全量重训，树的总数受 max_trees 限制
+    assert rounds == [10, 13, 14, 10, 13]
+    assert model.retrains_since_refit == 1
+    assert model.last_train_date == data.index[330]
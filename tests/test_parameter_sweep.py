@@ -0,0 +1,46 @@
+import io
+import contextlib
+import numpy as np
+import pandas as pd
+
+from parameter_sweep import run_parameter_sweep, build_configs, group_parameter_grid
+from feature_memmap import load_feature_memmap
+from signal_builder import OnlineTreeModel, AdvancedPortfolioManager
+from backtester import EnhancedStrategyBacktester
+
+GRID = {'max_position': [0.02, 0.05], 'train_window': [150],
+        'model_params': [{'n_estimators': 5, 'max_depth': 2, 'random_state': 42, 'n_jobs': 1}]}
+
+def make_data(rows=400, cols=8, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.normal(size=(rows, cols)).cumsum(axis=0) * 0.01,
+                        index=pd.bdate_range('2015-01-01', periods=rows),
+                        columns=[f'feature_{i}' for i in range(cols)])
+    data['ret_21D'] = 0.02 * np.tanh(data['feature_0'] * 5) + rng.normal(scale=0.02, size=rows)
+    return data
+
+def run_sequential(data, params, start_date, end_date):
+    model_config, portfolio_config = build_configs({key: params[key] for key in ('train_window', 'model_params')},
+                                                   {'max_position': params['max_position']})
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = OnlineTreeModel(**model_config)
+        model.train_model(data, start_date, initial_training=True)
+        backtester = EnhancedStrategyBacktester(model, AdvancedPortfolioManager(**portfolio_config))
+        return backtester.run_enhanced_backtest(data, start_date, end_date)
+
+def test_grid_groups_portfolio_parameters_under_one_model():
+    groups = group_parameter_grid(GRID)
+    assert len(groups) == 1
+    assert groups[0][1] == [{'max_position': 0.02}, {'max_position': 0.05}]
+
+def test_sweep_matches_sequential_backtests(tmp_path):
+    data = make_data()
+    results = run_parameter_sweep(data, GRID, max_workers=1, memmap_dir=tmp_path / "memmap", result_store_dir=None)
+    shared_data, _ = load_feature_memmap(tmp_path / "memmap")
+    start_date, end_date = data.index[int(len(data) * 0.3)], data.index[-1]
+
+    assert sorted(results['retrained']) == [False, True]
+    for _, row in results.iterrows():
+        expected = run_sequential(shared_data, row, start_date, end_date)
+        for name, value in expected['metrics'].items():
+            assert row[name] == value, name
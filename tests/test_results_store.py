@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from parameter_sweep import run_parameter_sweep, sweep_run_id
+from results_store import ResultStore
+
+def make_data(rows=400, cols=8, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.normal(size=(rows, cols)).cumsum(axis=0) * 0.01,
+                        index=pd.bdate_range('2015-01-01', periods=rows),
+                        columns=[f'feature_{i}' for i in range(cols)])
+    data['ret_21D'] = 0.02 * np.tanh(data['feature_0'] * 5) + rng.normal(scale=0.02, size=rows)
+    return data
+
+def test_default_run_ids_are_unique():
+    run_ids = {ResultStore.make_run_id() for _ in range(100)}
+    assert len(run_ids) == 100
+
+def test_sweep_run_id_depends_on_data_fingerprint():
+    params = {'max_position': 0.02}
+    assert sweep_run_id(params, '2020-01-01', '2020-06-01', 'a') == sweep_run_id(params, '2020-01-01', '2020-06-01', 'a')
+    assert sweep_run_id(params, '2020-01-01', '2020-06-01', 'a') != sweep_run_id(params, '2020-01-01', '2020-06-01', 'b')
+
+def test_sweep_rerun_on_changed_data_keeps_earlier_results(tmp_path):
+    grid = {'max_position': [0.02], 'train_window': [150], 'model_params': [{'n_estimators': 5, 'max_depth': 2}]}
+    data = make_data()
+    changed = data.copy()
+    changed.iloc[:, 0] += 0.01
+
+    first = run_parameter_sweep(data, grid, max_workers=1, memmap_dir=tmp_path / "memmap",
+                                result_store_dir=tmp_path / "store")
+    second = run_parameter_sweep(changed, grid, max_workers=1, memmap_dir=tmp_path / "memmap",
+                                 result_store_dir=tmp_path / "store")
+
+    assert first['run_id'][0] != second['run_id'][0]
+    store = ResultStore(tmp_path / "store")
+    assert set(store.runs()) == {first['run_id'][0], second['run_id'][0]}
+    signals = store.load('signals', ['prediction'], first['run_id'][0])
+    assert len(signals) == len(store.load('signals', ['prediction'], second['run_id'][0])) > 0
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from backtester import EnhancedStrategyBacktester
+from signal_builder import RecursiveLeastSquaresRegressor, OnlineTreeModel, AdvancedPortfolioManager
+
+def make_data(rows=600, cols=40, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2015-01-01', periods=rows)
+    data = pd.DataFrame(rng.normal(size=(rows, cols)).cumsum(axis=0) * 0.01, index=index,
+                        columns=[f'feature_{i}' for i in range(cols)])
+    data['ret_21D'] = 0.02 * np.tanh(data['feature_0'] * 5) + rng.normal(scale=0.02, size=rows)
+    return data
+
+def test_fit_matches_weighted_ridge_with_free_intercept():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(200, 5))
+    y = 3.0 + X @ rng.normal(size=5) + rng.normal(scale=0.1, size=200)
+    model = RecursiveLeastSquaresRegressor(forgetting_factor=0.99, regularization=1e6).fit(X, y)
+
+    sample_weights = 0.99 ** np.arange(199, -1, -1)
+    assert abs(model.coef_).max() < 1e-3
+    assert abs(model.intercept_ - np.average(y, weights=sample_weights)) < 1e-2
+
+def test_partial_fit_matches_batch_fit():
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(300, 8))
+    y = X @ rng.normal(size=8) + rng.normal(size=300)
+    batch = RecursiveLeastSquaresRegressor(forgetting_factor=1.0).fit(X, y)
+    online = RecursiveLeastSquaresRegressor(forgetting_factor=1.0).fit(X[:150], y[:150]).partial_fit(X[150:], y[150:])
+    np.testing.assert_allclose(online.weights, batch.weights, atol=1e-8)
+
+def test_training_caps_linear_features():
+    data = make_data()
+    model = OnlineTreeModel(model_type='rls', train_window=300, max_features=10)
+    assert model.train_model(data, data.index[400], initial_training=True)
+    assert len(model.model.feature_names_in_) == 10
+    assert 'feature_0' in model.model.feature_names_in_
+
+def test_online_rows_keep_fitted_features_after_reselection():
+    data = make_data()
+    model = OnlineTreeModel(model_type='rls', train_window=300, max_features=10)
+    model.train_model(data, data.index[400], initial_training=True)
+    fitted = list(model.model.feature_names_in_)
+    model.current_feature_set = {fitted[0]}
+
+    feature_matrix = model.get_feature_matrix(data)
+    rows = model.build_prediction_rows(feature_matrix, np.arange(400, 420), fitted)
+    assert (np.abs(rows) > 0).all(axis=0).all()
+
+def test_backtest_logs_each_prediction_once():
+    data = make_data(rows=700, cols=60)
+    model = OnlineTreeModel(model_type='rls', train_window=250, retrain_freq=42, max_features=20)
+    start_date = data.index[300]
+    model.train_model(data, start_date, initial_training=True)
+    results = EnhancedStrategyBacktester(model, AdvancedPortfolioManager()).run_enhanced_backtest(
+        data, start_date, data.index[-1]
+    )
+
+    history = model.prediction_history.to_frame()
+    assert history['date'].is_unique
+    assert list(history['date']) == list(results['signal_dates'])
+    np.testing.assert_array_equal(history['prediction'].to_numpy(), np.asarray(results['predictions']))
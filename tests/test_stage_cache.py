@@ -0,0 +1,39 @@
+import pandas as pd
+
+import main
+from benchmark import generate_synthetic_dataset
+from data_loader import MacroDataEnhancer
+from stage_cache import StageCache
+
+def fake_download(available):
+    def download_macro_data(self, start_date, end_date):
+        dates = pd.bdate_range(start_date, end_date)
+        for position, name in enumerate(MacroDataEnhancer.macro_tickers):
+            if position < available:
+                self.downloaded_data[name] = pd.Series(range(len(dates)), index=dates, dtype=float, name=name)
+    return download_macro_data
+
+def test_degraded_macro_is_not_cached_downstream(tmp_path, monkeypatch, capsys):
+    data_folder = generate_synthetic_dataset(tmp_path / "raw", n_days=300, n_features=20, columns_per_file=10)
+    monkeypatch.setattr(main, 'DATA_FOLDER_PATH', str(data_folder))
+    monkeypatch.setattr(main, 'MACRO_DATA_PATH', str(tmp_path / "macro"))
+    cache_dir = tmp_path / "cache"
+
+    monkeypatch.setattr(MacroDataEnhancer, 'download_macro_data', fake_download(2))
+    degraded = main.run_data_pipeline(stage_cache=StageCache(cache_dir))
+    assert degraded is not None
+    assert {entry['stage'] for entry in StageCache(cache_dir).entries.values()} == {'load'}
+
+    capsys.readouterr()
+    monkeypatch.setattr(MacroDataEnhancer, 'download_macro_data', fake_download(len(MacroDataEnhancer.macro_tickers)))
+    healthy = main.run_data_pipeline(stage_cache=StageCache(cache_dir))
+    output = capsys.readouterr().out
+    assert "使用阶段缓存: load" in output
+    for stage in ['macro', 'clean', 'select', 'engineer']:
+        assert f"使用阶段缓存: {stage}" not in output
+    assert healthy is not None
+
+    cache = StageCache(cache_dir)
+    assert {entry['stage'] for entry in cache.entries.values()} == set(main.PIPELINE_STAGES)
+    clean_key = next(key for key, entry in cache.entries.items() if entry['stage'] == 'clean')
+    assert set(MacroDataEnhancer.macro_tickers) <= set(cache.get(clean_key).columns)
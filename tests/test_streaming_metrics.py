@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester import StreamingMetrics
+
+def make_series(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    values = 1e6 * np.cumprod(1 + rng.normal(0.0005, 0.01, n))
+    predictions = rng.normal(0, 0.02, n)
+    actuals = 0.5 * predictions + rng.normal(0, 0.02, n)
+    return values, predictions, actuals
+
+def test_metrics_match_pandas_reference():
+    values, predictions, actuals = make_series()
+    tracker = StreamingMetrics(1e6, rolling_windows=(63,))
+    for value in values:
+        tracker.update_value(value)
+    for prediction, actual in zip(predictions, actuals):
+        tracker.update_prediction(prediction, actual)
+    metrics = tracker.metrics()
+
+    returns = pd.Series(values).pct_change().dropna()
+    annual_return = returns.mean() * 252 * 100
+    annual_volatility = returns.std() * np.sqrt(252) * 100
+    downside = returns[returns < 0]
+    drawdown = (pd.Series(values) - pd.Series(values).expanding().max()) / pd.Series(values).expanding().max()
+    assert metrics['Annual Return (%)'] == pytest.approx(annual_return, rel=1e-10)
+    assert metrics['Annual Volatility (%)'] == pytest.approx(annual_volatility, rel=1e-10)
+    assert metrics['Sortino Ratio'] == pytest.approx(annual_return / (downside.std() * np.sqrt(252) * 100), rel=1e-10)
+    assert metrics['Max Drawdown (%)'] == pytest.approx(drawdown.min() * 100, rel=1e-12)
+    assert metrics['Win Rate (%)'] == pytest.approx((returns > 0).mean())
+    assert metrics['Prediction Correlation'] == pytest.approx(np.corrcoef(predictions, actuals)[0, 1], rel=1e-10)
+    assert metrics['Prediction MSE'] == pytest.approx(np.mean((actuals - predictions) ** 2), rel=1e-10)
+    assert metrics['Direction Accuracy'] == pytest.approx(np.mean((predictions > 0) == (actuals > 0)))
+
+    rolling = tracker.rolling_metrics()
+    expected_ic = pd.Series(predictions).rolling(63).corr(pd.Series(actuals)).to_numpy()
+    np.testing.assert_allclose(rolling['rolling_ic_63'], expected_ic, rtol=1e-8)
+    rolling_returns = returns.rolling(63)
+    expected_sharpe = (rolling_returns.mean() / rolling_returns.std() * np.sqrt(252)).to_numpy()
+    np.testing.assert_allclose(rolling['rolling_sharpe_63'], expected_sharpe, rtol=1e-8)
+
+def test_nan_actuals_are_skipped():
+    _, predictions, actuals = make_series(n=200)
+    actuals[150:171] = np.nan
+    tracker = StreamingMetrics(1e6, rolling_windows=(20,))
+    tracker.update_value(1e6)
+    tracker.update_value(1.01e6)
+    for prediction, actual in zip(predictions, actuals):
+        tracker.update_prediction(prediction, actual)
+    metrics = tracker.metrics()
+
+    valid = ~np.isnan(actuals)
+    assert metrics['Prediction Correlation'] == pytest.approx(
+        np.corrcoef(predictions[valid], actuals[valid])[0, 1], rel=1e-10)
+    assert metrics['Prediction MSE'] == pytest.approx(np.mean((actuals[valid] - predictions[valid]) ** 2), rel=1e-10)
+
+    rolling_ic = tracker.rolling_metrics()['rolling_ic_20']
+    assert len(rolling_ic) == len(predictions)
+    assert np.isfinite(rolling_ic[195:]).all()
+    expected = pd.Series(predictions).rolling(20).corr(pd.Series(actuals)).to_numpy()
+    np.testing.assert_allclose(rolling_ic[195:], expected[195:], rtol=1e-8)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from backtester import EnhancedStrategyBacktester
+from signal_builder import OnlineTreeModel, AdvancedPortfolioManager
+
+MODEL_PARAMS = {'n_estimators': 10, 'max_depth': 3, 'random_state': 42, 'n_jobs': 1}
+
+def make_data(rows=500, cols=30, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.normal(size=(rows, cols)).cumsum(axis=0) * 0.01,
+                        index=pd.bdate_range('2015-01-01', periods=rows),
+                        columns=[f'ret_21d_{i}' for i in range(cols)])
+    data.iloc[5:40, 3] = np.nan
+    data['const'] = 1.0
+    data['ret_21D'] = 0.02 * np.tanh(data['ret_21d_0'] * 5) + rng.normal(scale=0.02, size=rows)
+    return data
+
+def make_model(**kwargs):
+    return OnlineTreeModel(model_params=dict(MODEL_PARAMS), train_window=200, retrain_freq=21, max_features=8,
+                           **kwargs)
+
+def test_cached_training_data_matches_pandas_path():
+    data = make_data()
+    reference = make_model()
+    cached = make_model(cache_training_matrix=True, training_cache_dtype=np.float64)
+    for k, date in enumerate(data.index[250::21]):
+        expected = reference.prepare_training_data(data, date, initial_training=k == 0)
+        actual = cached.prepare_training_data(data, date, initial_training=k == 0)
+        assert actual[2] == expected[2]
+        pd.testing.assert_frame_equal(actual[0], expected[0])
+        pd.testing.assert_series_equal(actual[1], expected[1])
+        if k % 3 == 2:
+            reference.current_feature_set = set(expected[2][::2])
+            cached.current_feature_set = set(expected[2][::2])
+
+def test_cached_backtest_matches_pandas_backtest():
+    data = make_data()
+    start_date = data.index[250]
+    results = []
+    for model in (make_model(), make_model(cache_training_matrix=True, training_cache_dtype=np.float64)):
+        model.train_model(data, start_date, initial_training=True)
+        results.append(EnhancedStrategyBacktester(model, AdvancedPortfolioManager()).run_enhanced_backtest(
+            data, start_date, data.index[-1]
+        ))
+    assert results[0]['predictions'] == results[1]['predictions']
+    assert results[0]['portfolio_values'] == results[1]['portfolio_values']
+
+def test_cache_keeps_window_when_feature_set_shrinks():
+    data = make_data()
+    model = make_model(cache_training_matrix=True)
+    model.prepare_training_data(data, data.index[250], initial_training=True)
+    buffer = model.training_cache.buffer
+    model.current_feature_set = {'ret_21d_0', 'ret_21d_1', 'ret_21d_2'}
+    X, _, _ = model.prepare_training_data(data, data.index[271])
+    assert model.training_cache.buffer is buffer
+    assert set(X.columns) == model.current_feature_set